@@ -2,6 +2,12 @@ from flask import Flask
 from .web.routes import web
 from .models import Base
 from .database import engine, db_session
+from .migrations import run_migrations
+
+def init_db():
+    """Создает недостающие таблицы и колонки"""
+    Base.metadata.create_all(engine)
+    run_migrations(engine)
 
 def create_app():
     app = Flask(__name__, 
@@ -16,7 +22,7 @@ def create_app():
     app.register_blueprint(web)
     
     # Инициализируем базу данных
-    Base.metadata.create_all(engine)
+    init_db()
     
     # Закрываем сессию при завершении запроса
     @app.teardown_appcontext
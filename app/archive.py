@@ -0,0 +1,120 @@
+import logging
+from datetime import datetime, timedelta
+from sqlalchemy import select, insert, func, case, literal, bindparam
+from .config import Config
+from .database import db_session
+from .models import Training, Registration, TrainingPost, ArchivedTraining, ArchivedRegistration, ArchivedPlayerStats
+
+logger = logging.getLogger(__name__)
+
+# Хранение истории: прошедшие тренировки, за которые заплатили все полевые игроки (вратари не платят),
+# через ARCHIVE_AFTER_MONTHS месяцев переносятся вместе с записями в archived_trainings / archived_registrations,
+# а итоги игроков по ним копятся в archived_player_stats. Так trainings и registrations, которые читают
+# бот и админка, не растут год от года. Тренировки с долгами остаются на месте, пока их не оплатят.
+
+_HAS_UNPAID = select(Registration.id)\
+    .where(
+        Registration.training_id == Training.id,
+        Registration.paid == False,
+        Registration.goalkeeper == False
+    )\
+    .exists()
+
+_ARCHIVABLE_TRAININGS = select(Training.id)\
+    .where(Training.date_time < bindparam('cutoff'), ~_HAS_UNPAID)\
+    .order_by(Training.date_time)\
+    .limit(bindparam('limit'))
+
+# Колонки записи, которые переносятся в архив как есть
+_REGISTRATION_COLUMNS = [column.name for column in ArchivedRegistration.__table__.columns]
+
+def _archive_batch(training_ids, now):
+    """Переносит тренировки с записями в архив и обновляет итоги игроков; одна транзакция"""
+    registrations_count = select(func.count(Registration.id))\
+        .where(Registration.training_id == Training.id)\
+        .scalar_subquery()
+    db_session.execute(insert(ArchivedTraining).from_select(
+        ['id', 'date_time', 'max_participants', 'registrations_count', 'archived_at'],
+        select(Training.id, Training.date_time, Training.max_participants, registrations_count, literal(now))
+            .where(Training.id.in_(training_ids))
+    ))
+    db_session.execute(insert(ArchivedRegistration).from_select(
+        _REGISTRATION_COLUMNS,
+        select(*[Registration.__table__.c[name] for name in _REGISTRATION_COLUMNS])
+            .where(Registration.training_id.in_(training_ids))
+    ))
+
+    # Итоги игроков по переносимым тренировкам прибавляются к уже накопленным
+    totals = db_session.execute(
+        select(
+            Registration.user_id,
+            func.count(Registration.id),
+            func.sum(case((Registration.goalkeeper == True, 1), else_=0)),
+            func.min(Training.date_time),
+            func.max(Training.date_time)
+        )
+        .join(Training, Registration.training_id == Training.id)
+        .where(Registration.training_id.in_(training_ids))
+        .group_by(Registration.user_id)
+    ).all()
+    user_ids = [row[0] for row in totals]
+    stats_by_user = {
+        stats.user_id: stats
+        for stats in db_session.query(ArchivedPlayerStats).filter(ArchivedPlayerStats.user_id.in_(user_ids))
+    } if user_ids else {}
+    for user_id, trainings_count, goalkeeper_count, first_training_at, last_training_at in totals:
+        stats = stats_by_user.get(user_id)
+        if stats is None:
+            db_session.add(ArchivedPlayerStats(
+                user_id=user_id,
+                trainings_count=trainings_count,
+                goalkeeper_count=goalkeeper_count,
+                first_training_at=first_training_at,
+                last_training_at=last_training_at
+            ))
+            continue
+        stats.trainings_count += trainings_count
+        stats.goalkeeper_count += goalkeeper_count
+        stats.first_training_at = min(filter(None, (stats.first_training_at, first_training_at)))
+        stats.last_training_at = max(filter(None, (stats.last_training_at, last_training_at)))
+
+    # Посты о старых тренировках больше не обновляются - ссылки на них не нужны
+    db_session.query(TrainingPost).filter(TrainingPost.training_id.in_(training_ids)).delete(synchronize_session=False)
+    db_session.query(Registration).filter(Registration.training_id.in_(training_ids)).delete(synchronize_session=False)
+    db_session.query(Training).filter(Training.id.in_(training_ids)).delete(synchronize_session=False)
+    db_session.commit()
+    return len(user_ids)
+
+def archive_old_trainings(now=None):
+    """
+    Переносит в архив оплаченные тренировки старше ARCHIVE_AFTER_MONTHS месяцев,
+    пачками по ARCHIVE_BATCH_SIZE тренировок. Возвращает количество перенесенных тренировок.
+    """
+    if Config.ARCHIVE_AFTER_MONTHS <= 0:
+        return 0
+    now = now or datetime.now()
+    cutoff = now - timedelta(days=30 * Config.ARCHIVE_AFTER_MONTHS)
+
+    archived = 0
+    while True:
+        training_ids = db_session.scalars(
+            _ARCHIVABLE_TRAININGS,
+            {'cutoff': cutoff, 'limit': Config.ARCHIVE_BATCH_SIZE}
+        ).all()
+        if not training_ids:
+            break
+        try:
+            players_count = _archive_batch(training_ids, now)
+        except Exception:
+            db_session.rollback()
+            raise
+        archived += len(training_ids)
+        logger.info(f"🗄️ В архив перенесено тренировок: {len(training_ids)}, обновлены итоги {players_count} игроков")
+    return archived
+
+def run_archive():
+    """Запуск архивации из фоновой задачи (в отдельном потоке, со своей сессией)"""
+    try:
+        return archive_old_trainings()
+    finally:
+        db_session.remove()
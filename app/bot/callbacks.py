@@ -0,0 +1,42 @@
+import re
+
+# Формат callback_data: "<версия>:<действие>:<аргумент>:...", например "1:reg:42".
+# Версия позволяет менять формат, не ломая кнопки в уже отправленных сообщениях.
+CALLBACK_VERSION = '1'
+CALLBACK_SEPARATOR = ':'
+# Ограничение Telegram на размер callback_data
+MAX_CALLBACK_DATA_BYTES = 64
+
+# Действия
+REGISTER = 'reg'  # Запись на тренировку: reg:<id тренировки>
+SCHEDULE_PAGE = 'sch'  # Страница расписания: sch:<номер страницы>
+PAY = 'pay'  # Отметка оплаты: pay:<id регистрации>
+CANCEL = 'cnl'  # Отмена записи: cnl:<id регистрации>
+
+def encode_callback(action, *args):
+    """Кодирует действие и аргументы в callback_data"""
+    data = CALLBACK_SEPARATOR.join([CALLBACK_VERSION, action, *(str(arg) for arg in args)])
+    if len(data.encode('utf-8')) > MAX_CALLBACK_DATA_BYTES:
+        raise ValueError(f"callback_data длиннее {MAX_CALLBACK_DATA_BYTES} байт: {data}")
+    return data
+
+def decode_callback(data):
+    """
+    Разбирает callback_data в (действие, [аргументы]).
+    Поддерживает и старый формат "<действие>_<id>" из уже отправленных сообщений.
+    """
+    parts = data.split(CALLBACK_SEPARATOR)
+    if len(parts) >= 2 and parts[0] == CALLBACK_VERSION:
+        return parts[1], parts[2:]
+    action, _, arg = data.partition('_')
+    return action, [arg] if arg else []
+
+def decode_int_arg(data, index=0):
+    """Возвращает целочисленный аргумент из callback_data"""
+    _, args = decode_callback(data)
+    return int(args[index])
+
+def callback_pattern(action, args_count=1):
+    """Возвращает регулярное выражение для CallbackQueryHandler с числовыми аргументами"""
+    args_pattern = ''.join(rf'{CALLBACK_SEPARATOR}\d+' for _ in range(args_count))
+    return rf'^{CALLBACK_VERSION}{CALLBACK_SEPARATOR}{re.escape(action)}{args_pattern}$'
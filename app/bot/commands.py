@@ -0,0 +1,144 @@
+import asyncio
+import json
+import logging
+import time
+from datetime import datetime, timedelta
+from ..config import Config
+from .. import runtime
+from .. import queries
+from ..database import db_session
+from ..models import BotCommand, CommandStatus
+
+logger = logging.getLogger(__name__)
+
+# Команды для процесса бота
+SEND_WEEKLY_POST = 'send_weekly_post'  # Отправить еженедельный пост о ближайшей тренировке
+UPDATE_ROSTER_POST = 'update_roster_post'  # Обновить пост с составом: training_id
+
+# Обработчики команд: имя -> async def handler(bot, **payload)
+_command_handlers = {}
+
+def register_command_handler(command, handler):
+    """Регистрирует обработчик команды, которую выполняет процесс бота"""
+    _command_handlers[command] = handler
+
+def enqueue_command(command, **payload):
+    """
+    Ставит команду в очередь для процесса бота.
+    Используется, когда бот запущен в другом процессе (роль web) или еще не подключился.
+    """
+    try:
+        db_session.add(BotCommand(
+            command=command,
+            payload=json.dumps(payload) if payload else None,
+            status=CommandStatus.PENDING
+        ))
+        db_session.commit()
+        logger.info(f"📨 Команда {command} поставлена в очередь для бота")
+        return True
+    except Exception as e:
+        logger.error(f"❌ Не удалось поставить команду {command} в очередь: {e}")
+        db_session.rollback()
+        return False
+
+def _claim_command(command_id):
+    """Помечает команду как взятую в работу; False, если ее уже забрал другой процесс бота"""
+    claimed = db_session.query(BotCommand)\
+        .filter(BotCommand.id == command_id, BotCommand.status == CommandStatus.PENDING)\
+        .update({
+            BotCommand.status: CommandStatus.PROCESSING,
+            BotCommand.claimed_at: datetime.now()
+        }, synchronize_session=False)
+    db_session.commit()
+    return claimed == 1
+
+def _reclaim_stale_commands():
+    """
+    Возвращает в очередь команды, которые висят в PROCESSING дольше BOT_COMMAND_PROCESSING_TIMEOUT_MINUTES:
+    взявший их процесс бота упал или перезапустился, не отметив результат.
+    """
+    stale_before = datetime.now() - timedelta(minutes=Config.BOT_COMMAND_PROCESSING_TIMEOUT_MINUTES)
+    reclaimed = db_session.query(BotCommand)\
+        .filter(BotCommand.status == CommandStatus.PROCESSING, BotCommand.claimed_at < stale_before)\
+        .update({
+            BotCommand.status: CommandStatus.PENDING,
+            BotCommand.claimed_at: None
+        }, synchronize_session=False)
+    db_session.commit()
+    if reclaimed:
+        logger.warning(f"⚠️ Возвращено в очередь зависших команд: {reclaimed}")
+    return reclaimed
+
+async def process_pending_commands(bot):
+    """Выполняет команды из очереди по порядку; возвращает количество обработанных"""
+    _reclaim_stale_commands()
+    pending = queries.pending_commands(Config.BOT_COMMAND_BATCH_SIZE)
+
+    processed = 0
+    for command_id, command, payload in pending:
+        if not _claim_command(command_id):
+            continue
+
+        status, error = CommandStatus.DONE, None
+        handler = _command_handlers.get(command)
+        try:
+            if handler is None:
+                raise ValueError(f"неизвестная команда {command}")
+            await handler(bot, **(json.loads(payload) if payload else {}))
+        except Exception as e:
+            logger.error(f"❌ Ошибка при выполнении команды #{command_id} {command}: {e}")
+            db_session.rollback()
+            status, error = CommandStatus.FAILED, str(e)
+
+        db_session.query(BotCommand)\
+            .filter(BotCommand.id == command_id)\
+            .update({
+                BotCommand.status: status,
+                BotCommand.error: error,
+                BotCommand.processed_at: datetime.now()
+            }, synchronize_session=False)
+        db_session.commit()
+        processed += 1
+    return processed
+
+def purge_done_commands(now=None):
+    """
+    Удаляет выполненные команды старше BOT_COMMAND_RETENTION_DAYS, чтобы очередь не росла бесконечно.
+    Неудачные (FAILED) остаются для разбора. Возвращает количество удаленных.
+    """
+    now = now or datetime.now()
+    purged = db_session.query(BotCommand)\
+        .filter(
+            BotCommand.status == CommandStatus.DONE,
+            BotCommand.processed_at < now - timedelta(days=Config.BOT_COMMAND_RETENTION_DAYS)
+        )\
+        .delete(synchronize_session=False)
+    db_session.commit()
+    if purged:
+        logger.info(f"🧹 Удалено выполненных команд из очереди: {purged}")
+    return purged
+
+# Как часто очищать очередь от выполненных команд
+PURGE_INTERVAL_SECONDS = 3600
+
+async def bot_command_consumer_task(bot):
+    """Фоновая задача процесса бота: забирает команды из очереди"""
+    logger.info("📬 Запущен обработчик очереди команд для бота")
+    next_purge_at = time.monotonic()
+    while True:
+        try:
+            await process_pending_commands(bot)
+            if time.monotonic() >= next_purge_at:
+                next_purge_at = time.monotonic() + PURGE_INTERVAL_SECONDS
+                purge_done_commands()
+        except Exception as e:
+            logger.error(f"❌ Ошибка в обработчике очереди команд: {e}")
+            db_session.rollback()
+        finally:
+            db_session.remove()
+        runtime.record_loop_tick('bot_commands', Config.BOT_COMMAND_POLL_SECONDS)
+        await asyncio.sleep(Config.BOT_COMMAND_POLL_SECONDS)
+
+def start_bot_command_consumer(bot):
+    """Запускает обработку очереди команд в event loop бота"""
+    return asyncio.create_task(bot_command_consumer_task(bot))
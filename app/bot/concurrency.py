@@ -0,0 +1,114 @@
+import asyncio
+import logging
+import time
+from functools import wraps
+from ..config import Config
+from ..database import db_session, user_context
+
+logger = logging.getLogger(__name__)
+
+# Блокировки пользователей: user_id -> [asyncio.Lock, количество ожидающих и выполняющихся обновлений]
+_user_locks = {}
+
+def serialize_per_user(handler):
+    """
+    Декоратор обработчика: обновления разных пользователей обрабатываются параллельно,
+    а обновления одного пользователя (например, двойное нажатие кнопки) - строго по очереди.
+    После обработки закрывает сессию БД задачи.
+    """
+    @wraps(handler)
+    async def wrapper(update, context):
+        user = getattr(update, 'effective_user', None)
+        try:
+            if user is None:
+                return await handler(update, context)
+            
+            entry = _user_locks.setdefault(user.id, [asyncio.Lock(), 0])
+            entry[1] += 1
+            try:
+                async with entry[0]:
+                    return await handler(update, context)
+            finally:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    _user_locks.pop(user.id, None)
+        finally:
+            db_session.remove()
+    return wrapper
+
+def route_database(handler, read_only=False):
+    """
+    Декоратор обработчика: запросы к БД выполняются от имени пользователя Telegram.
+    read_only=True - обработчик только показывает данные, и его чтение может уйти на реплику
+    (кроме пользователей, которые только что сами что-то записали).
+    """
+    @wraps(handler)
+    async def wrapper(update, context):
+        user = getattr(update, 'effective_user', None)
+        with user_context(f"user:{user.id}" if user else None, read_only):
+            return await handler(update, context)
+    return wrapper
+
+class CallbackDeduplicator:
+    """
+    Кэш недавно обработанных нажатий кнопок с коротким TTL.
+    Ключ - (user_id, callback_data, message_id): повторное нажатие той же кнопки
+    в том же сообщении в течение ttl секунд считается дублем.
+    """
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self.suppressed = 0  # Сколько дублей отброшено
+        self._expires_at = {}  # key -> время истечения (time.monotonic); порядок вставки = порядок истечения
+
+    def _purge(self, now):
+        while self._expires_at:
+            key, expires_at = next(iter(self._expires_at.items()))
+            if expires_at > now:
+                break
+            del self._expires_at[key]
+
+    def is_duplicate(self, key):
+        """Проверяет, было ли такое нажатие недавно; если нет - запоминает его"""
+        now = time.monotonic()
+        self._purge(now)
+        if key in self._expires_at:
+            self.suppressed += 1
+            return True
+        self._expires_at[key] = now + self.ttl
+        return False
+
+    def remember(self, key):
+        """Продлевает TTL нажатия с текущего момента (после завершения обработки)"""
+        self._expires_at.pop(key, None)
+        self._expires_at[key] = time.monotonic() + self.ttl
+
+callback_deduplicator = CallbackDeduplicator(Config.CALLBACK_DEDUP_TTL_SECONDS)
+
+def deduplicate_callback(handler):
+    """
+    Декоратор обработчика: повторные нажатия той же кнопки в пределах CALLBACK_DEDUP_TTL_SECONDS
+    отбрасываются до обращения к БД. Вместе с serialize_per_user дубль проверяется
+    только после завершения обработки первого нажатия.
+    """
+    @wraps(handler)
+    async def wrapper(update, context):
+        query = getattr(update, 'callback_query', None)
+        if query is None or query.message is None:
+            return await handler(update, context)
+        
+        key = (update.effective_user.id, query.data, query.message.message_id)
+        if callback_deduplicator.is_duplicate(key):
+            logger.info(f"⏭️ Повторное нажатие {query.data} от пользователя {update.effective_user.id} пропущено")
+            try:
+                # Убираем индикатор загрузки на кнопке
+                await query.answer()
+            except Exception:
+                pass
+            return
+        
+        try:
+            return await handler(update, context)
+        finally:
+            callback_deduplicator.remember(key)
+    return wrapper
@@ -1,18 +1,35 @@
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes, CommandHandler, CallbackQueryHandler, Application
 from telegram.error import NetworkError, TimedOut, BadRequest, Forbidden
-from datetime import datetime
+from datetime import datetime, timedelta
 import logging
 import re
-from ..models import Training, Registration, UserPreferences, Player, PositionType, TeamAssignment
+import time
+from ..models import Training, Registration, UserPreferences, Player, PositionType
 from ..config import Config
-from ..database import db_session
-from .weekly_posts import send_weekly_training_post
+from .. import runtime
+from .. import queries
+from .. import snapshots
+from .. import player_stats
+from ..snapshots import RegistrationSnapshot, TrainingSnapshot
+from ..database import db_session, primary_reads
+from .weekly_posts import send_weekly_training_post, start_roster_post_updates, get_next_training
+from .. import roster
+from ..roster import roster_changed, participant_to_dict
+from . import callbacks
+from .callbacks import encode_callback, decode_int_arg, callback_pattern
+from .concurrency import serialize_per_user, deduplicate_callback, callback_deduplicator, route_database
+from .commands import start_bot_command_consumer
+from .rendering import split_message
+from .rate_limit import TokenBucket, PriorityRateLimiter, bulk_lane_kwargs
 
 # Настройка логирования
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Ограничитель исходящих запросов: ответы пользователям обслуживаются раньше массовых отправок
+outbound_limiter = PriorityRateLimiter(Config.OUTBOUND_INTERACTIVE_RATE, Config.OUTBOUND_BULK_RATE)
+
 def escape_markdown(text):
     """Экранирует специальные символы Markdown"""
     if not text:
@@ -81,6 +98,40 @@ def get_info_keyboard():
         [InlineKeyboardButton("Мои записи", callback_data='my_registrations')]
     ])
 
+# Сколько последних отрисованных экранов хранить для каждого чата
+RENDERED_VIEWS_LIMIT = 20
+
+async def show_view(query, context: ContextTypes.DEFAULT_TYPE, text, reply_markup=None, parse_mode=None):
+    """
+    Показывает экран навигации, редактируя сообщение с нажатой кнопкой вместо отправки нового.
+    Если экран в этом сообщении не изменился, запрос к Telegram не отправляется.
+    Если сообщение нельзя отредактировать (например, оно слишком старое), отправляется новое.
+    """
+    message = query.message
+    rendered = hash((text, parse_mode, reply_markup.to_json() if reply_markup else None))
+    chat_data = context.chat_data if context.chat_data is not None else {}
+    rendered_views = chat_data.setdefault('rendered_views', {})
+    
+    if rendered_views.get(message.message_id) == rendered:
+        return
+    
+    try:
+        await query.edit_message_text(text, reply_markup=reply_markup, parse_mode=parse_mode)
+    except BadRequest as e:
+        error_msg = str(e).lower()
+        if 'message is not modified' in error_msg:
+            pass
+        elif "can't be edited" in error_msg or 'no text in the message' in error_msg:
+            message = await message.reply_text(text, reply_markup=reply_markup, parse_mode=parse_mode)
+        else:
+            raise
+    
+    rendered_views[message.message_id] = rendered
+    # Оставляем только последние экраны, чтобы chat_data не рос бесконечно
+    while len(rendered_views) > RENDERED_VIEWS_LIMIT:
+        rendered_views.pop(next(iter(rendered_views)))
+
+@primary_reads()
 def update_temporary_user_id(real_user_id, username):
     """
     Обновляет временный user_id на реальный, когда пользователь впервые взаимодействует с ботом.
@@ -91,10 +142,7 @@ def update_temporary_user_id(real_user_id, username):
     
     try:
         # Ищем игрока с таким же username и отрицательным (временным) user_id
-        temp_player = db_session.query(Player)\
-            .filter(Player.username == username)\
-            .filter(Player.user_id < 0)\
-            .first()
+        temp_player = queries.temporary_player(username)
         
         if temp_player:
             logger.info(f"Найден временный игрок с username={username}, обновляем user_id с {temp_player.user_id} на {real_user_id}")
@@ -107,6 +155,8 @@ def update_temporary_user_id(real_user_id, username):
             for reg in registrations:
                 reg.user_id = real_user_id
                 logger.info(f"Обновлена регистрация {reg.id} на тренировку {reg.training_id}")
+            changed_training_ids = {reg.training_id for reg in registrations}
+            player_stats.merge_players(temp_player.user_id, real_user_id)
             
             # Обновляем предпочтения пользователя, если есть
             temp_prefs = db_session.query(UserPreferences)\
@@ -141,74 +191,46 @@ def update_temporary_user_id(real_user_id, username):
                 db_session.delete(temp_player)
             
             db_session.commit()
+            for training_id in changed_training_ids:
+                roster_changed(training_id, update_post=False)
             logger.info(f"Успешно обновлен user_id для игрока {username}")
             
     except Exception as e:
         logger.error(f"Ошибка при обновлении временного user_id: {e}")
         db_session.rollback()
 
-@handle_telegram_errors
-async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    # Обновляем временный user_id на реальный, если необходимо
-    user_id = update.effective_user.id
-    username = update.effective_user.username
-    if username:
-        update_temporary_user_id(user_id, username)
-    
-    reply_markup = get_standard_keyboard()
-    await update.message.reply_text(
-        'Добро пожаловать! Выберите действие:',
-        reply_markup=reply_markup
-    )
+class RegistrationError(Exception):
+    """Запись на тренировку невозможна; текст исключения показывается пользователю"""
 
-@handle_telegram_errors
-async def register_training(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    query = update.callback_query
-    user_id = update.effective_user.id
-    username = update.effective_user.username
-    
-    # Обновляем временный user_id на реальный, если необходимо
-    if username:
-        update_temporary_user_id(user_id, username)
-    
-    # Извлекаем ID тренировки из callback_data (формат: register_123)
-    training_id = int(query.data.split('_')[1])
+def register_user_for_training(user, training):
+    """
+    Записывает пользователя Telegram на тренировку с учетом его предпочтений.
+    Возвращает количество участников после записи; если записаться нельзя, выбрасывает RegistrationError.
+    """
+    user_id = user.id
     
-    # Получаем выбранную тренировку
-    training = db_session.query(Training)\
-        .filter(Training.id == training_id)\
-        .filter(Training.date_time > datetime.now())\
-        .first()
-        
-    if not training:
-        await query.answer("Тренировка не найдена или уже прошла")
-        return
+    if not training or training.date_time <= datetime.now():
+        raise RegistrationError("Тренировка не найдена или уже прошла")
         
     # Проверяем, не записан ли уже пользователь
-    existing_reg = db_session.query(Registration)\
-        .filter_by(training_id=training.id, user_id=user_id)\
-        .first()
+    existing_reg = queries.user_registration(training.id, user_id)
         
     if existing_reg:
-        await query.answer("Вы уже записаны на эту тренировку")
-        return
+        raise RegistrationError("Вы уже записаны на эту тренировку")
     
     # Проверяем количество участников
-    participants_count = db_session.query(Registration)\
-        .filter_by(training_id=training.id)\
-        .count()
+    participants_count = queries.registrations_count(training.id)
     
     if participants_count >= training.max_participants:
-        await query.answer("К сожалению, все места уже заняты")
-        return
+        raise RegistrationError("К сожалению, все места уже заняты")
         
     # Получаем предпочтения пользователя
-    user_prefs = db_session.query(UserPreferences).filter_by(user_id=user_id).first()
+    user_prefs = queries.user_preferences(user_id)
     
     # Создаем новую запись с предпочтениями пользователя
     # Используем display_name из предпочтений, если есть, иначе username
     display_name = user_prefs.display_name if user_prefs and user_prefs.display_name else None
-    username = update.effective_user.username or "Без имени"
+    username = user.username or "Без имени"
     
     registration = Registration(
         training_id=training.id,
@@ -223,6 +245,7 @@ async def register_training(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     try:
         db_session.add(registration)
+        player_stats.registrations_added([registration], training.date_time)
         
         # Обновляем или создаем запись в таблице players
         existing_player = db_session.query(Player).filter_by(user_id=user_id).first()
@@ -247,19 +270,88 @@ async def register_training(update: Update, context: ContextTypes.DEFAULT_TYPE):
             db_session.add(new_player)
         
         db_session.commit()
-        await query.answer("Вы успешно записались на тренировку!")
-        
-        # Отправляем сообщение с подтверждением и деталями
-        message = f"✅ Вы записаны на тренировку:\n"
-        message += f"📅 {training.date_time.strftime('%d.%m.%Y %H:%M')}\n"
-        message += f"👥 Участников: {participants_count + 1}/{training.max_participants}"
-        
-        reply_markup = get_standard_keyboard()
-        await query.message.reply_text(message, reply_markup=reply_markup)
     except Exception as e:
         db_session.rollback()
-        print(f"Error during registration: {e}")
-        await query.answer("Произошла ошибка при записи. Попробуйте позже.")
+        logger.error(f"Ошибка при записи на тренировку: {e}")
+        raise RegistrationError("Произошла ошибка при записи. Попробуйте позже.")
+    
+    roster_changed(training.id, roster.REGISTERED, participant=participant_to_dict(registration))
+    return participants_count + 1
+
+def format_registration_confirmation(training, participants_count):
+    """Формирует сообщение с подтверждением записи на тренировку"""
+    message = f"✅ Вы записаны на тренировку:\n"
+    message += f"📅 {training.date_time.strftime('%d.%m.%Y %H:%M')}\n"
+    message += f"👥 Участников: {participants_count}/{training.max_participants}"
+    return message
+
+async def register_from_deep_link(update: Update, payload):
+    """
+    Обрабатывает ссылку вида t.me/<бот>?start=register[_<id тренировки>]:
+    записывает пользователя на ближайшую или указанную тренировку сразу, без перехода по меню.
+    """
+    match = re.fullmatch(r'register(?:_(\d+))?', payload)
+    if not match:
+        return False
+    
+    if match.group(1):
+        training = db_session.query(Training).get(int(match.group(1)))
+    else:
+        training = get_next_training()
+    
+    try:
+        participants_count = register_user_for_training(update.effective_user, training)
+        message = format_registration_confirmation(training, participants_count)
+    except RegistrationError as e:
+        message = f"❌ {e}"
+    
+    await update.message.reply_text(message, reply_markup=get_standard_keyboard())
+    return True
+
+@handle_telegram_errors
+async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    # Обновляем временный user_id на реальный, если необходимо
+    user_id = update.effective_user.id
+    username = update.effective_user.username
+    if username:
+        update_temporary_user_id(user_id, username)
+    
+    # Ссылка на запись из поста в канале: регистрируем сразу
+    if context.args and await register_from_deep_link(update, context.args[0]):
+        return
+    
+    reply_markup = get_standard_keyboard()
+    await update.message.reply_text(
+        'Добро пожаловать! Выберите действие:',
+        reply_markup=reply_markup
+    )
+
+@handle_telegram_errors
+async def register_training(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    user_id = update.effective_user.id
+    username = update.effective_user.username
+    
+    # Обновляем временный user_id на реальный, если необходимо
+    if username:
+        update_temporary_user_id(user_id, username)
+    
+    # Извлекаем ID тренировки из callback_data
+    training_id = decode_int_arg(query.data)
+    training = db_session.query(Training).get(training_id)
+    
+    try:
+        participants_count = register_user_for_training(update.effective_user, training)
+    except RegistrationError as e:
+        await query.answer(str(e))
+        return
+    
+    await query.answer("Вы успешно записались на тренировку!")
+    
+    # Показываем подтверждение с деталями
+    message = format_registration_confirmation(training, participants_count)
+    reply_markup = get_standard_keyboard()
+    await show_view(query, context, message, reply_markup=reply_markup)
 
 @handle_telegram_errors
 async def show_schedule(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -271,40 +363,59 @@ async def show_schedule(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if username:
         update_temporary_user_id(user_id, username)
     
-    # Получаем все предстоящие тренировки
-    trainings = db_session.query(Training)\
-        .filter(Training.date_time > datetime.now())\
-        .order_by(Training.date_time)\
-        .all()
+    # Номер страницы: 0 для кнопки "Показать расписание", иначе из callback_data
+    page = 0 if query.data == 'schedule' else decode_int_arg(query.data)
+    page_size = Config.SCHEDULE_PAGE_SIZE
+    
+    # Получаем только тренировки текущей страницы вместе с количеством участников.
+    # Запрашиваем на одну больше, чтобы понять, есть ли следующая страница
+    def load_page(page):
+        return queries.schedule_page(page_size + 1, page * page_size)
+    
+    rows = load_page(page)
+    if not rows and page > 0:
+        # Страница устарела (тренировки прошли или удалены) - показываем первую
+        page = 0
+        rows = load_page(page)
     
-    if not trainings:
+    if not rows:
         await query.answer("Нет запланированных тренировок")
         message = "В данный момент нет запланированных тренировок"
         reply_markup = get_standard_keyboard()
-        await query.message.reply_text(message, reply_markup=reply_markup)
+        await show_view(query, context, message, reply_markup=reply_markup)
         return
     
+    has_next_page = len(rows) > page_size
+    rows = rows[:page_size]
+    
     # Формируем сообщение с расписанием
-    message = "📅 Расписание тренировок:\n\n"
-    for training in trainings:
-        participants = len(training.registrations)
+    message = "📅 Расписание тренировок:\n\n" if page == 0 else f"📅 Расписание тренировок (стр. {page + 1}):\n\n"
+    for training, participants in rows:
         message += f"🕒 {training.date_time.strftime('%d.%m.%Y %H:%M')}\n"
         message += f"👥 Участников: {participants}/{training.max_participants}\n\n"
     
-    # Создаем клавиатуру с кнопками для записи на каждую тренировку (до 5)
+    # Создаем клавиатуру с кнопками для записи на каждую тренировку страницы
     keyboard = []
-    for training in trainings[:5]:  # Ограничиваем 5 тренировками
-        participants = len(training.registrations)
+    for training, participants in rows:
         date_str = training.date_time.strftime('%d.%m %H:%M')
         button_text = f"📅 {date_str} ({participants}/{training.max_participants})"
-        keyboard.append([InlineKeyboardButton(button_text, callback_data=f'register_{training.id}')])
+        keyboard.append([InlineKeyboardButton(button_text, callback_data=encode_callback(callbacks.REGISTER, training.id))])
+    
+    # Кнопки перехода между страницами
+    navigation = []
+    if page > 0:
+        navigation.append(InlineKeyboardButton("◀️ Назад", callback_data=encode_callback(callbacks.SCHEDULE_PAGE, page - 1)))
+    if has_next_page:
+        navigation.append(InlineKeyboardButton("Далее ▶️", callback_data=encode_callback(callbacks.SCHEDULE_PAGE, page + 1)))
+    if navigation:
+        keyboard.append(navigation)
     
     # Добавляем кнопку возврата в меню
     keyboard.append([InlineKeyboardButton("🔙 Вернуться в меню", callback_data='start')])
     reply_markup = InlineKeyboardMarkup(keyboard)
     
     await query.answer()
-    await query.message.reply_text(message, reply_markup=reply_markup)
+    await show_view(query, context, message, reply_markup=reply_markup)
 
 @handle_telegram_errors
 async def show_my_registrations(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -316,23 +427,8 @@ async def show_my_registrations(update: Update, context: ContextTypes.DEFAULT_TY
     if username:
         update_temporary_user_id(user_id, username)
     
-    # Получаем предстоящие тренировки
-    upcoming_registrations = db_session.query(Registration)\
-        .join(Training)\
-        .filter(Registration.user_id == user_id)\
-        .filter(Training.date_time > datetime.now())\
-        .order_by(Training.date_time)\
-        .all()
-    
-    # Получаем прошедшие неоплаченные тренировки (только для не-вратарей)
-    past_unpaid_registrations = db_session.query(Registration)\
-        .join(Training)\
-        .filter(Registration.user_id == user_id)\
-        .filter(Training.date_time <= datetime.now())\
-        .filter(Registration.paid == False)\
-        .filter(Registration.goalkeeper == False)\
-        .order_by(Training.date_time)\
-        .all()
+    # Получаем предстоящие тренировки и прошедшие неоплаченные (только для не-вратарей)
+    upcoming_registrations, past_unpaid_registrations = snapshots.load_user_registrations(user_id)
     
     # Объединяем списки
     registrations = upcoming_registrations + past_unpaid_registrations
@@ -341,7 +437,7 @@ async def show_my_registrations(update: Update, context: ContextTypes.DEFAULT_TY
         await query.answer("У вас нет активных записей")
         message = "У вас нет активных записей на тренировки"
         reply_markup = get_standard_keyboard()
-        await query.message.reply_text(message, reply_markup=reply_markup)
+        await show_view(query, context, message, reply_markup=reply_markup)
         return
     
     # Формируем сообщение со списком записей
@@ -350,17 +446,11 @@ async def show_my_registrations(update: Update, context: ContextTypes.DEFAULT_TY
     for i, reg in enumerate(registrations, 1):
         message += f"{i}. 📅 {reg.training.date_time.strftime('%d.%m.%Y %H:%M')}\n"
         
-        # Получаем статус team_assigned из таблицы TeamAssignment
-        team_assignment = db_session.query(TeamAssignment)\
-            .filter_by(training_id=reg.training_id, user_id=reg.user_id)\
-            .first()
-        team_assigned = team_assignment.team_assigned if team_assignment else False
-        
         # Если команда назначена, показываем полную информацию
-        if team_assigned:
+        if reg.team_assigned:
             # Добавляем информацию о выбранной футболке и команде
-            if reg.jersey_type:
-                if reg.jersey_type.value == 'light':
+            if reg.jersey:
+                if reg.jersey == 'light':
                     jersey_info = "⚪"
                 else:
                     jersey_info = "⚫"
@@ -368,16 +458,16 @@ async def show_my_registrations(update: Update, context: ContextTypes.DEFAULT_TY
             else:
                 message += f"   👕 Футболка не выбрана"
             
-            if reg.team_type:
-                if reg.team_type.value == 'first':
+            if reg.team:
+                if reg.team == 'first':
                     team_info = "1️⃣"
                 else:
                     team_info = "2️⃣"
                 message += f" {team_info}"
                 
                 # Добавляем информацию об амплуа для полевых игроков
-                if not reg.goalkeeper and reg.position_type:
-                    if reg.position_type.value == 'forward':
+                if not reg.goalkeeper and reg.position:
+                    if reg.position == 'forward':
                         position_info = " - Нап"
                     else:
                         position_info = " - Зщ"
@@ -418,14 +508,14 @@ async def show_my_registrations(update: Update, context: ContextTypes.DEFAULT_TY
     reply_markup = InlineKeyboardMarkup(keyboard)
     
     await query.answer()
-    await query.message.reply_text(message, reply_markup=reply_markup)
+    await show_view(query, context, message, reply_markup=reply_markup)
 
 async def mark_payment(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     user_id = update.effective_user.id
     
     # Извлекаем ID регистрации из callback_data
-    registration_id = int(query.data.split('_')[1])
+    registration_id = decode_int_arg(query.data)
     
     # Находим регистрацию
     registration = db_session.query(Registration).filter_by(id=registration_id, user_id=user_id).first()
@@ -437,43 +527,71 @@ async def mark_payment(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # Проверяем, что пользователь не оплатил уже
     if registration.paid:
         await query.answer("Вы уже отметили оплату для этой тренировки")
-        return
-    
-    # Отмечаем как оплаченную
-    registration.paid = True
-    db_session.commit()
+    else:
+        # Отмечаем как оплаченную
+        registration.paid = True
+        registration.paid_at = datetime.now()
+        player_stats.registration_paid(registration, registration.training.date_time)
+        db_session.commit()
+        roster_changed(registration.training_id, roster.PAID, registration_id=registration.id, update_post=False)
+        await query.answer("✅ Оплата отмечена!")
     
-    await query.answer("✅ Оплата отмечена!")
+    # Кнопка нажата в напоминании или на экране оплаты: в том же сообщении остаются кнопки
+    # оставшихся неоплаченных тренировок, чтобы их можно было отметить подряд
+    await show_unpaid_registrations(query, context, user_id)
+
+def build_payment_keyboard(registrations):
+    """Кнопка оплаты на каждую тренировку и переход к записям"""
+    keyboard = [
+        [InlineKeyboardButton(
+            f"✅ Оплатил {reg.training.date_time.strftime('%d.%m %H:%M')}",
+            callback_data=encode_callback(callbacks.PAY, reg.id)
+        )]
+        for reg in registrations
+    ]
+    keyboard.append([InlineKeyboardButton("📋 Мои записи", callback_data='my_registrations')])
+    return InlineKeyboardMarkup(keyboard)
+
+async def show_unpaid_registrations(query, context: ContextTypes.DEFAULT_TYPE, user_id):
+    """Экран оплаты: неоплаченные тренировки пользователя (вратари не платят) с кнопкой на каждую"""
+    upcoming, past_unpaid = snapshots.load_user_registrations(user_id)
+    unpaid = [reg for reg in past_unpaid + upcoming if not reg.paid and not reg.goalkeeper]
     
-    # Обновляем сообщение
-    await show_my_registrations(update, context)
+    if not unpaid:
+        message = "✅ Все тренировки оплачены"
+    else:
+        message = f"💰 Неоплаченные тренировки ({len(unpaid)}):\n"
+        for reg in unpaid:
+            message += f"📅 {reg.training.date_time.strftime('%d.%m.%Y в %H:%M')}\n"
+        message += f"\nНажмите кнопку с датой тренировки, чтобы отметить оплату:"
+    await show_view(query, context, message, reply_markup=build_payment_keyboard(unpaid))
 
 async def view_training_participants(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     user_id = update.effective_user.id
     
-    # Получаем все предстоящие тренировки
-    trainings = db_session.query(Training)\
-        .filter(Training.date_time > datetime.now())\
-        .order_by(Training.date_time)\
-        .all()
+    # Получаем составы всех предстоящих тренировок
+    rosters = snapshots.load_upcoming_rosters()
     
-    if not trainings:
+    if not rosters:
         await query.answer("Нет предстоящих тренировок")
         message = "Нет предстоящих тренировок"
         reply_markup = get_standard_keyboard()
-        await query.message.reply_text(message, reply_markup=reply_markup)
+        await show_view(query, context, message, reply_markup=reply_markup)
         return
     
-    # Формируем сообщение со списком участников для каждой тренировки
-    message = "👥 *Участники тренировок:*\n\n"
+    # Формируем состав по блокам - по одному на тренировку, чтобы длинный список
+    # можно было разбить на несколько сообщений, не разрывая разметку
+    blocks = ["👥 *Участники тренировок:*\n\n"]
     
-    for training in trainings:
-        message += f"📅 *{training.date_time.strftime('%d.%m.%Y %H:%M')}*\n"
-        message += f"👥 Участников: {len(training.registrations)}/{training.max_participants}\n\n"
+    for roster_snapshot in rosters:
+        training = roster_snapshot.training
+        block = f"📅 *{training.date_time.strftime('%d.%m.%Y %H:%M')}*\n"
+        block += f"👥 Участников: {len(roster_snapshot.registrations)}/{training.max_participants}\n\n"
         
-        if not training.registrations:
-            message += "Пока никто не записался\n\n"
+        if not roster_snapshot.registrations:
+            block += "Пока никто не записался\n\n"
+            blocks.append(block)
             continue
         
         # Сортируем участников: сначала вратари, потом игроки по командам и майкам
@@ -484,81 +602,76 @@ async def view_training_participants(update: Update, context: ContextTypes.DEFAU
         dark_second_team = []
         unassigned = []
         
-        for reg in training.registrations:
-            display_name = reg.display_name or reg.username or 'Без имени'
-            
-            # Получаем статус team_assigned из таблицы TeamAssignment
-            team_assignment = db_session.query(TeamAssignment)\
-                .filter_by(training_id=training.id, user_id=reg.user_id)\
-                .first()
-            team_assigned = team_assignment.team_assigned if team_assignment else False
+        for reg in roster_snapshot.registrations:
+            display_name = reg.name or 'Без имени'
             
             if reg.goalkeeper:
-                goalkeepers.append((display_name, reg.jersey_type, reg.paid))
-            elif team_assigned and reg.jersey_type and reg.team_type:
+                goalkeepers.append((display_name, reg.jersey, reg.paid))
+            elif reg.team_assigned and reg.jersey and reg.team:
                 # Добавляем информацию об амплуа для полевых игроков
                 position_info = ""
-                if reg.position_type:
-                    if reg.position_type.value == 'forward':
+                if reg.position:
+                    if reg.position == 'forward':
                         position_info = " - Нап"
                     else:
                         position_info = " - Зщ"
                 
-                if reg.jersey_type.value == 'light' and reg.team_type.value == 'first':
+                if reg.jersey == 'light' and reg.team == 'first':
                     light_first_team.append((display_name, reg.paid, position_info))
-                elif reg.jersey_type.value == 'dark' and reg.team_type.value == 'first':
+                elif reg.jersey == 'dark' and reg.team == 'first':
                     dark_first_team.append((display_name, reg.paid, position_info))
-                elif reg.jersey_type.value == 'light' and reg.team_type.value == 'second':
+                elif reg.jersey == 'light' and reg.team == 'second':
                     light_second_team.append((display_name, reg.paid, position_info))
-                elif reg.jersey_type.value == 'dark' and reg.team_type.value == 'second':
+                elif reg.jersey == 'dark' and reg.team == 'second':
                     dark_second_team.append((display_name, reg.paid, position_info))
             else:
                 unassigned.append((display_name, reg.paid))
         
         # Выводим вратарей
         if goalkeepers:
-            message += "🥅 *Вратари:*\n"
-            for name, jersey_type, paid in goalkeepers:
-                jersey_emoji = "⚪" if jersey_type and jersey_type.value == 'light' else "⚫"
-                message += f"• {escape_markdown(name)} {jersey_emoji}\n"
-            message += "\n"
+            block += "🥅 *Вратари:*\n"
+            for name, jersey, paid in goalkeepers:
+                jersey_emoji = "⚪" if jersey == 'light' else "⚫"
+                block += f"• {escape_markdown(name)} {jersey_emoji}\n"
+            block += "\n"
         
         # Выводим игроков первой пятерки (светлые)
         if light_first_team:
-            message += "⚪ *1-ая пятерка (светлые):*\n"
+            block += "⚪ *1-ая пятерка (светлые):*\n"
             for name, paid, position_info in light_first_team:
-                message += f"• {escape_markdown(name)}{position_info}\n"
-            message += "\n"
+                block += f"• {escape_markdown(name)}{position_info}\n"
+            block += "\n"
         
         # Выводим игроков первой пятерки (темные)
         if dark_first_team:
-            message += "⚫ *1-ая пятерка (темные):*\n"
+            block += "⚫ *1-ая пятерка (темные):*\n"
             for name, paid, position_info in dark_first_team:
-                message += f"• {escape_markdown(name)}{position_info}\n"
-            message += "\n"
+                block += f"• {escape_markdown(name)}{position_info}\n"
+            block += "\n"
         
         # Выводим игроков второй пятерки (светлые)
         if light_second_team:
-            message += "⚪ *2-ая пятерка (светлые):*\n"
+            block += "⚪ *2-ая пятерка (светлые):*\n"
             for name, paid, position_info in light_second_team:
-                message += f"• {escape_markdown(name)}{position_info}\n"
-            message += "\n"
+                block += f"• {escape_markdown(name)}{position_info}\n"
+            block += "\n"
         
         # Выводим игроков второй пятерки (темные)
         if dark_second_team:
-            message += "⚫ *2-ая пятерка (темные):*\n"
+            block += "⚫ *2-ая пятерка (темные):*\n"
             for name, paid, position_info in dark_second_team:
-                message += f"• {escape_markdown(name)}{position_info}\n"
-            message += "\n"
+                block += f"• {escape_markdown(name)}{position_info}\n"
+            block += "\n"
         
         # Выводим нераспределенных участников
         if unassigned:
-            message += "❓ *Нераспределенные:*\n"
+            block += "❓ *Нераспределенные:*\n"
             for name, paid in unassigned:
-                message += f"• {escape_markdown(name)}\n"
-            message += "\n"
+                block += f"• {escape_markdown(name)}\n"
+            block += "\n"
         
-        message += "━━━━━━━━━━━━━━━\n\n"
+        block += "━━━━━━━━━━━━━━━\n\n"
+        blocks.append(block)
     
     # Создаем клавиатуру с кнопкой возврата
     keyboard = [
@@ -567,14 +680,27 @@ async def view_training_participants(update: Update, context: ContextTypes.DEFAU
     reply_markup = InlineKeyboardMarkup(keyboard)
     
     await query.answer()
-    await query.message.reply_text(message, reply_markup=reply_markup, parse_mode='Markdown')
+    
+    # Первая часть заменяет экран в текущем сообщении, остальные отправляются следом;
+    # кнопка возврата - под последней частью
+    chunks = split_message(blocks)
+    if len(chunks) == 1:
+        await show_view(query, context, chunks[0], reply_markup=reply_markup, parse_mode='Markdown')
+        return
+    await show_view(query, context, chunks[0], parse_mode='Markdown')
+    for i, chunk in enumerate(chunks[1:], 2):
+        await query.message.reply_text(
+            chunk,
+            reply_markup=reply_markup if i == len(chunks) else None,
+            parse_mode='Markdown'
+        )
 
 async def cancel_registration(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     user_id = update.effective_user.id
     
     # Получаем ID регистрации из callback_data
-    reg_id = int(query.data.split('_')[1])
+    reg_id = decode_int_arg(query.data)
     
     # Находим и удаляем регистрацию
     registration = db_session.query(Registration)\
@@ -590,33 +716,37 @@ async def cancel_registration(update: Update, context: ContextTypes.DEFAULT_TYPE
                 db_session.add(user_prefs)
             user_prefs.display_name = registration.display_name
         
+        training_id = registration.training_id
+        player_stats.registrations_removed([registration], registration.training.date_time)
         db_session.delete(registration)
         db_session.commit()
+        roster_changed(training_id, roster.CANCELLED, registration_id=reg_id)
         await query.answer("Запись отменена")
+        
+        # Кнопка нажата на экране выбора записи: показываем его снова с оставшимися записями
+        remaining = queries.user_upcoming_registrations(user_id)
+        if remaining:
+            await show_cancel_choice(query, context, remaining)
+            return
         message = "Ваша запись успешно отменена"
         reply_markup = get_standard_keyboard()
-        await query.message.reply_text(message, reply_markup=reply_markup)
+        await show_view(query, context, message, reply_markup=reply_markup)
     else:
         await query.answer("Запись не найдена")
 
 async def view_participants(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Команда для просмотра участников ближайшей тренировки"""
-    # Получаем ближайшую тренировку
-    training = db_session.query(Training)\
-        .filter(Training.date_time > datetime.now())\
-        .order_by(Training.date_time)\
-        .first()
+    # Получаем состав ближайшей тренировки
+    roster_snapshot = snapshots.load_next_roster()
     
-    if not training:
+    if not roster_snapshot:
         message = "Нет запланированных тренировок."
         reply_markup = get_standard_keyboard()
         await update.message.reply_text(message, reply_markup=reply_markup)
         return
     
-    # Получаем список участников
-    registrations = db_session.query(Registration)\
-        .filter_by(training_id=training.id)\
-        .all()
+    training = roster_snapshot.training
+    registrations = roster_snapshot.registrations
     
     # Формируем сообщение
     message = f"📅 Тренировка {training.date_time.strftime('%d.%m.%Y %H:%M')}\n"
@@ -625,19 +755,13 @@ async def view_participants(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if registrations:
         for i, reg in enumerate(registrations, 1):
             # Используем display_name если есть, иначе username
-            display_name = reg.display_name or reg.username or "Без имени"
-            
-            # Получаем статус team_assigned из таблицы TeamAssignment
-            team_assignment = db_session.query(TeamAssignment)\
-                .filter_by(training_id=training.id, user_id=reg.user_id)\
-                .first()
-            team_assigned = team_assignment.team_assigned if team_assignment else False
+            display_name = reg.name or "Без имени"
             
             # Если команда назначена, показываем полную информацию
-            if team_assigned:
+            if reg.team_assigned:
                 # Добавляем информацию о выбранной футболке и команде
-                if reg.jersey_type:
-                    if reg.jersey_type.value == 'light':
+                if reg.jersey:
+                    if reg.jersey == 'light':
                         jersey_info = "⚪"
                     else:
                         jersey_info = "⚫"
@@ -645,16 +769,16 @@ async def view_participants(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 else:
                     message += f"{i}. {display_name}"
                 
-                if reg.team_type:
-                    if reg.team_type.value == 'first':
+                if reg.team:
+                    if reg.team == 'first':
                         team_info = "1️⃣"
                     else:
                         team_info = "2️⃣"
                     message += f" {team_info}"
                     
                     # Добавляем информацию об амплуа для полевых игроков
-                    if not reg.goalkeeper and reg.position_type:
-                        if reg.position_type.value == 'forward':
+                    if not reg.goalkeeper and reg.position:
+                        if reg.position == 'forward':
                             position_info = " - Нап"
                         else:
                             position_info = " - Зщ"
@@ -726,7 +850,27 @@ async def return_to_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     reply_markup = get_standard_keyboard()
     await query.answer()
-    await query.message.reply_text('Выберите действие:', reply_markup=reply_markup)
+    await show_view(query, context, 'Выберите действие:', reply_markup=reply_markup)
+
+async def start_sender_bot():
+    """
+    Запускает бота только для отправки сообщений, без получения обновлений.
+    Используется фоновыми задачами, запущенными отдельно от процесса бота (роль scheduler).
+    """
+    token = Config.TELEGRAM_TOKEN
+    if not token:
+        raise ValueError("TELEGRAM_TOKEN не установлен в переменных окружения")
+    
+    application = Application.builder()\
+        .token(token)\
+        .rate_limiter(outbound_limiter)\
+        .updater(None)\
+        .build()
+    await application.initialize()
+    await application.start()
+    runtime.register_metrics_source('outbound', outbound_limiter.get_metrics)
+    print("✅ Бот для отправки сообщений запущен")
+    return application
 
 async def start_bot():
     token = Config.TELEGRAM_TOKEN
@@ -734,22 +878,38 @@ async def start_bot():
         raise ValueError("TELEGRAM_TOKEN не установлен в переменных окружения")
     
     # Создаем приложение с настройками для обработки сетевых ошибок
-    application = Application.builder().token(token).build()
+    application = Application.builder()\
+        .token(token)\
+        .rate_limiter(outbound_limiter)\
+        .concurrent_updates(Config.BOT_CONCURRENT_UPDATES)\
+        .build()
+    
+    # Обновления разных пользователей обрабатываются параллельно, одного пользователя - по очереди;
+    # повторные нажатия той же кнопки отбрасываются. read_only - обработчик только показывает данные
+    # и может читать с реплики (DATABASE_READ_URL)
+    def add_handler(handler, read_only=False):
+        handler.callback = serialize_per_user(deduplicate_callback(route_database(handler.callback, read_only)))
+        application.add_handler(handler)
     
     # Добавляем обработчики
-    application.add_handler(CommandHandler("start", start))
-    application.add_handler(CommandHandler("commands", show_commands))
-    application.add_handler(CommandHandler("participants", view_participants))
-    application.add_handler(CommandHandler("test_weekly_post", test_weekly_post))
-    application.add_handler(CallbackQueryHandler(register_training, pattern="^register_\d+$"))
-    application.add_handler(CallbackQueryHandler(show_schedule, pattern="^schedule$"))
-    application.add_handler(CallbackQueryHandler(show_my_registrations, pattern="^my_registrations$"))
-    application.add_handler(CallbackQueryHandler(cancel_registration, pattern="^cancel_\d+$"))
-    application.add_handler(CallbackQueryHandler(mark_payment, pattern="^pay_\d+$"))
-    application.add_handler(CallbackQueryHandler(handle_mark_payment, pattern="^mark_payment$"))
-    application.add_handler(CallbackQueryHandler(handle_cancel_registration, pattern="^cancel_registration$"))
-    application.add_handler(CallbackQueryHandler(view_training_participants, pattern="^view_participants$"))
-    application.add_handler(CallbackQueryHandler(return_to_start, pattern="^start$"))
+    add_handler(CommandHandler("start", start))
+    add_handler(CommandHandler("commands", show_commands))
+    add_handler(CommandHandler("participants", view_participants), read_only=True)
+    add_handler(CommandHandler("test_weekly_post", test_weekly_post))
+    add_handler(CallbackQueryHandler(register_training, pattern=callback_pattern(callbacks.REGISTER)))
+    add_handler(CallbackQueryHandler(show_schedule, pattern="^schedule$"), read_only=True)
+    add_handler(CallbackQueryHandler(show_schedule, pattern=callback_pattern(callbacks.SCHEDULE_PAGE)), read_only=True)
+    add_handler(CallbackQueryHandler(show_my_registrations, pattern="^my_registrations$"), read_only=True)
+    add_handler(CallbackQueryHandler(cancel_registration, pattern=callback_pattern(callbacks.CANCEL)))
+    add_handler(CallbackQueryHandler(mark_payment, pattern=callback_pattern(callbacks.PAY)))
+    # Кнопки старого формата в уже отправленных сообщениях
+    add_handler(CallbackQueryHandler(register_training, pattern="^register_\d+$"))
+    add_handler(CallbackQueryHandler(cancel_registration, pattern="^cancel_\d+$"))
+    add_handler(CallbackQueryHandler(mark_payment, pattern="^pay_\d+$"))
+    add_handler(CallbackQueryHandler(handle_mark_payment, pattern="^mark_payment$"))
+    add_handler(CallbackQueryHandler(handle_cancel_registration, pattern="^cancel_registration$"))
+    add_handler(CallbackQueryHandler(view_training_participants, pattern="^view_participants$"), read_only=True)
+    add_handler(CallbackQueryHandler(return_to_start, pattern="^start$"))
     
     # Настройки для polling с обработкой ошибок
     try:
@@ -769,9 +929,16 @@ async def start_bot():
         
         print("✅ Telegram бот успешно запущен")
         
-        # Запускаем планировщик запланированных сообщений
-        from .message_scheduler import start_message_scheduler
-        await start_message_scheduler(application.bot)
+        # Включаем обновление закрепленных постов с составом
+        start_roster_post_updates(application.bot)
+        
+        # Забираем команды, которые веб-админка поставила в очередь для бота
+        start_bot_command_consumer(application.bot)
+        
+        # Метрики для /health
+        runtime.register_metrics_source('polling', lambda: application.updater.running)
+        runtime.register_metrics_source('outbound', outbound_limiter.get_metrics)
+        runtime.register_metrics_source('callback_duplicates_suppressed', lambda: callback_deduplicator.suppressed)
         
         return application
         
@@ -792,22 +959,25 @@ async def handle_mark_payment(update: Update, context: ContextTypes.DEFAULT_TYPE
     user_id = update.effective_user.id
     
     # Получаем все неоплаченные регистрации пользователя (исключая вратарей)
-    unpaid_registrations = db_session.query(Registration)\
-        .join(Training)\
-        .filter(Registration.user_id == user_id)\
-        .filter(Registration.paid == False)\
-        .filter(Registration.goalkeeper == False)\
-        .order_by(Training.date_time)\
-        .all()
+    unpaid_registrations = queries.user_unpaid_registrations(user_id)
     
     if not unpaid_registrations:
         await query.answer("У вас нет неоплаченных записей")
         return
     
-    # Отмечаем самую раннюю по дате неоплаченную тренировку
+    # Если неоплаченных тренировок несколько, показываем кнопку оплаты для каждой
+    if len(unpaid_registrations) > 1:
+        await query.answer()
+        await show_unpaid_registrations(query, context, user_id)
+        return
+    
+    # Отмечаем единственную неоплаченную тренировку
     earliest_registration = unpaid_registrations[0]
     earliest_registration.paid = True
+    earliest_registration.paid_at = datetime.now()
+    player_stats.registration_paid(earliest_registration, earliest_registration.training.date_time)
     db_session.commit()
+    roster_changed(earliest_registration.training_id, roster.PAID, registration_id=earliest_registration.id, update_post=False)
     
     training_date = earliest_registration.training.date_time.strftime('%d.%m.%Y %H:%M')
     await query.answer(f"✅ Оплата за {training_date} отмечена!")
@@ -819,12 +989,7 @@ async def handle_cancel_registration(update: Update, context: ContextTypes.DEFAU
     user_id = update.effective_user.id
     
     # Получаем все активные регистрации пользователя
-    active_registrations = db_session.query(Registration)\
-        .join(Training)\
-        .filter(Registration.user_id == user_id)\
-        .filter(Training.date_time > datetime.now())\
-        .order_by(Training.date_time)\
-        .all()
+    active_registrations = queries.user_upcoming_registrations(user_id)
     
     if not active_registrations:
         await query.answer("У вас нет активных записей")
@@ -833,31 +998,76 @@ async def handle_cancel_registration(update: Update, context: ContextTypes.DEFAU
     # Если только одна запись, отменяем её сразу
     if len(active_registrations) == 1:
         registration = active_registrations[0]
+        training_id, registration_id = registration.training_id, registration.id
+        player_stats.registrations_removed([registration], registration.training.date_time)
         db_session.delete(registration)
         db_session.commit()
+        roster_changed(training_id, roster.CANCELLED, registration_id=registration_id)
         await query.answer("✅ Запись отменена!")
         await show_my_registrations(update, context)
         return
     
     # Если несколько записей, показываем список для выбора
+    await query.answer()
+    await show_cancel_choice(query, context, active_registrations)
+
+async def show_cancel_choice(query, context: ContextTypes.DEFAULT_TYPE, registrations):
+    """Экран выбора записи для отмены: кнопка на каждую предстоящую тренировку"""
     message = "❌ Выберите запись для отмены:\n\n"
     keyboard = []
     
-    for i, reg in enumerate(active_registrations, 1):
+    for i, reg in enumerate(registrations, 1):
         message += f"{i}. 📅 {reg.training.date_time.strftime('%d.%m.%Y %H:%M')}\n"
         keyboard.append([InlineKeyboardButton(
             f"❌ Отменить {reg.training.date_time.strftime('%d.%m %H:%M')}",
-            callback_data=f'cancel_{reg.id}'
+            callback_data=encode_callback(callbacks.CANCEL, reg.id)
         )])
     
     keyboard.append([InlineKeyboardButton("🔙 Назад", callback_data='my_registrations')])
     reply_markup = InlineKeyboardMarkup(keyboard)
     
-    await query.answer()
-    await query.message.reply_text(message, reply_markup=reply_markup)
+    await show_view(query, context, message, reply_markup=reply_markup)
 
 # Функции для напоминаний об оплате
-async def send_payment_reminder(registration: Registration, training: Training, bot):
+
+# Ограничитель частоты отправки напоминаний, чтобы не упираться в лимиты Telegram
+reminder_bucket = TokenBucket(Config.PAYMENT_REMINDER_RATE)
+
+def get_reminder_checkpoint(training_time, now):
+    """
+    Возвращает последнюю наступившую точку расписания напоминаний для тренировки.
+    Точки задаются в PAYMENT_REMINDER_SCHEDULE (часы от начала тренировки), после последней
+    точки напоминания повторяются с интервалом PAYMENT_REMINDER_REPEAT_HOURS.
+    Если ни одна точка еще не наступила, возвращает None.
+    """
+    checkpoints = [training_time + timedelta(hours=hours) for hours in Config.PAYMENT_REMINDER_SCHEDULE]
+    if not checkpoints or now < checkpoints[0]:
+        return None
+    
+    last_checkpoint = checkpoints[-1]
+    if now >= last_checkpoint:
+        if Config.PAYMENT_REMINDER_REPEAT_HOURS > 0:
+            repeat_interval = timedelta(hours=Config.PAYMENT_REMINDER_REPEAT_HOURS)
+            return last_checkpoint + ((now - last_checkpoint) // repeat_interval) * repeat_interval
+        return last_checkpoint
+    
+    return max(checkpoint for checkpoint in checkpoints if checkpoint <= now)
+
+def is_payment_reminder_due(registration: RegistrationSnapshot, training: TrainingSnapshot, now):
+    """Проверяет, наступила ли очередная точка расписания напоминаний для регистрации"""
+    checkpoint = get_reminder_checkpoint(training.date_time, now)
+    if checkpoint is None:
+        return False
+    return registration.last_payment_reminder is None or registration.last_payment_reminder < checkpoint
+
+def mark_reminder_attempt(registrations):
+    """Обновляет время последнего напоминания, чтобы не пытаться отправить снова до следующей точки расписания"""
+    db_session.query(Registration)\
+        .filter(Registration.id.in_([registration.id for registration in registrations]))\
+        .update({Registration.last_payment_reminder: datetime.now()}, synchronize_session=False)
+    db_session.commit()
+
+async def send_payment_reminder(registration: RegistrationSnapshot, training: TrainingSnapshot, bot):
     """Отправляет напоминание об оплате участнику"""
     try:
         # Пропускаем вратарей - им не нужны напоминания об оплате
@@ -867,19 +1077,20 @@ async def send_payment_reminder(registration: Registration, training: Training,
         
         # Формируем сообщение
         training_date = training.date_time.strftime('%d.%m.%Y в %H:%M')
-        display_name = registration.display_name or registration.username or 'Участник'
+        display_name = registration.name or 'Участник'
+        hours_since_start = (datetime.now() - training.date_time).total_seconds() / 3600
         
         message = f"💳 *Напоминание об оплате*\n\n"
         message += f"Привет, {escape_markdown(display_name)}!\n\n"
         message += f"📅 Тренировка: {training_date}\n"
-        message += f"⏰ Прошло уже 1.5 часа с начала тренировки\n"
+        message += f"⏰ С начала тренировки прошло {hours_since_start:.1f} ч.\n"
         message += f"💰 Пожалуйста, подтвердите оплату тренировки\n\n"
         message += f"Нажмите кнопку ниже, чтобы отметить оплату:"
         
         # Создаем клавиатуру с кнопкой оплаты
         keyboard = {
             'inline_keyboard': [
-                [{'text': '✅ Оплатил тренировку', 'callback_data': f'pay_{registration.id}'}],
+                [{'text': '✅ Оплатил тренировку', 'callback_data': encode_callback(callbacks.PAY, registration.id)}],
                 [{'text': '📋 Мои записи', 'callback_data': 'my_registrations'}]
             ]
         }
@@ -889,12 +1100,12 @@ async def send_payment_reminder(registration: Registration, training: Training,
             chat_id=registration.user_id,
             text=message,
             parse_mode='Markdown',
-            reply_markup=InlineKeyboardMarkup(keyboard['inline_keyboard'])
+            reply_markup=InlineKeyboardMarkup(keyboard['inline_keyboard']),
+            **bulk_lane_kwargs(bot)
         )
         
         # Обновляем время последнего напоминания
-        registration.last_payment_reminder = datetime.now()
-        db_session.commit()
+        mark_reminder_attempt([registration])
         
         logger.info(f"✅ Напоминание об оплате отправлено участнику {display_name} (ID: {registration.user_id})")
         return True
@@ -902,16 +1113,14 @@ async def send_payment_reminder(registration: Registration, training: Training,
     except Forbidden as e:
         logger.warning(f"⚠️ Пользователь {registration.user_id} ({display_name}) заблокировал бота. Напоминания не будут отправляться.")
         # Обновляем время, чтобы не пытаться отправить снова в ближайшее время
-        registration.last_payment_reminder = datetime.now()
-        db_session.commit()
+        mark_reminder_attempt([registration])
         return False
     except BadRequest as e:
         error_msg = str(e)
         if "chat not found" in error_msg.lower():
             logger.warning(f"⚠️ Чат с пользователем {registration.user_id} ({display_name}) не найден. Возможно, пользователь никогда не запускал бота.")
             # Обновляем время, чтобы не пытаться отправить снова в ближайшее время
-            registration.last_payment_reminder = datetime.now()
-            db_session.commit()
+            mark_reminder_attempt([registration])
         else:
             logger.error(f"❌ Некорректный запрос при отправке напоминания участнику {registration.user_id}: {e}")
         return False
@@ -922,67 +1131,129 @@ async def send_payment_reminder(registration: Registration, training: Training,
         logger.error(f"❌ Неожиданная ошибка отправки напоминания участнику {registration.user_id}: {e}")
         return False
 
-async def check_payment_reminders(bot):
-    """Проверяет и отправляет напоминания об оплате"""
+async def send_payment_digest(user_id, registrations, bot):
+    """Отправляет одно сводное напоминание об оплате по всем неоплаченным тренировкам участника"""
+    display_name = 'Участник'
     try:
-        from datetime import timedelta
+        registrations = sorted(registrations, key=lambda reg: reg.training.date_time)
+        display_name = next((reg.name for reg in registrations if reg.name), 'Участник')
+        
+        # Формируем сообщение
+        message = f"💳 *Напоминание об оплате*\n\n"
+        message += f"Привет, {escape_markdown(display_name)}!\n\n"
+        message += f"💰 Неоплаченные тренировки ({len(registrations)}):\n"
+        for reg in registrations:
+            message += f"📅 {reg.training.date_time.strftime('%d.%m.%Y в %H:%M')}\n"
+        message += f"\nНажмите кнопку с датой тренировки, чтобы отметить оплату:"
+        
+        # По одной кнопке оплаты на каждую тренировку
+        await bot.send_message(
+            chat_id=user_id,
+            text=message,
+            parse_mode='Markdown',
+            reply_markup=build_payment_keyboard(registrations),
+            **bulk_lane_kwargs(bot)
+        )
         
+        # Обновляем время последнего напоминания для всех записей сводки
+        mark_reminder_attempt(registrations)
+        
+        logger.info(f"✅ Сводное напоминание об оплате ({len(registrations)} тренировок) отправлено участнику {display_name} (ID: {user_id})")
+        return True
+        
+    except Forbidden as e:
+        logger.warning(f"⚠️ Пользователь {user_id} ({display_name}) заблокировал бота. Напоминания не будут отправляться.")
+        mark_reminder_attempt(registrations)
+        return False
+    except BadRequest as e:
+        error_msg = str(e)
+        if "chat not found" in error_msg.lower():
+            logger.warning(f"⚠️ Чат с пользователем {user_id} ({display_name}) не найден. Возможно, пользователь никогда не запускал бота.")
+            mark_reminder_attempt(registrations)
+        else:
+            logger.error(f"❌ Некорректный запрос при отправке сводного напоминания участнику {user_id}: {e}")
+        return False
+    except (NetworkError, TimedOut) as e:
+        logger.error(f"❌ Сетевая ошибка при отправке сводного напоминания участнику {user_id}: {e}")
+        return False
+    except Exception as e:
+        logger.error(f"❌ Неожиданная ошибка отправки сводного напоминания участнику {user_id}: {e}")
+        return False
+
+def get_reminder_tick(tick_seconds, now=None):
+    """
+    Номер текущего тика проверки напоминаний; часть должников для тика - tick % shard_count.
+    Номер зависит только от времени, поэтому каждый участник получает напоминания
+    с постоянным смещением внутри окна PAYMENT_REMINDER_INTERVAL_MINUTES, в том числе после перезапуска.
+    """
+    return int((time.time() if now is None else now) // tick_seconds)
+
+def next_reminder_tick(tick, current_tick, shard_count):
+    """
+    Тик, который нужно обработать после tick. Тики идут подряд, поэтому ни одна часть не пропускается
+    и не проверяется дважды, даже если проверка или пауза затянулись. Если цикл отстал больше чем на окно,
+    он продолжает с тика, до которого осталось ровно одно окно: каждая часть все равно проверяется один раз.
+    """
+    return max(tick + 1, current_tick - shard_count + 1)
+
+async def check_payment_reminders(bot, shard=0, shard_count=1):
+    """
+    Проверяет и отправляет напоминания об оплате.
+    Если shard_count > 1, обрабатываются только участники, у которых user_id % shard_count == shard.
+    """
+    try:
         current_time = datetime.now()
-        # Ищем тренировки, которые начались более 1.5 часа назад
-        reminder_time = current_time - timedelta(hours=1, minutes=30)
+        if not Config.PAYMENT_REMINDER_SCHEDULE:
+            logger.info("Расписание напоминаний об оплате пустое, пропускаем проверку")
+            return 0
         
-        # Находим тренировки, которые начались более 1.5 часа назад
-        trainings_to_check = db_session.query(Training)\
-            .filter(Training.date_time <= reminder_time)\
-            .all()
+        # Первое напоминание отправляется не раньше первой точки расписания
+        reminder_time = current_time - timedelta(hours=Config.PAYMENT_REMINDER_SCHEDULE[0])
         
-        logger.info(f"🔍 Проверка напоминаний об оплате. Найдено тренировок: {len(trainings_to_check)}")
+        # Находим неоплаченные записи (исключая вратарей) на тренировки, для которых уже наступила первая точка расписания.
+        # Игроки с временным (отрицательным) user_id еще не писали боту, отправить им сообщение невозможно
+        unpaid_registrations = snapshots.load_due_unpaid_registrations(reminder_time, shard, shard_count)
         
-        # Логируем найденные тренировки
-        for training in trainings_to_check:
-            time_since_start = current_time - training.date_time
-            logger.debug(f"   📅 Тренировка {training.id}: {training.date_time.strftime('%d.%m.%Y %H:%M')} (прошло: {time_since_start})")
+        logger.debug(f"🔍 Проверка напоминаний об оплате (часть {shard + 1}/{shard_count}). Найдено неоплаченных записей: {len(unpaid_registrations)}")
         
         total_reminders_sent = 0
-        total_blocked_users = 0
-        
-        for training in trainings_to_check:
-            # Находим неоплативших участников (исключая вратарей)
-            unpaid_registrations = db_session.query(Registration)\
-                .filter(Registration.training_id == training.id)\
-                .filter(Registration.paid == False)\
-                .filter(Registration.goalkeeper == False)\
-                .all()
-            
-            logger.debug(f"   👥 Неоплативших участников на тренировке {training.id}: {len(unpaid_registrations)}")
-            
+        
+        if Config.PAYMENT_REMINDER_DIGEST:
+            # Группируем записи по участнику: одно сообщение на должника
+            registrations_by_user = {}
             for registration in unpaid_registrations:
-                # Проверяем, нужно ли отправлять напоминание
-                should_send_reminder = False
+                registrations_by_user.setdefault(registration.user_id, []).append(registration)
+            
+            for user_id, user_registrations in registrations_by_user.items():
+                due = [reg for reg in user_registrations if is_payment_reminder_due(reg, reg.training, current_time)]
+                if not due:
+                    logger.debug(f"      ⏳ Слишком рано для повторного напоминания участнику {user_id}")
+                    continue
                 
-                if registration.last_payment_reminder is None:
-                    # Первое напоминание
-                    should_send_reminder = True
-                    logger.info(f"      💳 Первое напоминание для участника {registration.user_id}")
-                else:
-                    # Проверяем, прошёл ли час с последнего напоминания
-                    time_since_last_reminder = current_time - registration.last_payment_reminder
-                    if time_since_last_reminder >= timedelta(hours=1):
-                        should_send_reminder = True
-                        logger.info(f"      ⏰ Повторное напоминание для участника {registration.user_id} (прошло: {time_since_last_reminder})")
-                    else:
-                        logger.debug(f"      ⏳ Слишком рано для повторного напоминания участнику {registration.user_id} (прошло: {time_since_last_reminder})")
+                logger.info(f"      💳 Сводное напоминание для участника {user_id} (неоплаченных тренировок: {len(user_registrations)})")
+                await reminder_bucket.acquire()
+                success = await send_payment_digest(user_id, user_registrations, bot)
+                if success:
+                    total_reminders_sent += 1
+        else:
+            for registration in unpaid_registrations:
+                if not is_payment_reminder_due(registration, registration.training, current_time):
+                    logger.debug(f"      ⏳ Слишком рано для повторного напоминания участнику {registration.user_id}")
+                    continue
                 
-                if should_send_reminder:
-                    success = await send_payment_reminder(registration, training, bot)
-                    if success:
-                        total_reminders_sent += 1
+                logger.info(f"      💳 Напоминание для участника {registration.user_id} (тренировка {registration.training_id})")
+                await reminder_bucket.acquire()
+                success = await send_payment_reminder(registration, registration.training, bot)
+                if success:
+                    total_reminders_sent += 1
         
-        logger.info(f"📊 Итоги отправки напоминаний об оплате:")
-        logger.info(f"✅ Отправлено напоминаний: {total_reminders_sent}")
+        if total_reminders_sent > 0:
+            logger.info(f"📊 Итоги отправки напоминаний об оплате:")
+            logger.info(f"✅ Отправлено напоминаний: {total_reminders_sent}")
         
         return total_reminders_sent
         
     except Exception as e:
         logger.error(f"❌ Ошибка при проверке напоминаний об оплате: {e}")
-        return 0 
\ No newline at end of file
+        db_session.rollback()
+        return 0
@@ -5,8 +5,11 @@ from datetime import datetime, timedelta
 from telegram import Bot
 from telegram.error import NetworkError, TimedOut, BadRequest
 from ..config import Config
+from .. import runtime
+from .rate_limit import bulk_lane_kwargs
 from ..database import db_session
 from ..models import ScheduledMessage, RepeatType
+from .. import queries
 
 logger = logging.getLogger(__name__)
 
@@ -36,7 +39,7 @@ async def send_scheduled_message(bot: Bot, message: ScheduledMessage):
         if Config.MESSAGE_THREAD_ID:
             send_params["message_thread_id"] = int(Config.MESSAGE_THREAD_ID)
         
-        await bot.send_message(**send_params)
+        await bot.send_message(**send_params, **bulk_lane_kwargs(bot))
         
         # Обновляем время последней отправки
         message.last_sent_at = datetime.now()
@@ -170,9 +173,7 @@ async def check_and_send_scheduled_messages(bot: Bot):
         now = datetime.now()
         
         # Получаем все активные сообщения
-        active_messages = db_session.query(ScheduledMessage)\
-            .filter(ScheduledMessage.is_active == True)\
-            .all()
+        active_messages = queries.active_scheduled_messages()
         
         if not active_messages:
             return 0
@@ -288,6 +289,10 @@ async def message_scheduler_task(bot: Bot):
             await check_and_send_scheduled_messages(bot)
         except Exception as e:
             logger.error(f"❌ Ошибка в планировщике сообщений: {e}", exc_info=True)
+            db_session.rollback()
+        finally:
+            db_session.remove()
+        runtime.record_loop_tick('message_scheduler', 60)
         
         # Проверяем каждую минуту
         await asyncio.sleep(60)
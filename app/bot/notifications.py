@@ -0,0 +1,260 @@
+import asyncio
+import concurrent.futures
+import logging
+from datetime import datetime
+import requests
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.error import BadRequest
+from ..config import Config
+from ..database import db_session
+from ..models import UserPreferences
+from .rate_limit import bulk_lane_kwargs
+from .weekly_posts import call_bot_threadsafe
+
+logger = logging.getLogger(__name__)
+
+# Результаты отправки уведомления
+SENT = 'sent'
+NO_CHAT = 'no_chat'  # Игрок добавлен вручную или без Telegram - уведомить некому, но распределение засчитывается
+FAILED = 'failed'
+
+# Сколько запрос админки ждет сверх NOTIFICATION_BATCH_TIMEOUT_SECONDS, пока бот отменит недосланную пачку
+BATCH_CANCEL_GRACE_SECONDS = 10
+
+# Параметры распределения, изменение которых требует нового уведомления
+JERSEY = 'jersey'
+TEAM = 'team'
+POSITION = 'position'
+
+class PlannedNotification:
+    """Уведомление игроку о распределении и причины, по которым его нужно отправить"""
+    __slots__ = ('registration', 'preferences', 'changes', 'chat_id', 'text', 'result')
+
+    def __init__(self, registration, preferences, changes, text):
+        self.registration = registration
+        self.preferences = preferences
+        self.changes = changes
+        # Вручную добавленные игроки имеют временный отрицательный user_id - писать им некуда
+        self.chat_id = registration.user_id if registration.user_id and registration.user_id > 0 else None
+        self.text = text
+        self.result = None
+
+    @property
+    def display_name(self):
+        return self.registration.display_name or self.registration.username
+
+def has_all_params(registration):
+    """Вратарю достаточно майки, полевому игроку нужны майка, пятерка и амплуа"""
+    return bool(
+        registration.jersey_type and (
+            registration.goalkeeper or
+            (registration.team_type and registration.position_type)
+        )
+    )
+
+def get_changed_params(registration, preferences):
+    """
+    Параметры распределения, которые отличаются от последних отправленных игроку
+    (они хранятся в предпочтениях). Без предпочтений изменившимися считаются все.
+    """
+    compared = [(JERSEY, registration.jersey_type, preferences.preferred_jersey_type if preferences else None)]
+    if not registration.goalkeeper:
+        compared += [
+            (TEAM, registration.team_type, preferences.preferred_team_type if preferences else None),
+            (POSITION, registration.position_type, preferences.preferred_position_type if preferences else None),
+        ]
+    if preferences is None:
+        return [param for param, _, _ in compared]
+    return [param for param, current, sent in compared if current != sent]
+
+def format_notification(training, registration, participants_count):
+    """Текст уведомления о майке, пятерке и амплуа"""
+    training_date = training.date_time.strftime('%d.%m.%Y в %H:%M')
+    jersey_emoji = "⚪" if registration.jersey_type.value == 'light' else "⚫"
+    team_emoji = "1️⃣" if registration.team_type and registration.team_type.value == 'first' else "2️⃣"
+
+    message = f"🏒 *Уведомление о тренировке*\n\n"
+    message += f"📅 Дата: {training_date}\n"
+    message += f"🎯 Ваша майка: {jersey_emoji}\n"
+
+    # Добавляем команду и амплуа для полевых игроков
+    if not registration.goalkeeper and registration.team_type:
+        message += f"👥 Ваша пятерка: {team_emoji}\n"
+        if registration.position_type:
+            position_text = "Нап" if registration.position_type.value == 'forward' else "Зщ"
+            message += f"🏒 Ваше амплуа: {position_text}\n"
+
+    message += f"👥 Всего участников: {participants_count}/{training.max_participants}"
+    return message
+
+def build_notification_plan(training):
+    """
+    Определяет, кому из участников отправить уведомление: игрокам с полным набором параметров,
+    которые еще не получали распределение или у которых майка, пятерка или амплуа изменились.
+    Регистрации и предпочтения загружаются двумя запросами на всю тренировку.
+    """
+    registrations = training.registrations
+    user_ids = [registration.user_id for registration in registrations]
+    preferences = {
+        prefs.user_id: prefs
+        for prefs in db_session.query(UserPreferences).filter(UserPreferences.user_id.in_(user_ids)).all()
+    } if user_ids else {}
+
+    plan = []
+    for registration in registrations:
+        if not has_all_params(registration):
+            continue
+        prefs = preferences.get(registration.user_id)
+        changes = get_changed_params(registration, prefs)
+        if registration.team_assigned and not changes:
+            continue
+        plan.append(PlannedNotification(
+            registration,
+            prefs,
+            changes,
+            format_notification(training, registration, len(registrations))
+        ))
+    return plan
+
+def get_notification_keyboard():
+    return [
+        [InlineKeyboardButton("Показать расписание", callback_data="schedule")],
+        [InlineKeyboardButton("Мои записи", callback_data="my_registrations")]
+    ]
+
+async def send_notification_batch(bot, messages, results):
+    """
+    Отправляет пачку уведомлений [(chat_id, text), ...] через бота.
+    Запросы идут параллельно в массовой полосе ограничителя, поэтому не задерживают ответы бота.
+    Результат каждого уведомления записывается в results[i] сразу после отправки,
+    поэтому при прерванной пачке видно, какие уведомления уже ушли.
+    """
+    reply_markup = InlineKeyboardMarkup(get_notification_keyboard())
+
+    async def send(index, chat_id, text):
+        results[index] = await send_one(chat_id, text)
+
+    async def send_one(chat_id, text):
+        try:
+            await bot.send_message(
+                chat_id=chat_id,
+                text=text,
+                parse_mode='Markdown',
+                reply_markup=reply_markup,
+                **bulk_lane_kwargs(bot)
+            )
+            return SENT
+        except BadRequest as e:
+            if 'chat not found' in str(e).lower():
+                return NO_CHAT
+            logger.error(f"❌ Ошибка отправки уведомления в чат {chat_id}: {e}")
+            return FAILED
+        except Exception as e:
+            logger.error(f"❌ Ошибка отправки уведомления в чат {chat_id}: {e}")
+            return FAILED
+
+    await asyncio.gather(*(send(index, chat_id, text) for index, (chat_id, text) in enumerate(messages)))
+    return results
+
+def send_notifications_via_http(messages):
+    """Отправка уведомлений через Bot API, когда бот запущен в другом процессе"""
+    keyboard = {
+        'inline_keyboard': [
+            [{'text': button.text, 'callback_data': button.callback_data} for button in row]
+            for row in get_notification_keyboard()
+        ]
+    }
+    results = []
+    with requests.Session() as http:
+        for chat_id, text in messages:
+            try:
+                response = http.post(
+                    f'https://api.telegram.org/bot{Config.TELEGRAM_TOKEN}/sendMessage',
+                    json={
+                        'chat_id': chat_id,
+                        'text': text,
+                        'parse_mode': 'Markdown',
+                        'reply_markup': keyboard
+                    },
+                    timeout=10
+                )
+                if response.status_code == 200:
+                    results.append(SENT)
+                elif 'chat not found' in response.text.lower():
+                    results.append(NO_CHAT)
+                else:
+                    logger.error(f"❌ Ошибка отправки уведомления в чат {chat_id}: {response.text}")
+                    results.append(FAILED)
+            except Exception as e:
+                error_str = str(e).lower()
+                if 'chat not found' in error_str or 'user not found' in error_str:
+                    results.append(NO_CHAT)
+                else:
+                    logger.error(f"❌ Ошибка отправки уведомления в чат {chat_id}: {e}")
+                    results.append(FAILED)
+    return results
+
+def execute_notification_plan(plan):
+    """
+    Отправляет запланированные уведомления одной пачкой и записывает результат в каждый пункт плана.
+    Если пачка не уложилась в NOTIFICATION_BATCH_TIMEOUT_SECONDS, отправленные сохраняют результат SENT,
+    а остальные считаются FAILED - повторная рассылка не пришлет игрокам уведомление второй раз.
+    """
+    for item in plan:
+        if item.chat_id is None:
+            item.result = NO_CHAT
+    to_send = [item for item in plan if item.result is None]
+    if not to_send:
+        return plan
+
+    messages = [(item.chat_id, item.text) for item in to_send]
+    timeout = Config.NOTIFICATION_BATCH_TIMEOUT_SECONDS
+    results = [None] * len(messages)
+
+    async def send_with_timeout(bot):
+        # Таймаут отсчитывается в event loop бота: недосланные уведомления отменяются и больше не уходят,
+        # а отправленные успевают попасть в results и будут записаны в БД
+        try:
+            await asyncio.wait_for(send_notification_batch(bot, messages, results), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(
+                f"⏰ Пачка уведомлений не уложилась в {timeout:.0f} с: "
+                f"отправлено {results.count(SENT)} из {len(messages)}, остальные уйдут при следующей рассылке"
+            )
+        return results
+
+    try:
+        # Запас сверх таймаута - на отмену недосланных запросов
+        sent = call_bot_threadsafe(send_with_timeout, timeout + BATCH_CANCEL_GRACE_SECONDS)
+    except concurrent.futures.TimeoutError:
+        logger.error("❌ Бот не завершил пачку уведомлений вовремя; записываются уже отправленные")
+        # Снимок: задача бота отменяется и итоги больше не должны меняться
+        sent = list(results)
+    if sent is None:
+        sent = send_notifications_via_http(messages)
+    for item, result in zip(to_send, sent):
+        # Уведомление без результата не дошло до отправки или было прервано - при повторе оно уйдет снова
+        item.result = result or FAILED
+    return plan
+
+def remember_sent_params(item):
+    """Отмечает игрока распределенным и запоминает отправленные параметры в его предпочтениях"""
+    registration = item.registration
+    if not registration.team_assigned:
+        registration.team_assigned = True
+        registration.team_assigned_at = datetime.now()
+
+    if item.preferences is None:
+        item.preferences = UserPreferences(user_id=registration.user_id)
+        db_session.add(item.preferences)
+    item.preferences.preferred_jersey_type = registration.jersey_type
+    if not registration.goalkeeper:
+        item.preferences.preferred_team_type = registration.team_type
+        item.preferences.preferred_position_type = registration.position_type
+
+def apply_notification_results(plan):
+    """Сохраняет итоги отправки одним коммитом; неотправленные уведомления уйдут при следующей рассылке"""
+    for item in plan:
+        if item.result in (SENT, NO_CHAT):
+            remember_sent_params(item)
+    db_session.commit()
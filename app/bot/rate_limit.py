@@ -0,0 +1,144 @@
+import asyncio
+import logging
+import time
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+logger = logging.getLogger(__name__)
+
+class TokenBucket:
+    """
+    Асинхронный token bucket для сглаживания исходящих сообщений.
+    Токены пополняются со скоростью rate в секунду, но не выше capacity;
+    acquire() ждет, пока не накопится нужное количество токенов.
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    async def acquire(self, tokens=1):
+        """Ждет и забирает tokens токенов"""
+        async with self._lock:
+            await self.wait_available(tokens)
+            self._tokens -= tokens
+
+    async def wait_available(self, tokens=1):
+        """Ждет, пока накопится tokens токенов, не забирая их"""
+        while True:
+            self._refill()
+            if self._tokens >= tokens:
+                return
+            await asyncio.sleep((tokens - self._tokens) / self.rate)
+
+    def try_acquire(self, tokens=1):
+        """Забирает tokens токенов, если они есть; не ждет"""
+        self._refill()
+        if self._tokens < tokens:
+            return False
+        self._tokens -= tokens
+        return True
+
+# Полосы исходящих запросов: интерактивные ответы всегда обслуживаются раньше массовых отправок
+INTERACTIVE_LANE = 'interactive'
+BULK_LANE = 'bulk'
+LANES = (INTERACTIVE_LANE, BULK_LANE)
+
+def bulk_lane_kwargs(bot):
+    """
+    Возвращает аргументы, которые помечают запрос как массовую отправку.
+    rate_limit_args поддерживаются только ботом приложения с установленным ограничителем,
+    поэтому для остальных ботов возвращается пустой словарь.
+    """
+    if getattr(bot, 'rate_limiter', None) is None:
+        return {}
+    return {'rate_limit_args': BULK_LANE}
+
+class PriorityRateLimiter(BaseRateLimiter):
+    """
+    Ограничитель исходящих запросов Telegram с приоритетными полосами.
+    Запросы с rate_limit_args=BULK_LANE (посты в канал, напоминания, рассылки) ждут,
+    пока не будут отправлены все ожидающие интерактивные запросы (ответы на кнопки и команды).
+    У каждой полосы свой лимит частоты; get_metrics() возвращает глубину очередей.
+    На RetryAfter запрос повторяется после указанной паузы не больше max_retries раз.
+    """
+
+    def __init__(self, interactive_rate, bulk_rate, max_retries=1):
+        self._buckets = {
+            INTERACTIVE_LANE: TokenBucket(interactive_rate),
+            BULK_LANE: TokenBucket(bulk_rate),
+        }
+        self._max_retries = max_retries
+        self._queued = {lane: 0 for lane in LANES}
+        self._max_queued = {lane: 0 for lane in LANES}
+        self._sent = {lane: 0 for lane in LANES}
+        self._interactive_idle = asyncio.Event()
+        self._interactive_idle.set()
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    def get_metrics(self):
+        """Возвращает глубину очередей и количество отправленных запросов по полосам"""
+        return {
+            lane: {
+                'queued': self._queued[lane],
+                'max_queued': self._max_queued[lane],
+                'sent': self._sent[lane],
+            }
+            for lane in LANES
+        }
+
+    def _enter(self, lane):
+        self._queued[lane] += 1
+        self._max_queued[lane] = max(self._max_queued[lane], self._queued[lane])
+        if lane == INTERACTIVE_LANE:
+            self._interactive_idle.clear()
+
+    def _leave(self, lane):
+        self._queued[lane] -= 1
+        if lane == INTERACTIVE_LANE and self._queued[lane] == 0:
+            self._interactive_idle.set()
+
+    async def _wait_turn(self, lane):
+        if lane == INTERACTIVE_LANE:
+            await self._buckets[lane].acquire()
+            return
+        # Массовые запросы пропускают вперед все интерактивные, в том числе пришедшие во время ожидания токена.
+        # Токен забирается только в момент отправки: если интерактивный запрос успел вклиниться,
+        # токен остается в полосе и массовые отправки не теряют частоту
+        bucket = self._buckets[lane]
+        while True:
+            await self._interactive_idle.wait()
+            await bucket.wait_available()
+            if self._interactive_idle.is_set() and bucket.try_acquire():
+                return
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        lane = BULK_LANE if rate_limit_args == BULK_LANE else INTERACTIVE_LANE
+        self._enter(lane)
+        try:
+            for attempt in range(self._max_retries + 1):
+                await self._wait_turn(lane)
+                try:
+                    result = await callback(*args, **kwargs)
+                    self._sent[lane] += 1
+                    return result
+                except RetryAfter as e:
+                    if attempt == self._max_retries:
+                        raise
+                    logger.warning(f"⏳ Telegram просит подождать {e.retry_after} с перед {endpoint} (полоса {lane})")
+                    await asyncio.sleep(e.retry_after)
+        finally:
+            self._leave(lane)
@@ -0,0 +1,52 @@
+# Ограничение Telegram на длину текста сообщения
+TELEGRAM_MESSAGE_LIMIT = 4096
+
+def text_length(text):
+    """Длина текста так, как ее считает Telegram (в UTF-16 code units)"""
+    return len(text.encode('utf-16-le')) // 2
+
+def _split_long_block(block, limit):
+    """Режет блок длиннее лимита по строкам, а строку длиннее лимита - по символам"""
+    parts = []
+    current = ''
+    for line in block.splitlines(keepends=True):
+        while text_length(line) > limit:
+            if current:
+                parts.append(current)
+                current = ''
+            cut = limit
+            while text_length(line[:cut]) > limit:
+                cut -= 1
+            parts.append(line[:cut])
+            line = line[cut:]
+        if text_length(current + line) > limit:
+            parts.append(current)
+            current = ''
+        current += line
+    if current:
+        parts.append(current)
+    return parts
+
+def split_message(blocks, limit=TELEGRAM_MESSAGE_LIMIT):
+    """
+    Собирает из блоков текста сообщения не длиннее limit.
+    Блоки (например, состав одной тренировки) не разрываются, если помещаются в одно сообщение,
+    иначе режутся по границам строк - так разметка Markdown внутри строк остается целой.
+    """
+    chunks = []
+    current = ''
+    for block in blocks:
+        if text_length(current + block) <= limit:
+            current += block
+            continue
+        if current:
+            chunks.append(current)
+            current = ''
+        if text_length(block) <= limit:
+            current = block
+        else:
+            *full_parts, current = _split_long_block(block, limit)
+            chunks.extend(full_parts)
+    if current:
+        chunks.append(current)
+    return chunks
@@ -1,15 +1,77 @@
 import asyncio
+import concurrent.futures
+import hashlib
 import logging
 from datetime import datetime, timedelta
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.error import NetworkError, TimedOut, BadRequest
 from ..config import Config
+from ..database import db_session
+from ..models import TrainingPost
+from .. import queries
+from .. import snapshots
+from .rate_limit import bulk_lane_kwargs
+from . import commands
 
 # Настройка логирования
 logger = logging.getLogger(__name__)
 
+WEEKDAY_NAMES = ['Понедельник', 'Вторник', 'Среда', 'Четверг', 'Пятница', 'Суббота', 'Воскресенье']
+
+# Бот и event loop, через которые обновляются посты с составом (устанавливаются при запуске бота)
+_roster_post_bot = None
+_roster_post_loop = None
+# Запланированные обновления постов: training_id -> asyncio.Task
+_pending_roster_updates = {}
+
+def get_next_training():
+    """Возвращает ближайшую предстоящую тренировку"""
+    return queries.next_training()
+
+def render_training_post(roster_snapshot):
+    """Формирует текст поста о тренировке по снимку ее состава"""
+    training = roster_snapshot.training
+    registrations = sorted(roster_snapshot.registrations, key=lambda reg: reg.registered_at)
+    goalkeepers = [reg for reg in registrations if reg.goalkeeper]
+    players = [reg for reg in registrations if not reg.goalkeeper]
+    
+    message = f"🏒 Тренировка\n"
+    message += f"📅 {WEEKDAY_NAMES[training.date_time.weekday()]}, {training.date_time.strftime('%d.%m.%Y')}\n"
+    message += f"🕒 Начало в {training.date_time.strftime('%H:%M')}\n"
+    if Config.WEEKLY_POST_PRICE:
+        message += f"💰 Стоимость {Config.WEEKLY_POST_PRICE}\n"
+    message += f"\n👥 Записались ({len(registrations)}/{training.max_participants}):\n"
+    
+    if not registrations:
+        message += "Пока никто не записался\n"
+    for i, reg in enumerate(players, 1):
+        message += f"{i}. {reg.name or 'Без имени'}\n"
+    if goalkeepers:
+        message += f"\n🥅 Вратари:\n"
+        for reg in goalkeepers:
+            message += f"• {reg.name or 'Без имени'}\n"
+    
+    if roster_snapshot.free_places > 0:
+        message += f"\n✅ Свободных мест: {roster_snapshot.free_places}"
+    else:
+        message += f"\n⛔ Мест нет"
+    return message
+
+def get_rendered_hash(text):
+    """Возвращает хэш текста поста для проверки, изменился ли он"""
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+def get_training_post_keyboard(bot, training_id):
+    """Создает клавиатуру поста с кнопкой записи: ссылка сразу записывает на эту тренировку"""
+    return InlineKeyboardMarkup([
+        [InlineKeyboardButton(
+            "💬 Запись у бота", 
+            url=f"https://t.me/{bot.username}?start=register_{training_id}"
+        )]
+    ])
+
 async def send_weekly_training_post(bot):
-    """Отправляет еженедельный пост о тренировке в канал/группу"""
+    """Отправляет еженедельный пост о ближайшей тренировке с текущим составом в канал/группу и закрепляет его"""
     try:
         if not Config.CHANNEL_ID:
             logger.warning("CHANNEL_ID не настроен, пропускаем отправку еженедельного поста")
@@ -19,34 +81,54 @@ async def send_weekly_training_post(bot):
             logger.info("Еженедельные посты отключены")
             return False
         
-        # Формируем сообщение
-        message = """🏒 Тренеровка
-Завтра, во вторник. 
-Начало в 19.30-21.00
-Стоимость 800-1000₽"""
+        roster_snapshot = snapshots.load_next_roster()
+        if not roster_snapshot:
+            logger.warning("Нет предстоящих тренировок, еженедельный пост не отправлен")
+            return False
+        training = roster_snapshot.training
         
-        # Создаем клавиатуру с кнопкой записи
-        keyboard = InlineKeyboardMarkup([
-            [InlineKeyboardButton(
-                "💬 Запись у бота", 
-                url="https://t.me/genhokmanager_bot?start=register"
-            )]
-        ])
+        # Формируем сообщение
+        message = render_training_post(roster_snapshot)
         
         # Отправляем сообщение в канал/группу
         send_params = {
             "chat_id": Config.CHANNEL_ID,
             "text": message,
-            "reply_markup": keyboard
+            "reply_markup": get_training_post_keyboard(bot, training.id)
         }
         
         # Добавляем message_thread_id только если он задан (для топиков в супергруппах)
         if Config.MESSAGE_THREAD_ID:
             send_params["message_thread_id"] = int(Config.MESSAGE_THREAD_ID)
         
-        await bot.send_message(**send_params)
+        sent_message = await bot.send_message(**send_params, **bulk_lane_kwargs(bot))
+        
+        # Запоминаем пост, чтобы обновлять состав в нем при изменениях записей
+        previous_posts = db_session.query(TrainingPost)\
+            .filter(TrainingPost.chat_id == str(Config.CHANNEL_ID))\
+            .all()
+        db_session.add(TrainingPost(
+            training_id=training.id,
+            chat_id=str(Config.CHANNEL_ID),
+            message_id=sent_message.message_id,
+            rendered_hash=get_rendered_hash(message)
+        ))
+        db_session.commit()
+        
+        # Закрепляем новый пост вместо предыдущих (если у бота есть права)
+        try:
+            for post in previous_posts:
+                await bot.unpin_chat_message(chat_id=post.chat_id, message_id=post.message_id, **bulk_lane_kwargs(bot))
+            await bot.pin_chat_message(
+                chat_id=Config.CHANNEL_ID,
+                message_id=sent_message.message_id,
+                disable_notification=True,
+                **bulk_lane_kwargs(bot)
+            )
+        except Exception as e:
+            logger.warning(f"⚠️ Не удалось закрепить еженедельный пост: {e}")
         
-        logger.info(f"✅ Еженедельный пост о тренировке отправлен в канал {Config.CHANNEL_ID}")
+        logger.info(f"✅ Еженедельный пост о тренировке {training.id} отправлен в канал {Config.CHANNEL_ID}")
         return True
         
     except NetworkError as e:
@@ -60,8 +142,138 @@ async def send_weekly_training_post(bot):
         return False
     except Exception as e:
         logger.error(f"Неожиданная ошибка при отправке еженедельного поста: {e}")
+        db_session.rollback()
         return False
 
+async def update_training_posts(bot, training_id):
+    """Обновляет состав во всех постах о тренировке, если текст поста изменился"""
+    posts = db_session.query(TrainingPost).filter_by(training_id=training_id).all()
+    if not posts:
+        return 0
+    
+    message = render_training_post(snapshots.load_roster(training_id))
+    rendered_hash = get_rendered_hash(message)
+    updated_count = 0
+    
+    for post in posts:
+        if post.rendered_hash == rendered_hash:
+            continue
+        try:
+            await bot.edit_message_text(
+                chat_id=post.chat_id,
+                message_id=post.message_id,
+                text=message,
+                reply_markup=get_training_post_keyboard(bot, training_id),
+                **bulk_lane_kwargs(bot)
+            )
+            updated_count += 1
+        except BadRequest as e:
+            error_msg = str(e).lower()
+            if 'message to edit not found' in error_msg:
+                # Пост удален из канала - больше не пытаемся его обновлять
+                logger.warning(f"⚠️ Пост {post.message_id} о тренировке {training_id} удален из канала")
+                db_session.delete(post)
+                continue
+            if 'message is not modified' not in error_msg:
+                raise
+        post.rendered_hash = rendered_hash
+    
+    db_session.commit()
+    if updated_count:
+        logger.info(f"🔄 Обновлен состав в {updated_count} постах о тренировке {training_id}")
+    return updated_count
+
+def start_roster_post_updates(bot):
+    """Включает обновление постов с составом через указанного бота (вызывается из event loop бота)"""
+    global _roster_post_bot, _roster_post_loop
+    _roster_post_bot = bot
+    _roster_post_loop = asyncio.get_running_loop()
+
+def is_bot_in_process():
+    """Запущен ли бот в этом процессе (иначе действия с ботом идут через очередь команд)"""
+    return _roster_post_loop is not None
+
+def call_bot_threadsafe(func, timeout=60):
+    """
+    Выполняет func(bot) в event loop запущенного бота и ждет результат из потока веб-сервера.
+    Запросы к Telegram при этом проходят через ограничитель бота.
+    Возвращает None, если бот в этом процессе не запущен. Если результата нет за timeout секунд,
+    задача в боте отменяется и выбрасывается concurrent.futures.TimeoutError.
+    """
+    if _roster_post_loop is None:
+        return None
+
+    async def call():
+        try:
+            return await func(_roster_post_bot)
+        finally:
+            db_session.remove()
+
+    future = asyncio.run_coroutine_threadsafe(call(), _roster_post_loop)
+    try:
+        return future.result(timeout)
+    except concurrent.futures.TimeoutError:
+        # Иначе задача продолжит работать в боте, хотя ее результат уже никто не ждет
+        future.cancel()
+        raise
+
+def send_weekly_training_post_threadsafe(timeout=60):
+    """
+    Отправляет еженедельный пост через запущенного бота из потока веб-сервера.
+    Возвращает None, если бот в этом процессе не запущен.
+    """
+    return call_bot_threadsafe(send_weekly_training_post, timeout)
+
+def request_roster_post_update(training_id):
+    """
+    Планирует обновление поста с составом тренировки.
+    Все изменения в пределах ROSTER_POST_DEBOUNCE_SECONDS объединяются в одно редактирование.
+    Можно вызывать как из обработчиков бота, так и из потоков веб-сервера.
+    Если бот запущен в другом процессе, обновление передается ему через очередь команд.
+    """
+    if _roster_post_loop is None:
+        commands.enqueue_command(commands.UPDATE_ROSTER_POST, training_id=training_id)
+        return
+    try:
+        running_loop = asyncio.get_running_loop()
+    except RuntimeError:
+        running_loop = None
+    
+    if running_loop is _roster_post_loop:
+        _schedule_roster_post_update(training_id)
+    else:
+        _roster_post_loop.call_soon_threadsafe(_schedule_roster_post_update, training_id)
+
+def _schedule_roster_post_update(training_id):
+    if training_id in _pending_roster_updates:
+        # Обновление уже запланировано - оно подхватит и это изменение
+        return
+    _pending_roster_updates[training_id] = asyncio.create_task(_debounced_roster_post_update(training_id))
+
+async def _debounced_roster_post_update(training_id):
+    try:
+        await asyncio.sleep(Config.ROSTER_POST_DEBOUNCE_SECONDS)
+        # Изменения, пришедшие во время обновления, запланируют следующее обновление
+        _pending_roster_updates.pop(training_id, None)
+        await update_training_posts(_roster_post_bot, training_id)
+    except Exception as e:
+        logger.error(f"❌ Ошибка при обновлении поста о тренировке {training_id}: {e}")
+        db_session.rollback()
+    finally:
+        if _pending_roster_updates.get(training_id) is asyncio.current_task():
+            _pending_roster_updates.pop(training_id, None)
+        db_session.remove()
+
+async def _handle_update_roster_post_command(bot, training_id):
+    request_roster_post_update(training_id)
+
+async def _handle_send_weekly_post_command(bot):
+    if not await send_weekly_training_post(bot):
+        raise RuntimeError("не удалось отправить еженедельный пост")
+
+commands.register_command_handler(commands.UPDATE_ROSTER_POST, _handle_update_roster_post_command)
+commands.register_command_handler(commands.SEND_WEEKLY_POST, _handle_send_weekly_post_command)
+
 def get_next_monday_11am():
     """Вычисляет следующий понедельник в 11:00"""
     now = datetime.now()
@@ -106,8 +318,11 @@ async def weekly_post_scheduler(bot):
                 
         except Exception as e:
             logger.error(f"❌ Ошибка в планировщике еженедельных постов: {e}")
+            db_session.rollback()
             # Ждем час перед повторной попыткой
             await asyncio.sleep(3600)
+        finally:
+            db_session.remove()
 
 async def start_weekly_post_scheduler(bot):
     """Запускает планировщик еженедельных постов в фоновом режиме"""
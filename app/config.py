@@ -6,16 +6,55 @@ load_dotenv()
 
 class Config:
     SQLALCHEMY_DATABASE_URI = os.getenv('DATABASE_URL', 'sqlite:///training_bot.db')
+    SQLALCHEMY_DATABASE_READ_URI = os.getenv('DATABASE_READ_URL')  # Реплика только для чтения (необязательно): на нее уходят запросы просмотра
+    DATABASE_READ_STICKY_SECONDS = float(os.getenv('DATABASE_READ_STICKY_SECONDS', '10'))  # Сколько после своей записи пользователь читает с основной БД, а не с отстающей реплики
     TELEGRAM_TOKEN = os.getenv('TELEGRAM_TOKEN')
     SECRET_KEY = os.getenv('SECRET_KEY', 'your_secret_key_here')
     ADMIN_IDS = [int(id.strip()) for id in os.getenv('ADMIN_IDS', '').split(',') if id.strip()]
     ADMIN_USERNAME = os.getenv('ADMIN_USERNAME', 'admin')
     ADMIN_PASSWORD = os.getenv('ADMIN_PASSWORD', 'admin')
+    SCHEDULE_PAGE_SIZE = int(os.getenv('SCHEDULE_PAGE_SIZE', '5'))  # Тренировок на одной странице расписания в боте
+    PAST_TRAININGS_PAGE_SIZE = int(os.getenv('PAST_TRAININGS_PAGE_SIZE', '20'))  # Прошедших тренировок на одной странице админки
+    ROSTER_EVENTS_MAX_STREAMS = int(os.getenv('ROSTER_EVENTS_MAX_STREAMS', '4'))  # Открытых одновременно потоков событий админки (каждый занимает поток веб-сервера)
+    ROSTER_EVENTS_STREAM_SECONDS = float(os.getenv('ROSTER_EVENTS_STREAM_SECONDS', '300'))  # Через сколько поток событий закрывается и браузер переподключается
+    ROSTER_EVENTS_KEEPALIVE_SECONDS = float(os.getenv('ROSTER_EVENTS_KEEPALIVE_SECONDS', '15'))  # Пауза между keepalive в потоке событий
+    NOTIFICATION_BATCH_TIMEOUT_SECONDS = float(os.getenv('NOTIFICATION_BATCH_TIMEOUT_SECONDS', '120'))  # Сколько запрос админки ждет отправки пачки уведомлений
+    ROSTER_EVENTS_QUEUE_SIZE = int(os.getenv('ROSTER_EVENTS_QUEUE_SIZE', '100'))  # Событий в очереди одного потока, после которых он перечитывает составы целиком
+    BOT_CONCURRENT_UPDATES = int(os.getenv('BOT_CONCURRENT_UPDATES', '8'))  # Сколько обновлений бот обрабатывает одновременно
+    CALLBACK_DEDUP_TTL_SECONDS = float(os.getenv('CALLBACK_DEDUP_TTL_SECONDS', '2'))  # Окно, в котором повторное нажатие кнопки считается дублем
+    WEB_WORKER_THREADS = int(os.getenv('WEB_WORKER_THREADS', '8'))  # Потоков для обработки запросов админки (отдельно от бота)
+    APP_ROLE = os.getenv('APP_ROLE', 'all')  # Что запускать в процессе: web, bot, scheduler или all
+    BOT_START_RETRY_SECONDS = float(os.getenv('BOT_START_RETRY_SECONDS', '10'))  # Пауза перед повторным запуском бота
+    BOT_START_MAX_RETRY_SECONDS = float(os.getenv('BOT_START_MAX_RETRY_SECONDS', '300'))  # Предел паузы, которая удваивается после каждой неудачи
+    HEALTH_CHECK_INTERVAL_SECONDS = float(os.getenv('HEALTH_CHECK_INTERVAL_SECONDS', '10'))  # Как часто обновляется снимок для /health
+    HEALTH_STALE_FACTOR = float(os.getenv('HEALTH_STALE_FACTOR', '3'))  # Сколько проходов может пропустить фоновый цикл, прежде чем /health сочтет его зависшим
+    BOT_COMMAND_POLL_SECONDS = float(os.getenv('BOT_COMMAND_POLL_SECONDS', '2'))  # Как часто бот проверяет очередь команд от админки
+    BOT_COMMAND_BATCH_SIZE = int(os.getenv('BOT_COMMAND_BATCH_SIZE', '50'))  # Команд за одну проверку очереди
+    BOT_COMMAND_PROCESSING_TIMEOUT_MINUTES = float(os.getenv('BOT_COMMAND_PROCESSING_TIMEOUT_MINUTES', '10'))  # Через сколько минут команда, взятая упавшим процессом бота, возвращается в очередь
+    BOT_COMMAND_RETENTION_DAYS = float(os.getenv('BOT_COMMAND_RETENTION_DAYS', '7'))  # Сколько дней хранятся выполненные команды; неудачные хранятся, пока их не удалят вручную
     
     # Настройки для еженедельных постов
     CHANNEL_ID = os.getenv('CHANNEL_ID')  # ID канала или группы для постов
     MESSAGE_THREAD_ID = os.getenv('MESSAGE_THREAD_ID')  # ID топика (если используется супергруппа с топиками)
     WEEKLY_POST_ENABLED = os.getenv('WEEKLY_POST_ENABLED', 'true').lower() == 'true'
+    WEEKLY_POST_PRICE = os.getenv('WEEKLY_POST_PRICE', '800-1000₽')  # Стоимость тренировки в посте
+    ROSTER_POST_DEBOUNCE_SECONDS = float(os.getenv('ROSTER_POST_DEBOUNCE_SECONDS', '15'))  # Задержка объединения изменений состава перед обновлением поста
+
+    # Настройки напоминаний об оплате
+    PAYMENT_REMINDER_DIGEST = os.getenv('PAYMENT_REMINDER_DIGEST', 'true').lower() == 'true'  # Одно сообщение на должника вместо сообщения на каждую запись
+    # Через сколько часов после начала тренировки отправлять напоминания (по возрастанию)
+    PAYMENT_REMINDER_SCHEDULE = sorted(float(h.strip()) for h in os.getenv('PAYMENT_REMINDER_SCHEDULE', '1.5,3,6,24').split(',') if h.strip())
+    PAYMENT_REMINDER_REPEAT_HOURS = float(os.getenv('PAYMENT_REMINDER_REPEAT_HOURS', '24'))  # Интервал повтора после последней точки расписания (0 - не повторять)
+    PAYMENT_REMINDER_INTERVAL_MINUTES = int(os.getenv('PAYMENT_REMINDER_INTERVAL_MINUTES', '30'))  # Окно, за которое проверяются все должники
+    PAYMENT_REMINDER_SHARDS = int(os.getenv('PAYMENT_REMINDER_SHARDS', '30'))  # На сколько частей (по user_id) делится окно проверки
+    PAYMENT_REMINDER_RATE = float(os.getenv('PAYMENT_REMINDER_RATE', '5'))  # Максимум напоминаний в секунду
+    ARCHIVE_AFTER_MONTHS = int(os.getenv('ARCHIVE_AFTER_MONTHS', '6'))  # Через сколько месяцев (по 30 дней) оплаченные тренировки уходят в архив (0 - не архивировать)
+    ARCHIVE_INTERVAL_HOURS = float(os.getenv('ARCHIVE_INTERVAL_HOURS', '24'))  # Как часто запускается архивация
+    ARCHIVE_BATCH_SIZE = int(os.getenv('ARCHIVE_BATCH_SIZE', '50'))  # Тренировок в одной транзакции архивации
+
+    # Лимиты исходящих запросов к Telegram (запросов в секунду) по полосам приоритета
+    OUTBOUND_INTERACTIVE_RATE = float(os.getenv('OUTBOUND_INTERACTIVE_RATE', '25'))  # Ответы на команды и кнопки
+    OUTBOUND_BULK_RATE = float(os.getenv('OUTBOUND_BULK_RATE', '5'))  # Посты в канал, напоминания, рассылки
 
     # Проверяем наличие токена
     if not TELEGRAM_TOKEN:
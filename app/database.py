@@ -1,7 +1,115 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, scoped_session
+import asyncio
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from sqlalchemy import create_engine, event, Insert, Update, Delete
+from sqlalchemy.orm import Session, sessionmaker, scoped_session
 from .config import Config
 
+def _session_scope():
+    """
+    Ключ сессии в scoped_session: обработчики бота выполняются параллельно в одном потоке,
+    поэтому каждая asyncio-задача получает свою сессию; вне event loop (запросы веб-сервера) - по потоку.
+    Задачи, которые пользуются сессией, должны вызывать db_session.remove() по завершении.
+    """
+    try:
+        task = asyncio.current_task()
+    except RuntimeError:
+        task = None
+    return task if task is not None else threading.get_ident()
+
 # Создаем глобальную сессию
 engine = create_engine(Config.SQLALCHEMY_DATABASE_URI)
-db_session = scoped_session(sessionmaker(bind=engine)) 
\ No newline at end of file
+# Реплика для чтения; без DATABASE_READ_URL все запросы идут в основную БД
+read_engine = create_engine(Config.SQLALCHEMY_DATABASE_READ_URI) if Config.SQLALCHEMY_DATABASE_READ_URI else None
+
+# Кто выполняет текущий обработчик (ключ пользователя) и можно ли ему читать с реплики.
+# Контекстные переменные свои у каждой asyncio-задачи и у каждого потока веб-сервера
+_current_user = contextvars.ContextVar('current_user', default=None)
+_read_from_replica = contextvars.ContextVar('read_from_replica', default=False)
+
+# Время последней записи пользователя: ключ -> time.monotonic(); порядок вставки = порядок записи
+_last_writes = {}
+_last_writes_lock = threading.Lock()
+
+def _record_write(user_key):
+    now = time.monotonic()
+    with _last_writes_lock:
+        _last_writes.pop(user_key, None)
+        _last_writes[user_key] = now
+        # Старые записи больше не влияют на выбор БД
+        while _last_writes:
+            key, written_at = next(iter(_last_writes.items()))
+            if now - written_at <= Config.DATABASE_READ_STICKY_SECONDS:
+                break
+            del _last_writes[key]
+
+def _wrote_recently(user_key):
+    with _last_writes_lock:
+        written_at = _last_writes.get(user_key)
+    return written_at is not None and time.monotonic() - written_at <= Config.DATABASE_READ_STICKY_SECONDS
+
+@contextmanager
+def user_context(user_key, read_only=False):
+    """
+    Выполняет код от имени пользователя (например, 'user:<telegram id>' или 'admin').
+    read_only=True - запросы чтения уходят на реплику, если она настроена и пользователь
+    не записывал ничего в последние DATABASE_READ_STICKY_SECONDS (иначе он мог бы не увидеть свою запись).
+    """
+    replica = read_only and read_engine is not None and not (user_key and _wrote_recently(user_key))
+    user_token = _current_user.set(user_key)
+    replica_token = _read_from_replica.set(replica)
+    try:
+        yield
+    finally:
+        _read_from_replica.reset(replica_token)
+        _current_user.reset(user_token)
+
+def reads_from_replica():
+    """Уходят ли сейчас запросы чтения на реплику"""
+    return _read_from_replica.get()
+
+@contextmanager
+def primary_reads():
+    """Чтение внутри блока - из основной БД: по его результату принимается решение о записи"""
+    token = _read_from_replica.set(False)
+    try:
+        yield
+    finally:
+        _read_from_replica.reset(token)
+
+class RoutingSession(Session):
+    """Сессия, которая отправляет чтение в обработчиках просмотра на реплику, а запись - в основную БД"""
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        if (_read_from_replica.get() and not self._flushing
+                and not isinstance(clause, (Insert, Update, Delete))):
+            return read_engine
+        return engine
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _after_flush(session, flush_context):
+    session.info['wrote'] = True
+
+@event.listens_for(RoutingSession, 'do_orm_execute')
+def _on_orm_execute(orm_execute_state):
+    # Массовые UPDATE/DELETE выполняются без flush
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        orm_execute_state.session.info['wrote'] = True
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _after_commit(session):
+    if not session.info.pop('wrote', False):
+        return
+    # Дальше в этом обработчике и в следующих запросах пользователя читаем из основной БД
+    _read_from_replica.set(False)
+    user_key = _current_user.get()
+    if user_key is not None:
+        _record_write(user_key)
+
+@event.listens_for(RoutingSession, 'after_rollback')
+def _after_rollback(session):
+    session.info.pop('wrote', None)
+
+db_session = scoped_session(sessionmaker(class_=RoutingSession), scopefunc=_session_scope)
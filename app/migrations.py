@@ -0,0 +1,83 @@
+import logging
+from sqlalchemy import inspect, literal, text
+from sqlalchemy.schema import CreateColumn
+from .models import Registration, ArchivedRegistration
+from .player_stats import needs_rebuild, rebuild_player_stats
+
+logger = logging.getLogger(__name__)
+
+# Колонки, добавленные в существующие таблицы после первого релиза.
+# create_all создает только новые таблицы, поэтому такие колонки добавляются здесь через ALTER TABLE
+ADDED_COLUMNS = [
+    Registration.__table__.c.team_assigned,
+    Registration.__table__.c.team_assigned_at,
+    Registration.__table__.c.paid_at,
+    ArchivedRegistration.__table__.c.paid_at,
+]
+
+def _add_column(connection, column):
+    """ALTER TABLE ... ADD COLUMN; для NOT NULL колонок значение по умолчанию задается на уровне БД"""
+    dialect = connection.dialect
+    ddl = f"ALTER TABLE {column.table.name} ADD COLUMN {CreateColumn(column).compile(dialect=dialect)}"
+    if not column.nullable:
+        default = literal(column.default.arg, column.type).compile(dialect=dialect, compile_kwargs={'literal_binds': True})
+        ddl = ddl.replace(' NOT NULL', f' DEFAULT {default} NOT NULL')
+    connection.execute(text(ddl))
+    logger.info(f"🧱 Добавлена колонка {column.table.name}.{column.name}")
+
+def _missing_columns(connection):
+    existing = {}
+    missing = []
+    for column in ADDED_COLUMNS:
+        table_name = column.table.name
+        if table_name not in existing:
+            existing[table_name] = {c['name'] for c in inspect(connection).get_columns(table_name)}
+        if column.name not in existing[table_name]:
+            missing.append(column)
+    return missing
+
+def _needs_migration(connection):
+    return (
+        bool(_missing_columns(connection))
+        or inspect(connection).has_table('team_assignments')
+        or needs_rebuild(connection)
+    )
+
+def migrate_team_assignments(connection):
+    """
+    Переносит статус распределения из таблицы team_assignments в registrations.team_assigned
+    и удаляет старую таблицу (ее внешний ключ мешал бы удалять тренировки).
+    """
+    if not inspect(connection).has_table('team_assignments'):
+        return
+    assigned = """
+        FROM team_assignments ta
+        WHERE ta.training_id = registrations.training_id
+          AND ta.user_id = registrations.user_id
+          AND ta.team_assigned = :assigned
+    """
+    result = connection.execute(text(f"""
+        UPDATE registrations
+        SET team_assigned = :assigned,
+            team_assigned_at = (SELECT MAX(ta.assigned_at) {assigned})
+        WHERE EXISTS (SELECT 1 {assigned})
+    """), {'assigned': True})
+    connection.execute(text("DROP TABLE team_assignments"))
+    logger.info(f"🧱 Статус распределения перенесен в registrations ({result.rowcount} участников), таблица team_assignments удалена")
+
+def run_migrations(engine):
+    """Доводит схему существующей БД до текущих моделей; повторный запуск ничего не меняет"""
+    try:
+        with engine.begin() as connection:
+            for column in _missing_columns(connection):
+                _add_column(connection, column)
+            migrate_team_assignments(connection)
+            # Новая таблица статистики заполняется по уже существующим записям
+            if needs_rebuild(connection):
+                rebuild_player_stats(connection)
+    except Exception as e:
+        # Миграцию мог одновременно выполнить другой процесс (веб и бот запущены раздельно)
+        with engine.connect() as connection:
+            if _needs_migration(connection):
+                raise
+        logger.warning(f"⚠️ Миграция уже выполнена другим процессом: {e}")
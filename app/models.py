@@ -1,4 +1,4 @@
-from datetime import datetime
+from datetime import datetime, timedelta
 from sqlalchemy import Column, Integer, BigInteger, String, DateTime, ForeignKey, Enum, Boolean, Text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
@@ -25,22 +25,11 @@ class RepeatType(enum.Enum):
     WEEKLY = "weekly"
     MONTHLY = "monthly"
 
-class TeamAssignment(Base):
-    __tablename__ = 'team_assignments'
-    
-    id = Column(Integer, primary_key=True)
-    training_id = Column(Integer, ForeignKey('trainings.id'), nullable=False)
-    user_id = Column(BigInteger, nullable=False)
-    team_assigned = Column(Boolean, default=False, nullable=False)  # Статус распределения на эту тренировку
-    assigned_at = Column(DateTime, nullable=True)  # Время когда было назначено распределение
-    
-    # Связи
-    training = relationship('Training', overlaps="team_assignments")
-    
-    # Уникальный индекс для пары training_id + user_id
-    __table_args__ = (
-        {'extend_existing': True}
-    )
+class CommandStatus(enum.Enum):
+    PENDING = "pending"  # Ждет обработки
+    PROCESSING = "processing"  # Взята процессом бота
+    DONE = "done"
+    FAILED = "failed"
 
 class Training(Base):
     __tablename__ = 'trainings'
@@ -49,7 +38,7 @@ class Training(Base):
     date_time = Column(DateTime, nullable=False)
     max_participants = Column(Integer, default=10)
     registrations = relationship('Registration', back_populates='training', cascade='all, delete-orphan')
-    team_assignments = relationship('TeamAssignment', cascade='all, delete-orphan')
+    posts = relationship('TrainingPost', back_populates='training', cascade='all, delete-orphan')
 
 class Registration(Base):
     __tablename__ = 'registrations'
@@ -65,10 +54,25 @@ class Registration(Base):
     position_type = Column(Enum(PositionType), nullable=True)  # Поле для амплуа (Нап/Зщ)
     goalkeeper = Column(Boolean, default=False, nullable=False)  # Поле для обозначения вратаря
     paid = Column(Boolean, default=False, nullable=False)  # Поле для отметки "Оплатил тренировку"
+    paid_at = Column(DateTime, nullable=True)  # Когда отмечена оплата
     last_payment_reminder = Column(DateTime, nullable=True)  # Время последнего напоминания об оплате
+    team_assigned = Column(Boolean, default=False, nullable=False)  # Игрок получил уведомление о распределении на эту тренировку
+    team_assigned_at = Column(DateTime, nullable=True)  # Время когда было назначено распределение
     
     training = relationship('Training', back_populates='registrations')
 
+class TrainingPost(Base):
+    __tablename__ = 'training_posts'
+    
+    id = Column(Integer, primary_key=True)
+    training_id = Column(Integer, ForeignKey('trainings.id'), nullable=False)
+    chat_id = Column(String(100), nullable=False)  # Канал или группа, куда отправлен пост
+    message_id = Column(Integer, nullable=False)  # ID сообщения с постом
+    rendered_hash = Column(String(40), nullable=True)  # Хэш последнего отправленного текста поста
+    created_at = Column(DateTime, default=datetime.now, nullable=False)
+    
+    training = relationship('Training', back_populates='posts')
+
 class Player(Base):
     __tablename__ = 'players'
     
@@ -79,10 +83,31 @@ class Player(Base):
     goalkeeper = Column(Boolean, default=False, nullable=False)  # Статус вратаря
     first_registration = Column(DateTime, nullable=False)  # Дата первой регистрации
     last_registration = Column(DateTime, nullable=False)  # Дата последней регистрации
-    total_registrations = Column(Integer, default=1, nullable=False)  # Общее количество записей
+    total_registrations = Column(Integer, default=1, nullable=False)  # Сколько раз записывался, без учета отмен; статистика - в PlayerStats
     created_at = Column(DateTime, default=datetime.now, nullable=False)
     updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now, nullable=False)
 
+class PlayerStats(Base):
+    """Заранее посчитанная статистика игрока, обновляется вместе с записями (app/player_stats.py)"""
+    __tablename__ = 'player_stats'
+    
+    user_id = Column(BigInteger, primary_key=True)
+    registrations_count = Column(Integer, default=0, nullable=False)  # Записи без отмен, включая архивные и предстоящие
+    cancellations_count = Column(Integer, default=0, nullable=False)  # Отмены до начала тренировки
+    no_shows_count = Column(Integer, default=0, nullable=False)  # Записи, снятые после начала тренировки (не пришел)
+    paid_count = Column(Integer, default=0, nullable=False)  # Оплаченные записи
+    payment_delay_count = Column(Integer, default=0, nullable=False)  # Оплаты, для которых известно время отметки
+    payment_delay_seconds = Column(BigInteger, default=0, nullable=False)  # Сумма задержек оплаты после начала тренировки
+    unpaid_count = Column(Integer, default=0, nullable=False)  # Неоплаченные записи полевого игрока, включая предстоящие
+    updated_at = Column(DateTime, default=datetime.now, nullable=False)
+    
+    @property
+    def average_payment_delay(self):
+        """Средняя задержка оплаты (timedelta) или None, если данных нет"""
+        if not self.payment_delay_count:
+            return None
+        return timedelta(seconds=self.payment_delay_seconds / self.payment_delay_count)
+
 class UserPreferences(Base):
     __tablename__ = 'user_preferences'
     
@@ -123,4 +148,61 @@ class ScheduledMessage(Base):
         if days:
             self.repeat_days = json.dumps(days)
         else:
-            self.repeat_days = None 
\ No newline at end of file
+            self.repeat_days = None 
+
+class BotCommand(Base):
+    """Команда для процесса бота (очередь между веб-админкой и ботом, когда они запущены раздельно)"""
+    __tablename__ = 'bot_commands'
+    
+    id = Column(Integer, primary_key=True)
+    command = Column(String(50), nullable=False)  # Имя команды, например update_roster_post
+    payload = Column(Text, nullable=True)  # Аргументы команды (JSON)
+    status = Column(Enum(CommandStatus), nullable=False, default=CommandStatus.PENDING)
+    error = Column(Text, nullable=True)  # Текст ошибки, если команда не выполнилась
+    created_at = Column(DateTime, default=datetime.now, nullable=False)
+    claimed_at = Column(DateTime, nullable=True)  # Когда процесс бота взял команду в работу
+    processed_at = Column(DateTime, nullable=True)
+
+class ArchivedTraining(Base):
+    """Прошедшая полностью оплаченная тренировка, перенесенная из trainings заданием хранения (app/archive.py)"""
+    __tablename__ = 'archived_trainings'
+    
+    id = Column(Integer, primary_key=True)  # Тот же id, что был в trainings
+    date_time = Column(DateTime, nullable=False, index=True)
+    max_participants = Column(Integer, nullable=True)
+    registrations_count = Column(Integer, default=0, nullable=False)  # Сколько участников было записано
+    archived_at = Column(DateTime, default=datetime.now, nullable=False)
+    
+    registrations = relationship('ArchivedRegistration', back_populates='training')
+
+class ArchivedRegistration(Base):
+    """Запись на архивную тренировку; колонки совпадают с registrations"""
+    __tablename__ = 'archived_registrations'
+    
+    id = Column(Integer, primary_key=True)  # Тот же id, что был в registrations
+    training_id = Column(Integer, ForeignKey('archived_trainings.id'), nullable=False, index=True)
+    user_id = Column(BigInteger, nullable=False, index=True)
+    username = Column(String(100))
+    display_name = Column(String(100), nullable=True)
+    registered_at = Column(DateTime, nullable=False)
+    jersey_type = Column(Enum(JerseyType), nullable=True)
+    team_type = Column(Enum(TeamType), nullable=True)
+    position_type = Column(Enum(PositionType), nullable=True)
+    goalkeeper = Column(Boolean, default=False, nullable=False)
+    paid = Column(Boolean, default=False, nullable=False)
+    paid_at = Column(DateTime, nullable=True)
+    team_assigned = Column(Boolean, default=False, nullable=False)
+    team_assigned_at = Column(DateTime, nullable=True)
+    
+    training = relationship('ArchivedTraining', back_populates='registrations')
+
+class ArchivedPlayerStats(Base):
+    """Итоги игрока по архивным тренировкам, чтобы статистика не требовала чтения архива"""
+    __tablename__ = 'archived_player_stats'
+    
+    user_id = Column(BigInteger, primary_key=True)
+    trainings_count = Column(Integer, default=0, nullable=False)  # Сколько архивных тренировок посетил
+    goalkeeper_count = Column(Integer, default=0, nullable=False)  # Из них вратарем
+    first_training_at = Column(DateTime, nullable=True)
+    last_training_at = Column(DateTime, nullable=True)
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now, nullable=False)
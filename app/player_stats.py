@@ -0,0 +1,147 @@
+import logging
+from collections import Counter, defaultdict
+from datetime import datetime
+from sqlalchemy import select, delete, insert
+from sqlalchemy.dialects import postgresql, sqlite
+from .database import db_session, engine
+from .models import PlayerStats, Registration, Training, ArchivedRegistration, ArchivedTraining
+
+logger = logging.getLogger(__name__)
+
+# Статистика игроков (player_stats) считается заранее: запись, отмена и оплата меняют счетчики игрока
+# в той же транзакции, поэтому админке достаточно прочитать одну строку на игрока.
+# rebuild_player_stats пересчитывает таблицу по текущим и архивным записям. Отмены и неявки
+# хранятся только в счетчиках (удаленных записей больше нет), поэтому при пересчете они сохраняются.
+
+COUNTERS = (
+    'registrations_count', 'cancellations_count', 'no_shows_count',
+    'paid_count', 'payment_delay_count', 'payment_delay_seconds', 'unpaid_count'
+)
+
+def payment_delay_seconds(training_start, paid_at):
+    """Через сколько секунд после начала тренировки отмечена оплата; оплата заранее - 0"""
+    return max(0, int((paid_at - training_start).total_seconds()))
+
+def _registration_counters(registration, training_start, sign=1):
+    """Вклад записи в счетчики игрока; sign=-1 - запись снимается"""
+    counters = Counter(registrations_count=sign)
+    if registration.paid:
+        counters['paid_count'] += sign
+        if registration.paid_at:
+            counters['payment_delay_count'] += sign
+            counters['payment_delay_seconds'] += sign * payment_delay_seconds(training_start, registration.paid_at)
+    elif not registration.goalkeeper:
+        # Вратари не платят
+        counters['unpaid_count'] += sign
+    return counters
+
+# INSERT ... ON CONFLICT есть в обеих используемых БД, но строится через модуль диалекта
+_UPSERT_INSERTS = {'postgresql': postgresql.insert, 'sqlite': sqlite.insert}
+
+def _apply(changes):
+    """
+    Прибавляет счетчики {user_id: Counter} к статистике игроков одним INSERT ... ON CONFLICT DO UPDATE.
+    Прибавление выполняется на стороне БД, поэтому одновременные изменения от бота и админки
+    не теряются и не конфликтуют, даже если строки игрока еще нет.
+    """
+    changes = {user_id: counters for user_id, counters in changes.items() if any(counters.values())}
+    if not changes:
+        return
+    now = datetime.now()
+    statement = _UPSERT_INSERTS[engine.dialect.name](PlayerStats).values([
+        {'user_id': user_id, 'updated_at': now, **{name: counters[name] for name in COUNTERS}}
+        for user_id, counters in changes.items()
+    ])
+    increments = {name: getattr(PlayerStats, name) + getattr(statement.excluded, name) for name in COUNTERS}
+    db_session.execute(statement.on_conflict_do_update(
+        index_elements=[PlayerStats.user_id],
+        set_={'updated_at': statement.excluded.updated_at, **increments}
+    ))
+
+def registrations_added(registrations, training_start):
+    """Новые записи на тренировку, начинающуюся в training_start"""
+    changes = defaultdict(Counter)
+    for registration in registrations:
+        changes[registration.user_id].update(_registration_counters(registration, training_start))
+    _apply(changes)
+
+def registrations_removed(registrations, training_start, cancelled=True):
+    """
+    Записи сняты с тренировки. Если cancelled, снятие до начала тренировки считается отменой,
+    после начала - неявкой; cancelled=False - тренировка удалена целиком, записи просто вычитаются.
+    """
+    now = datetime.now()
+    changes = defaultdict(Counter)
+    for registration in registrations:
+        counters = _registration_counters(registration, training_start, sign=-1)
+        if cancelled:
+            counters['cancellations_count' if training_start > now else 'no_shows_count'] += 1
+        changes[registration.user_id].update(counters)
+    _apply(changes)
+
+def registration_changed(registration, training_start, **changes):
+    """Меняет поля записи, от которых зависят счетчики (например, goalkeeper), и поправляет счетчики на разницу"""
+    counters = Counter()
+    counters.subtract(_registration_counters(registration, training_start))
+    for name, value in changes.items():
+        setattr(registration, name, value)
+    counters.update(_registration_counters(registration, training_start))
+    _apply({registration.user_id: counters})
+
+def registration_paid(registration, training_start):
+    """Запись отмечена оплаченной; paid и paid_at уже выставлены"""
+    counters = Counter(paid_count=1)
+    if not registration.goalkeeper:
+        counters['unpaid_count'] -= 1
+    if registration.paid_at:
+        counters['payment_delay_count'] += 1
+        counters['payment_delay_seconds'] += payment_delay_seconds(training_start, registration.paid_at)
+    _apply({registration.user_id: counters})
+
+def merge_players(from_user_id, to_user_id):
+    """Переносит статистику временного игрока, добавленного вручную, на его настоящий user_id"""
+    stats = db_session.get(PlayerStats, from_user_id)
+    if not stats:
+        return
+    counters = Counter({name: getattr(stats, name) for name in COUNTERS})
+    db_session.delete(stats)
+    db_session.flush()
+    _apply({to_user_id: counters})
+
+def needs_rebuild(connection):
+    """Таблица статистики пуста, а записи есть - например, она только что создана"""
+    if connection.scalar(select(PlayerStats.user_id).limit(1)) is not None:
+        return False
+    return any(
+        connection.scalar(select(model.id).limit(1)) is not None
+        for model in (Registration, ArchivedRegistration)
+    )
+
+def rebuild_player_stats(connection):
+    """Пересчитывает player_stats по текущим и архивным записям; возвращает количество игроков"""
+    kept = {
+        row.user_id: row
+        for row in connection.execute(select(PlayerStats.user_id, PlayerStats.cancellations_count, PlayerStats.no_shows_count))
+    }
+    totals = defaultdict(Counter)
+    for registrations, trainings in ((Registration, Training), (ArchivedRegistration, ArchivedTraining)):
+        rows = connection.execute(
+            select(registrations.user_id, registrations.goalkeeper, registrations.paid, registrations.paid_at, trainings.date_time)
+                .join(trainings, registrations.training_id == trainings.id)
+        )
+        for row in rows:
+            totals[row.user_id].update(_registration_counters(row, row.date_time))
+
+    now = datetime.now()
+    stats = []
+    for user_id in totals.keys() | kept.keys():
+        counters = totals[user_id]
+        counters['cancellations_count'] = kept[user_id].cancellations_count if user_id in kept else 0
+        counters['no_shows_count'] = kept[user_id].no_shows_count if user_id in kept else 0
+        stats.append({'user_id': user_id, 'updated_at': now, **{name: counters[name] for name in COUNTERS}})
+
+    connection.execute(delete(PlayerStats))
+    if stats:
+        connection.execute(insert(PlayerStats), stats)
+    logger.info(f"📊 Статистика игроков пересчитана: {len(stats)} игроков")
+    return len(stats)
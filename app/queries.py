@@ -0,0 +1,102 @@
+from datetime import datetime
+from sqlalchemy import select, func, bindparam
+from .database import db_session
+from .models import Training, Registration, UserPreferences, Player, ScheduledMessage, BotCommand, CommandStatus
+
+# Частые запросы обработчиков бота и фоновых задач.
+# Выражения строятся один раз при импорте, а значения передаются параметрами (bindparam):
+# так на каждый вызов не пересобирается дерево выражения Query, а скомпилированный SQL
+# берется из кэша SQLAlchemy. Выигрыш показывает scripts/bench_queries.py.
+# Запросы для формирования сообщений (составы, записи пользователя) - в app/snapshots.py
+
+_UPCOMING_TRAININGS = select(Training)\
+    .where(Training.date_time > bindparam('now'))\
+    .order_by(Training.date_time)
+
+_NEXT_TRAINING = _UPCOMING_TRAININGS.limit(1)
+
+# Страница расписания вместе с количеством участников
+_SCHEDULE_PAGE = select(Training, func.count(Registration.id))\
+    .outerjoin(Registration, Registration.training_id == Training.id)\
+    .where(Training.date_time > bindparam('now'))\
+    .group_by(Training.id)\
+    .order_by(Training.date_time)\
+    .limit(bindparam('limit'))\
+    .offset(bindparam('offset'))
+
+_REGISTRATIONS_COUNT = select(func.count(Registration.id))\
+    .where(Registration.training_id == bindparam('training_id'))
+
+_USER_REGISTRATION = select(Registration)\
+    .where(Registration.training_id == bindparam('training_id'), Registration.user_id == bindparam('user_id'))\
+    .limit(1)
+
+_USER_UPCOMING_REGISTRATIONS = select(Registration)\
+    .join(Training)\
+    .where(Registration.user_id == bindparam('user_id'), Training.date_time > bindparam('now'))\
+    .order_by(Training.date_time)
+
+# Неоплаченные записи полевого игрока (вратари не платят)
+_USER_UNPAID_REGISTRATIONS = select(Registration)\
+    .join(Training)\
+    .where(
+        Registration.user_id == bindparam('user_id'),
+        Registration.paid == False,
+        Registration.goalkeeper == False
+    )\
+    .order_by(Training.date_time)
+
+_USER_PREFERENCES = select(UserPreferences)\
+    .where(UserPreferences.user_id == bindparam('user_id'))\
+    .limit(1)
+
+# Игрок, добавленный админом вручную: временный отрицательный user_id
+_TEMPORARY_PLAYER = select(Player)\
+    .where(Player.username == bindparam('username'), Player.user_id < 0)\
+    .limit(1)
+
+_ACTIVE_SCHEDULED_MESSAGES = select(ScheduledMessage)\
+    .where(ScheduledMessage.is_active == True)
+
+_PENDING_COMMANDS = select(BotCommand.id, BotCommand.command, BotCommand.payload)\
+    .where(BotCommand.status == CommandStatus.PENDING)\
+    .order_by(BotCommand.id)\
+    .limit(bindparam('limit'))
+
+def upcoming_trainings():
+    """Все предстоящие тренировки по дате"""
+    return db_session.scalars(_UPCOMING_TRAININGS, {'now': datetime.now()}).all()
+
+def next_training():
+    """Ближайшая предстоящая тренировка или None"""
+    return db_session.scalars(_NEXT_TRAINING, {'now': datetime.now()}).first()
+
+def schedule_page(limit, offset):
+    """Предстоящие тренировки [(training, количество участников), ...]"""
+    return db_session.execute(_SCHEDULE_PAGE, {'now': datetime.now(), 'limit': limit, 'offset': offset}).all()
+
+def registrations_count(training_id):
+    return db_session.scalar(_REGISTRATIONS_COUNT, {'training_id': training_id})
+
+def user_registration(training_id, user_id):
+    """Запись пользователя на тренировку или None"""
+    return db_session.scalars(_USER_REGISTRATION, {'training_id': training_id, 'user_id': user_id}).first()
+
+def user_upcoming_registrations(user_id):
+    return db_session.scalars(_USER_UPCOMING_REGISTRATIONS, {'user_id': user_id, 'now': datetime.now()}).all()
+
+def user_unpaid_registrations(user_id):
+    return db_session.scalars(_USER_UNPAID_REGISTRATIONS, {'user_id': user_id}).all()
+
+def user_preferences(user_id):
+    return db_session.scalars(_USER_PREFERENCES, {'user_id': user_id}).first()
+
+def temporary_player(username):
+    return db_session.scalars(_TEMPORARY_PLAYER, {'username': username}).first()
+
+def active_scheduled_messages():
+    return db_session.scalars(_ACTIVE_SCHEDULED_MESSAGES).all()
+
+def pending_commands(limit):
+    """Команды из очереди бота [(id, command, payload), ...] по порядку"""
+    return db_session.execute(_PENDING_COMMANDS, {'limit': limit}).all()
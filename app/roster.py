@@ -0,0 +1,95 @@
+import queue
+import threading
+import uuid
+from .config import Config
+from . import runtime
+from .bot.weekly_posts import request_roster_post_update
+
+# Версии составов тренировок: training_id -> номер изменения.
+# Хранятся в памяти и увеличиваются при каждом изменении состава (запись, отмена, оплата,
+# майки и команды), поэтому ETag списка участников проверяется без обращения к БД.
+_versions = {}
+_lock = threading.Lock()
+# Отличает версии разных запусков процесса: после перезапуска счетчики начинаются заново
+_boot_id = uuid.uuid4().hex[:8]
+
+# Типы изменений состава, которые получают подписчики (SSE-потоки админки)
+REGISTERED = 'registered'  # Новый участник: в событии есть participant
+CANCELLED = 'cancelled'  # Участник удален: registration_id
+PAID = 'paid'  # Участник отметил оплату: registration_id
+UPDATED = 'updated'  # Прочие изменения - состав нужно перечитать
+RESYNC = 'resync'  # Подписчик не успевал читать события и пропустил часть - перечитать все
+
+# Очереди подписчиков на события изменений составов
+_subscribers = set()
+
+def participant_to_dict(registration):
+    """Участник тренировки в формате JSON для админки"""
+    return {
+        'id': registration.id,
+        'user_id': registration.user_id,
+        'username': registration.username or 'Без имени',
+        'display_name': registration.display_name,
+        'name': registration.display_name or registration.username or 'Без имени',
+        'registered_at': registration.registered_at.strftime('%d.%m.%Y %H:%M'),
+        'jersey_type': registration.jersey_type.value if registration.jersey_type else None,
+        'team_type': registration.team_type.value if registration.team_type else None,
+        'position_type': registration.position_type.value if registration.position_type else None,
+        'goalkeeper': registration.goalkeeper,
+        'team_assigned': registration.team_assigned,
+        'paid': registration.paid
+    }
+
+def roster_changed(training_id, change=UPDATED, registration_id=None, participant=None, update_post=True):
+    """
+    Отмечает изменение состава тренировки: увеличивает версию и рассылает событие подписчикам.
+    update_post=False - изменение не влияет на пост с составом (оплата, майки, команды).
+    """
+    with _lock:
+        version = _versions[training_id] = _versions.get(training_id, 0) + 1
+    if _subscribers:
+        event = {'type': change, 'training_id': training_id, 'version': version}
+        if registration_id is not None:
+            event['registration_id'] = registration_id
+        if participant is not None:
+            event['participant'] = participant
+        _publish(event)
+    if update_post:
+        request_roster_post_update(training_id)
+
+def get_roster_version(training_id):
+    with _lock:
+        return _versions.get(training_id, 0)
+
+def get_roster_etag(training_id):
+    """
+    Возвращает ETag состава тренировки или None, если версиям в памяти нельзя доверять:
+    когда бот работает в другом процессе, его изменения сюда не доходят.
+    """
+    if runtime.get_role() != 'all':
+        return None
+    return f"{_boot_id}-{training_id}-{get_roster_version(training_id)}"
+
+def subscribe():
+    """Возвращает очередь, в которую будут приходить события изменений составов"""
+    events = queue.Queue(maxsize=Config.ROSTER_EVENTS_QUEUE_SIZE)
+    with _lock:
+        _subscribers.add(events)
+    return events
+
+def unsubscribe(events):
+    with _lock:
+        _subscribers.discard(events)
+
+def _publish(event):
+    """Кладет событие в очереди подписчиков; можно вызывать из любого потока"""
+    with _lock:
+        subscribers = list(_subscribers)
+    for events in subscribers:
+        try:
+            events.put_nowait(event)
+        except queue.Full:
+            # Подписчик отстал: вместо пропущенных событий он перечитает составы целиком
+            with events.mutex:
+                events.queue.clear()
+            events.put_nowait({'type': RESYNC})
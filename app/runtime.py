@@ -0,0 +1,110 @@
+import threading
+import time
+from datetime import datetime
+
+# Состояние процесса для health-check: его обновляют запуск бота и фоновые циклы в event loop,
+# а читает веб-сервер из своих потоков, без обращения к БД
+
+# Состояния бота
+BOT_DISABLED = 'disabled'  # Бот не запускается в этом процессе (роль web или scheduler)
+BOT_STARTING = 'starting'  # Идет попытка запуска
+BOT_RETRYING = 'retrying'  # Попытка не удалась, ждем следующую
+BOT_RUNNING = 'running'
+BOT_STOPPED = 'stopped'
+
+_lock = threading.Lock()
+_role = 'all'
+_bot = {
+    'state': BOT_DISABLED,
+    'attempts': 0,
+    'last_error': None,
+    'next_attempt_at': None,
+    'since': datetime.now(),
+}
+# Фоновые циклы: имя -> время и задержка последнего прохода
+_loops = {}
+# Источники метрик (глубина очередей и т.п.): имя -> функция без аргументов
+_metrics_sources = {}
+# Снимок проверок, которые обновляет монитор здоровья (БД, задержка event loop, метрики)
+_snapshot = {}
+
+def set_role(role):
+    """Запоминает роль процесса"""
+    global _role
+    _role = role
+
+def get_role():
+    return _role
+
+def set_bot_state(state, error=None, next_attempt_at=None):
+    """Обновляет состояние бота; при запуске увеличивает счетчик попыток"""
+    with _lock:
+        if state == BOT_STARTING:
+            _bot['attempts'] += 1
+        if error is not None or state == BOT_RUNNING:
+            _bot['last_error'] = error
+        _bot['state'] = state
+        _bot['next_attempt_at'] = next_attempt_at
+        _bot['since'] = datetime.now()
+
+def get_bot_state():
+    """Возвращает копию состояния бота для ответа health-check"""
+    with _lock:
+        state = dict(_bot)
+    state['since'] = state['since'].isoformat()
+    if state['next_attempt_at']:
+        state['next_attempt_at'] = state['next_attempt_at'].isoformat()
+    return state
+
+def record_loop_tick(name, interval):
+    """
+    Отмечает очередной проход фонового цикла.
+    interval - ожидаемая пауза между проходами, с; задержка (lag) - насколько проход опоздал.
+    """
+    now = time.monotonic()
+    with _lock:
+        previous = _loops.get(name)
+        lag = max(0.0, now - previous['last_tick'] - interval) if previous else 0.0
+        _loops[name] = {
+            'interval': interval,
+            'last_tick': now,
+            'last_tick_at': datetime.now(),
+            'lag': lag,
+        }
+
+def register_metrics_source(name, source):
+    """Регистрирует функцию, значение которой попадает в снимок health-check"""
+    _metrics_sources[name] = source
+
+def collect_metrics():
+    """Опрашивает источники метрик (вызывается из event loop, где они живут)"""
+    metrics = {}
+    for name, source in list(_metrics_sources.items()):
+        try:
+            metrics[name] = source()
+        except Exception as e:
+            metrics[name] = {'error': str(e)}
+    return metrics
+
+def update_health_snapshot(**values):
+    """Обновляет снимок проверок"""
+    with _lock:
+        _snapshot.update(values)
+
+def get_loops_state(stale_factor):
+    """Состояние фоновых циклов; цикл считается зависшим, если пропустил stale_factor проходов"""
+    now = time.monotonic()
+    with _lock:
+        loops = {name: dict(loop) for name, loop in _loops.items()}
+    for loop in loops.values():
+        silent_for = now - loop.pop('last_tick')
+        loop['last_tick_at'] = loop['last_tick_at'].isoformat()
+        loop['seconds_since_tick'] = round(silent_for, 1)
+        loop['lag'] = round(loop['lag'], 3)
+        loop['stale'] = silent_for > loop['interval'] * stale_factor
+    return loops
+
+def get_health_snapshot():
+    """Возвращает копию снимка проверок"""
+    with _lock:
+        return dict(_snapshot)
@@ -0,0 +1,172 @@
+from datetime import datetime
+from sqlalchemy import select, bindparam, or_, and_
+from .database import db_session
+from .models import Training, Registration
+
+# Снимки тренировок и записей для формирования сообщений бота.
+# Загружаются одним запросом по колонкам, без ORM-объектов: при форматировании текста
+# не бывает ленивых загрузок, а значения перечислений (майка, пятерка, амплуа) уже строки
+# 'light'/'dark', 'first'/'second', 'forward'/'defender'. Снимки только для чтения -
+# изменения записываются в БД отдельными запросами.
+
+class TrainingSnapshot:
+    __slots__ = ('id', 'date_time', 'max_participants')
+
+    def __init__(self, id, date_time, max_participants):
+        self.id = id
+        self.date_time = date_time
+        self.max_participants = max_participants
+
+class RegistrationSnapshot:
+    __slots__ = (
+        'id', 'training', 'user_id', 'username', 'display_name', 'registered_at',
+        'jersey', 'team', 'position', 'goalkeeper', 'paid', 'team_assigned', 'last_payment_reminder'
+    )
+
+    def __init__(self, row, training):
+        self.id = row.registration_id
+        self.training = training
+        self.user_id = row.user_id
+        self.username = row.username
+        self.display_name = row.display_name
+        self.registered_at = row.registered_at
+        self.jersey = row.jersey_type.value if row.jersey_type else None
+        self.team = row.team_type.value if row.team_type else None
+        self.position = row.position_type.value if row.position_type else None
+        self.goalkeeper = row.goalkeeper
+        self.paid = row.paid
+        self.team_assigned = row.team_assigned
+        self.last_payment_reminder = row.last_payment_reminder
+
+    @property
+    def training_id(self):
+        return self.training.id
+
+    @property
+    def name(self):
+        """Отображаемое имя игрока или None"""
+        return self.display_name or self.username
+
+class RosterSnapshot:
+    """Тренировка и ее участники в порядке записи"""
+    __slots__ = ('training', 'registrations')
+
+    def __init__(self, training):
+        self.training = training
+        self.registrations = []
+
+    @property
+    def free_places(self):
+        return self.training.max_participants - len(self.registrations)
+
+_COLUMNS = (
+    Training.id.label('training_id'),
+    Training.date_time,
+    Training.max_participants,
+    Registration.id.label('registration_id'),
+    Registration.user_id,
+    Registration.username,
+    Registration.display_name,
+    Registration.registered_at,
+    Registration.jersey_type,
+    Registration.team_type,
+    Registration.position_type,
+    Registration.goalkeeper,
+    Registration.paid,
+    Registration.team_assigned,
+    Registration.last_payment_reminder,
+)
+
+# Составы: тренировки вместе с участниками (outer join - тренировки без участников тоже нужны)
+_ROSTERS = select(*_COLUMNS)\
+    .select_from(Training)\
+    .outerjoin(Registration, Registration.training_id == Training.id)\
+    .order_by(Training.date_time, Training.id, Registration.id)
+
+_UPCOMING_ROSTERS = _ROSTERS.where(Training.date_time > bindparam('now'))
+
+_ROSTER = _ROSTERS.where(Training.id == bindparam('training_id'))
+
+_NEXT_ROSTER = _ROSTERS.where(Training.id == select(Training.id)
+    .where(Training.date_time > bindparam('now'))
+    .order_by(Training.date_time)
+    .limit(1)
+    .scalar_subquery())
+
+# Записи с тренировками
+_REGISTRATIONS = select(*_COLUMNS)\
+    .select_from(Registration)\
+    .join(Training, Registration.training_id == Training.id)\
+    .order_by(Training.date_time, Registration.id)
+
+# Записи пользователя: предстоящие и прошедшие неоплаченные (вратари не платят)
+_USER_REGISTRATIONS = _REGISTRATIONS.where(
+    Registration.user_id == bindparam('user_id'),
+    or_(
+        Training.date_time > bindparam('now'),
+        and_(Registration.paid == False, Registration.goalkeeper == False)
+    )
+)
+
+# Неоплаченные записи на тренировки, прошедшие до reminder_time, у игроков, которым можно написать
+# (у добавленных вручную временный отрицательный user_id)
+_DUE_UNPAID_REGISTRATIONS = _REGISTRATIONS.where(
+    Training.date_time <= bindparam('reminder_time'),
+    Registration.paid == False,
+    Registration.goalkeeper == False,
+    Registration.user_id > 0
+)
+
+_DUE_UNPAID_REGISTRATIONS_SHARD = _DUE_UNPAID_REGISTRATIONS\
+    .where(Registration.user_id % bindparam('shard_count') == bindparam('shard'))
+
+def _load_rosters(statement, params):
+    rosters = {}
+    for row in db_session.execute(statement, params):
+        roster = rosters.get(row.training_id)
+        if roster is None:
+            roster = rosters[row.training_id] = RosterSnapshot(
+                TrainingSnapshot(row.training_id, row.date_time, row.max_participants)
+            )
+        if row.registration_id is not None:
+            roster.registrations.append(RegistrationSnapshot(row, roster.training))
+    return list(rosters.values())
+
+def _load_registrations(statement, params):
+    trainings = {}
+    registrations = []
+    for row in db_session.execute(statement, params):
+        training = trainings.get(row.training_id)
+        if training is None:
+            training = trainings[row.training_id] = TrainingSnapshot(row.training_id, row.date_time, row.max_participants)
+        registrations.append(RegistrationSnapshot(row, training))
+    return registrations
+
+def load_upcoming_rosters():
+    """Составы всех предстоящих тренировок по дате"""
+    return _load_rosters(_UPCOMING_ROSTERS, {'now': datetime.now()})
+
+def load_roster(training_id):
+    """Состав тренировки или None"""
+    rosters = _load_rosters(_ROSTER, {'training_id': training_id})
+    return rosters[0] if rosters else None
+
+def load_next_roster():
+    """Состав ближайшей предстоящей тренировки или None"""
+    rosters = _load_rosters(_NEXT_ROSTER, {'now': datetime.now()})
+    return rosters[0] if rosters else None
+
+def load_user_registrations(user_id):
+    """Записи пользователя: (предстоящие, прошедшие неоплаченные), каждый список по дате"""
+    now = datetime.now()
+    upcoming, past_unpaid = [], []
+    for registration in _load_registrations(_USER_REGISTRATIONS, {'user_id': user_id, 'now': now}):
+        (upcoming if registration.training.date_time > now else past_unpaid).append(registration)
+    return upcoming, past_unpaid
+
+def load_due_unpaid_registrations(reminder_time, shard=0, shard_count=1):
+    """Записи для напоминаний об оплате; при shard_count > 1 - только часть пользователей"""
+    if shard_count > 1:
+        params = {'reminder_time': reminder_time, 'shard': shard, 'shard_count': shard_count}
+        return _load_registrations(_DUE_UNPAID_REGISTRATIONS_SHARD, params)
+    return _load_registrations(_DUE_UNPAID_REGISTRATIONS, {'reminder_time': reminder_time})
@@ -0,0 +1,88 @@
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from hypercorn.app_wrappers import WSGIWrapper
+
+logger = logging.getLogger(__name__)
+
+class ThreadPoolWSGIApp:
+    """
+    ASGI-приложение поверх синхронного Flask.
+    Hypercorn по умолчанию выполняет WSGI-запросы в общем пуле потоков event loop,
+    которым пользуется и бот (например, для DNS-запросов), поэтому долгие запросы админки
+    (рассылки через requests.post, тяжелые выборки) могли тормозить бота.
+    Здесь каждый запрос выполняется в отдельном ограниченном пуле потоков веб-сервера:
+    лишние запросы ждут своей очереди, не занимая event loop и потоки бота.
+    
+    Отправка ответа после отключения клиента в Hypercorn не выбрасывает исключение, поэтому
+    потоковый ответ (события составов) сам об отключении не узнает. Адаптер ждет http.disconnect
+    и на следующем фрагменте прекращает итерацию ответа и закрывает его - генератор выполняет
+    свой finally и освобождает поток пула.
+    """
+
+    def __init__(self, wsgi_app, max_workers, max_body_size=16 * 1024 * 1024):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='web')
+        self.wsgi_app = wsgi_app
+        self.max_body_size = max_body_size
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._handle_lifespan(receive, send)
+            return
+        loop = asyncio.get_running_loop()
+        disconnected = threading.Event()
+        watcher = None
+
+        async def receive_request():
+            # После того как тело запроса прочитано, дальше receive вернет только http.disconnect
+            nonlocal watcher
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                disconnected.set()
+            elif not message.get('more_body') and watcher is None:
+                watcher = asyncio.create_task(self._watch_disconnect(receive, disconnected))
+            return message
+
+        def call_soon(func, *args):
+            # Отправка ответа из потока пула обратно в event loop
+            return asyncio.run_coroutine_threadsafe(func(*args), loop).result()
+
+        wrapper = WSGIWrapper(partial(self._run_until_disconnect, disconnected), self.max_body_size)
+        try:
+            await wrapper(scope, receive_request, send, partial(loop.run_in_executor, self.executor), call_soon)
+        finally:
+            if watcher is not None:
+                watcher.cancel()
+
+    @staticmethod
+    async def _watch_disconnect(receive, disconnected):
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                disconnected.set()
+                return
+
+    def _run_until_disconnect(self, disconnected, environ, start_response):
+        """WSGI-приложение, ответ которого перестает читаться, когда клиент отключился"""
+        response = self.wsgi_app(environ, start_response)
+        try:
+            for chunk in response:
+                if disconnected.is_set():
+                    logger.info(f"🔌 Клиент отключился, ответ на {environ.get('PATH_INFO')} прерван")
+                    return
+                yield chunk
+        finally:
+            if hasattr(response, 'close'):
+                response.close()
+
+    async def _handle_lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
@@ -1,12 +1,24 @@
-from flask import Blueprint, render_template, request, jsonify, redirect, url_for, session
+from flask import Blueprint, render_template, request, jsonify, redirect, url_for, session, make_response, Response
 from datetime import datetime, timedelta
 from functools import wraps
 import requests
 import logging
-from ..models import Training, Registration, JerseyType, TeamType, PositionType, UserPreferences, Player, TeamAssignment, ScheduledMessage, RepeatType
-from ..database import db_session
+import json
+import queue
+import threading
+import time
+from ..models import Training, Registration, JerseyType, TeamType, PositionType, UserPreferences, Player, PlayerStats, ScheduledMessage, RepeatType
+from ..database import db_session, user_context, reads_from_replica
+from sqlalchemy import func, case, and_, update
 from ..config import Config
-from ..bot.weekly_posts import send_weekly_training_post
+from .. import runtime
+from ..bot.weekly_posts import send_weekly_training_post_threadsafe
+from .. import roster
+from .. import player_stats
+from ..roster import roster_changed, get_roster_etag, participant_to_dict
+from ..bot.commands import enqueue_command, SEND_WEEKLY_POST
+from ..bot import notifications
+from ..bot.notifications import build_notification_plan, execute_notification_plan, apply_notification_results
 
 logger = logging.getLogger(__name__)
 
@@ -17,7 +29,43 @@ def login_required(f):
     def decorated_function(*args, **kwargs):
         if not session.get('logged_in'):
             return redirect(url_for('web.login'))
-        return f(*args, **kwargs)
+        with user_context('admin'):
+            return f(*args, **kwargs)
+    return decorated_function
+
+def read_only(f):
+    """
+    Страница только показывает данные: чтение может уйти на реплику (DATABASE_READ_URL),
+    если админ не менял ничего в последние DATABASE_READ_STICKY_SECONDS
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        with user_context('admin', read_only=True):
+            return f(*args, **kwargs)
+    return decorated_function
+
+def roster_conditional_get(f):
+    """
+    ETag / If-None-Match для JSON с составом тренировки.
+    Если состав не менялся с прошлого запроса, отвечает 304, не обращаясь к БД.
+    """
+    @wraps(f)
+    def decorated_function(training_id, *args, **kwargs):
+        # Версию берем до выполнения запроса: изменение во время запроса даст новый ETag при следующем.
+        # При чтении с реплики состав может отставать от версии в памяти - такой ответ не кэшируем
+        etag = None if reads_from_replica() else get_roster_etag(training_id)
+        if etag is None:
+            return f(training_id, *args, **kwargs)
+        if request.if_none_match.contains(etag):
+            response = make_response('', 304)
+        else:
+            response = make_response(f(training_id, *args, **kwargs))
+            if response.status_code != 200:
+                return response
+        response.set_etag(etag)
+        # Браузер хранит ответ, но каждый раз сверяет ETag с сервером
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
     return decorated_function
 
 @web.route('/login', methods=['GET', 'POST'])
@@ -36,25 +84,55 @@ def logout():
     session.pop('logged_in', None)
     return redirect(url_for('web.login'))
 
+def query_training_summaries():
+    """
+    Запрос сводки по тренировкам для страницы расписания: одна строка на тренировку
+    с количеством участников, вратарей и оплативших/не оплативших полевых игроков.
+    Считается в БД, без загрузки регистраций каждой тренировки.
+    """
+    field_player = Registration.goalkeeper == False
+    return db_session.query(
+            Training.id,
+            Training.date_time,
+            Training.max_participants,
+            func.count(Registration.id).label('registrations_count'),
+            func.coalesce(func.sum(case((Registration.goalkeeper == True, 1), else_=0)), 0).label('goalkeeper_count'),
+            func.coalesce(func.sum(case((and_(field_player, Registration.paid == True), 1), else_=0)), 0).label('paid_count'),
+            func.coalesce(func.sum(case((and_(field_player, Registration.paid == False), 1), else_=0)), 0).label('unpaid_count')
+        )\
+        .outerjoin(Registration, Registration.training_id == Training.id)\
+        .group_by(Training.id, Training.date_time, Training.max_participants)
+
 @web.route('/')
 @login_required
+@read_only
 def index():
+    now = datetime.now()
+    past_page = max(1, request.args.get('past_page', 1, type=int))
+    page_size = Config.PAST_TRAININGS_PAGE_SIZE
+    
     # Получаем будущие тренировки
-    upcoming_trainings = db_session.query(Training)\
-        .filter(Training.date_time > datetime.now())\
+    upcoming_trainings = query_training_summaries()\
+        .filter(Training.date_time > now)\
         .order_by(Training.date_time)\
         .all()
     
-    # Получаем прошедшие тренировки (за последние 30 дней)
-    past_trainings = db_session.query(Training)\
-        .filter(Training.date_time <= datetime.now())\
-        .filter(Training.date_time >= datetime.now() - timedelta(days=7))\
+    # Получаем прошедшие тренировки постранично, начиная с последних;
+    # лишняя строка показывает, есть ли следующая страница
+    past_trainings = query_training_summaries()\
+        .filter(Training.date_time <= now)\
         .order_by(Training.date_time.desc())\
+        .limit(page_size + 1)\
+        .offset((past_page - 1) * page_size)\
         .all()
+    has_next_past_page = len(past_trainings) > page_size
     
     return render_template('schedule.html', 
                          upcoming_trainings=upcoming_trainings, 
-                         past_trainings=past_trainings)
+                         past_trainings=past_trainings[:page_size],
+                         past_page=past_page,
+                         has_next_past_page=has_next_past_page,
+                         active_tab='past' if 'past_page' in request.args else 'upcoming')
 
 @web.route('/training', methods=['POST'])
 @login_required
@@ -82,42 +160,23 @@ def add_training():
 def delete_training(training_id):
     training = db_session.query(Training).get(training_id)
     if training:
+        # Записи удаляются вместе с тренировкой; это не отмены игроков
+        player_stats.registrations_removed(training.registrations, training.date_time, cancelled=False)
         db_session.delete(training)
         db_session.commit()
+        roster_changed(training_id, update_post=False)
     return jsonify({'success': True})
 
 @web.route('/training/<int:training_id>/participants')
 @login_required
+@read_only
+@roster_conditional_get
 def get_participants(training_id):
     training = db_session.query(Training).get(training_id)
     if not training:
         return jsonify({'error': 'Training not found'}), 404
     
-    participants = []
-    for reg in training.registrations:
-        # Используем display_name если есть, иначе username
-        display_name = reg.display_name or reg.username or 'Без имени'
-        
-        # Получаем статус team_assigned из таблицы TeamAssignment
-        team_assignment = db_session.query(TeamAssignment)\
-            .filter_by(training_id=training_id, user_id=reg.user_id)\
-            .first()
-        team_assigned = team_assignment.team_assigned if team_assignment else False
-        
-        participants.append({
-            'id': reg.id,
-            'user_id': reg.user_id,
-            'username': reg.username or 'Без имени',
-            'display_name': reg.display_name,
-            'name': display_name,
-            'registered_at': reg.registered_at.strftime('%d.%m.%Y %H:%M'),
-            'jersey_type': reg.jersey_type.value if reg.jersey_type else None,
-            'team_type': reg.team_type.value if reg.team_type else None,
-            'position_type': reg.position_type.value if reg.position_type else None,
-            'goalkeeper': reg.goalkeeper,
-            'team_assigned': team_assigned,
-            'paid': reg.paid
-        })
+    participants = [participant_to_dict(reg) for reg in training.registrations]
     
     return jsonify({
         'training_date': training.date_time.strftime('%d.%m.%Y %H:%M'),
@@ -126,78 +185,147 @@ def get_participants(training_id):
         'max': training.max_participants
     })
 
+# Одновременно открытых потоков событий: каждый занимает поток веб-сервера, пока открыт
+_roster_event_streams = threading.BoundedSemaphore(Config.ROSTER_EVENTS_MAX_STREAMS)
+
+@web.route('/roster/events')
+@login_required
+def roster_events():
+    """
+    Поток Server-Sent Events с изменениями составов тренировок (запись, отмена, оплата).
+    ?training_id=<id> - только события одной тренировки.
+    Поток закрывается через ROSTER_EVENTS_STREAM_SECONDS, браузер сам переподключается.
+    """
+    training_id = request.args.get('training_id', type=int)
+    if not _roster_event_streams.acquire(blocking=False):
+        return jsonify({'error': 'Too many event streams'}), 503
+    events = roster.subscribe()
+    
+    def stream():
+        try:
+            # Пауза перед переподключением браузера, мс
+            yield "retry: 3000\n\n"
+            deadline = time.monotonic() + Config.ROSTER_EVENTS_STREAM_SECONDS
+            while time.monotonic() < deadline:
+                try:
+                    event = events.get(timeout=Config.ROSTER_EVENTS_KEEPALIVE_SECONDS)
+                except queue.Empty:
+                    # Комментарий не дает прокси закрыть соединение; на нем же ThreadPoolWSGIApp
+                    # прерывает поток, если клиент отключился (сама отправка ошибку не выбрасывает)
+                    yield ": keepalive\n\n"
+                    continue
+                if training_id is not None and event.get('training_id') not in (None, training_id):
+                    continue
+                yield f"event: {event['type']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+        finally:
+            roster.unsubscribe(events)
+            _roster_event_streams.release()
+    
+    response = Response(stream(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+# Поля распределения, которые админка сохраняет через save-jerseys: ключ в запросе -> (колонка, тип)
+SELECTION_FIELDS = {
+    'jersey': ('jersey_type', JerseyType),
+    'team': ('team_type', TeamType),
+    'position': ('position_type', PositionType),
+}
+
+def parse_selection_change(change):
+    """
+    Превращает изменение из запроса {'registration_id': ..., 'jersey'?: ..., 'team'?: ..., 'position'?: ...}
+    в словарь для пакетного UPDATE по первичному ключу. Отсутствующие поля не меняются.
+    """
+    registration_id = change.get('registration_id')
+    if not isinstance(registration_id, int) or isinstance(registration_id, bool):
+        raise ValueError(f"некорректный registration_id: {registration_id!r}")
+    values = {'id': registration_id}
+    for key, (column, enum_type) in SELECTION_FIELDS.items():
+        if key in change:
+            values[column] = enum_type(change[key])
+    return values
+
+def legacy_selections_to_changes(training, participant_selections):
+    """
+    Старый формат запроса: {отображаемое имя: {'jersey': ..., 'team': ..., 'position': ...}}.
+    Имена сопоставляются с регистрациями; одинаковые имена пропускаются - нельзя понять, чье это изменение.
+    """
+    registrations_by_name = {}
+    for registration in training.registrations:
+        name = registration.display_name or registration.username
+        registrations_by_name.setdefault(name, []).append(registration.id)
+
+    changes = []
+    for name, selection in participant_selections.items():
+        registration_ids = registrations_by_name.get(name, [])
+        if len(registration_ids) != 1:
+            logger.warning(f"⚠️ Не удалось однозначно найти участника {name} ({len(registration_ids)} совпадений) - изменения пропущены")
+            continue
+        changes.append({'registration_id': registration_ids[0], **selection})
+    return changes
+
 @web.route('/training/<int:training_id>/save-jerseys', methods=['POST'])
 @login_required
 def save_jerseys(training_id):
+    """
+    Сохраняет майки, пятерки и амплуа участников.
+    Принимает только изменения: {'changes': [{'registration_id': ..., 'jersey'?: ..., 'team'?: ..., 'position'?: ...}]}
+    и записывает их одним пакетным UPDATE в одной транзакции. Возвращает новую версию состава.
+    """
     try:
         training = db_session.query(Training).get(training_id)
         if not training:
             return jsonify({'success': False, 'error': 'Training not found'}), 404
         
-        data = request.get_json()
-        participant_selections = data.get('participant_selections', {})
-        
-        if not participant_selections:
-            return jsonify({'success': False, 'error': 'No participant selections provided'}), 400
-        
-        # Сохраняем выбранные майки и команды в базу данных
-        for registration in training.registrations:
-            # Получаем отображаемое имя для поиска
-            display_name = registration.display_name or registration.username
-            if display_name in participant_selections:
-                selection = participant_selections[display_name]
-                
-                # Сохраняем майку
-                if 'jersey' in selection and selection['jersey'] in ['light', 'dark']:
-                    registration.jersey_type = JerseyType(selection['jersey'])
-                
-                # Сохраняем команду
-                if 'team' in selection and selection['team'] in ['first', 'second']:
-                    registration.team_type = TeamType(selection['team'])
-                
-                # Сохраняем амплуа
-                if 'position' in selection and selection['position'] in ['forward', 'defender']:
-                    registration.position_type = PositionType(selection['position'])
-                
-                # Устанавливаем флаг назначения команды в таблице TeamAssignment
-                # Для вратарей: достаточно выбрать майку
-                # Для полевых игроков: нужно выбрать и майку, и команду, и амплуа
-                
-                # Получаем или создаем запись в team_assignments
-                team_assignment = db_session.query(TeamAssignment)\
-                    .filter_by(training_id=training_id, user_id=registration.user_id)\
-                    .first()
-                
-                if not team_assignment:
-                    team_assignment = TeamAssignment(
-                        training_id=training_id,
-                        user_id=registration.user_id,
-                        team_assigned=False,
-                        assigned_at=None
-                    )
-                    db_session.add(team_assignment)
-                
-                if registration.goalkeeper:
-                    if 'jersey' in selection and selection['jersey'] in ['light', 'dark']:
-                        logger.info(f"✅ Параметры сохранены для вратаря {display_name}")
-                else:
-                    has_jersey = 'jersey' in selection and selection['jersey'] in ['light', 'dark']
-                    has_team = 'team' in selection and selection['team'] in ['first', 'second']
-                    has_position = 'position' in selection and selection['position'] in ['forward', 'defender']
-                    
-                    logger.info(f"🔍 Проверка для полевого игрока {display_name}: jersey={has_jersey}, team={has_team}, position={has_position}")
-                    
-                    if has_jersey and has_team and has_position:
-                        logger.info(f"✅ Параметры сохранены для полевого игрока {display_name}")
-                    else:
-                        logger.warning(f"⚠️ НЕ все параметры выбраны для {display_name}")
-        
-        # Предпочтения пользователей будут обновлены в функции send_notifications
-        # после успешной отправки уведомления
+        data = request.get_json(silent=True) or {}
+        if 'changes' in data:
+            changes = data['changes']
+        elif data.get('participant_selections'):
+            changes = legacy_selections_to_changes(training, data['participant_selections'])
+        else:
+            return jsonify({'success': False, 'error': 'No changes provided'}), 400
         
-        db_session.commit()
+        if not isinstance(changes, list):
+            return jsonify({'success': False, 'error': 'changes must be a list'}), 400
+        try:
+            updates = [parse_selection_change(change) for change in changes]
+        except (AttributeError, ValueError) as e:
+            return jsonify({'success': False, 'error': f'Invalid change: {e}'}), 400
+        
+        # Одно изменение на участника: повторы в запросе объединяются, последнее значение побеждает
+        merged = {}
+        for values in updates:
+            merged.setdefault(values['id'], {}).update(values)
+        updates = [values for values in merged.values() if len(values) > 1]
+        
+        if updates:
+            # Все изменяемые регистрации должны принадлежать этой тренировке - проверяем одним запросом
+            registration_ids = [values['id'] for values in updates]
+            found_ids = {
+                registration_id for (registration_id,) in db_session.query(Registration.id)
+                .filter(Registration.training_id == training_id, Registration.id.in_(registration_ids))
+            }
+            missing_ids = sorted(set(registration_ids) - found_ids)
+            if missing_ids:
+                return jsonify({
+                    'success': False,
+                    'error': f'Участники не найдены в тренировке: {missing_ids}. Обновите страницу'
+                }), 409
+            
+            # Пакетный UPDATE по первичному ключу; флаг распределения выставит рассылка уведомлений
+            db_session.execute(update(Registration), updates)
+            db_session.commit()
+            roster_changed(training_id, update_post=False)
+            logger.info(f"✅ Сохранены параметры распределения {len(updates)} участников тренировки {training_id}")
         
-        return jsonify({'success': True, 'message': 'Майки и команды сохранены в базе данных'})
+        return jsonify({
+            'success': True,
+            'message': 'Майки и команды сохранены в базе данных',
+            'updated': len(updates),
+            'roster_version': roster.get_roster_version(training_id)
+        })
         
     except Exception as e:
         logger.error(f"Error saving jerseys: {e}")
@@ -212,221 +340,27 @@ def send_notifications(training_id):
         if not training:
             return jsonify({'success': False, 'error': 'Training not found'}), 404
         
-        data = request.get_json()
-        changed_participants = data.get('changed_participants', [])
+        # Кому отправлять, сервер определяет сам: игрокам без распределения и тем, у кого майка,
+        # пятерка или амплуа отличаются от последних отправленных. Список от клиента - только для журнала
+        data = request.get_json(silent=True) or {}
+        logger.info(f"📋 Проверка уведомлений для тренировки {training_id}, изменения на странице: {data.get('changed_participants', [])}")
         
-        training_date = training.date_time.strftime('%d.%m.%Y в %H:%M')
-        success_count = 0
-        failed_count = 0
+        plan = build_notification_plan(training)
+        for item in plan:
+            logger.info(f"👤 Уведомление для {item.display_name}: изменились {', '.join(item.changes) or 'нет'}, team_assigned={item.registration.team_assigned}")
         
-        # Отправляем уведомления участникам:
-        # 1. У которых team_assigned=False (еще не получили уведомления)
-        # 2. У которых team_assigned=True, но изменились параметры
-        logger.info(f"📋 Проверка уведомлений для тренировки {training_id}")
-        logger.info(f"📋 Список изменившихся участников: {changed_participants}")
+        execute_notification_plan(plan)
+        apply_notification_results(plan)
+        roster_changed(training_id, update_post=False)
         
-        for registration in training.registrations:
-            display_name = registration.display_name or registration.username
-            
-            # Получаем статус распределения из таблицы team_assignments
-            team_assignment = db_session.query(TeamAssignment)\
-                .filter_by(training_id=training_id, user_id=registration.user_id)\
-                .first()
-            
-            # Если записи в TeamAssignment нет, считаем игрока нераспределенным
-            team_assigned = team_assignment.team_assigned if team_assignment else False
-            
-            # Дополнительная проверка: если записи нет, создаем её
-            if not team_assignment:
-                logger.warning(f"⚠️ У участника {display_name} нет записи в TeamAssignment, создаем её")
-                team_assignment = TeamAssignment(
-                    training_id=training_id,
-                    user_id=registration.user_id,
-                    team_assigned=False,
-                    assigned_at=None
-                )
-                db_session.add(team_assignment)
-                db_session.commit()
-                team_assigned = False
-            
-            # Проверяем, есть ли у игрока все необходимые параметры для распределения
-            has_all_params = bool(
-                registration.jersey_type and (
-                    registration.goalkeeper or 
-                    (registration.team_type and registration.position_type)
-                )
-            )
-            
-            # Получаем предпочтения пользователя из базы данных
-            user_prefs = db_session.query(UserPreferences).filter_by(user_id=registration.user_id).first()
-            
-            # Проверяем, изменились ли параметры по сравнению с user_preferences
-            params_changed = False
-            if user_prefs:
-                # Проверяем изменения для вратарей и полевых игроков
-                if registration.goalkeeper:
-                    # Для вратаря проверяем только майку
-                    if registration.jersey_type != user_prefs.preferred_jersey_type:
-                        params_changed = True
-                        logger.info(f"🔄 Изменилась майка для вратаря {display_name}: {user_prefs.preferred_jersey_type} → {registration.jersey_type}")
-                else:
-                    # Для полевого игрока проверяем майку, команду и амплуа
-                    if registration.jersey_type != user_prefs.preferred_jersey_type:
-                        params_changed = True
-                        logger.info(f"🔄 Изменилась майка для {display_name}: {user_prefs.preferred_jersey_type} → {registration.jersey_type}")
-                    if registration.team_type != user_prefs.preferred_team_type:
-                        params_changed = True
-                        logger.info(f"🔄 Изменилась команда для {display_name}: {user_prefs.preferred_team_type} → {registration.team_type}")
-                    if registration.position_type != user_prefs.preferred_position_type:
-                        params_changed = True
-                        logger.info(f"🔄 Изменилось амплуа для {display_name}: {user_prefs.preferred_position_type} → {registration.position_type}")
-            else:
-                # Если предпочтений нет, считаем что это новый игрок
-                params_changed = True
-                logger.info(f"🆕 Новый игрок {display_name}, предпочтения отсутствуют")
-            
-            # Отправляем уведомление если:
-            # 1. У участника НЕТ статуса "Команда назначена" (team_assigned = False) ИЛИ
-            # 2. Параметры изменились по сравнению с user_preferences
-            should_notify = (
-                (not team_assigned and has_all_params) or 
-                (params_changed and has_all_params)
-            )
-            
-            logger.info(f"👤 Участник {display_name}: team_assigned={team_assigned}, has_all_params={has_all_params}, should_notify={should_notify}")
-            logger.info(f"   📋 Параметры: jersey={registration.jersey_type}, team={registration.team_type}, position={registration.position_type}, goalkeeper={registration.goalkeeper}")
-            
-            # Для вратарей проверяем только майку, для полевых игроков - майку, команду и амплуа
-            if should_notify and registration.jersey_type and (
-                registration.goalkeeper or (registration.team_type and registration.position_type)):
-                
-                # Проверяем, есть ли у игрока user_id (может ли он получить уведомление через Telegram)
-                if not registration.user_id:
-                    logger.info(f"⚠️ Игрок {display_name} добавлен вручную (без user_id), уведомление не отправляется")
-                    # Обновляем статус team_assigned для игроков без user_id
-                    if not team_assigned:
-                        team_assignment.team_assigned = True
-                        team_assignment.assigned_at = datetime.now()
-                        logger.info(f"✅ Обновлен статус team_assigned=True для игрока без user_id {display_name}")
-                    continue
-                
-                # Формируем индивидуальное сообщение для участника
-                jersey_emoji = "⚪" if registration.jersey_type.value == 'light' else "⚫"
-                team_emoji = "1️⃣" if registration.team_type and registration.team_type.value == 'first' else "2️⃣"
-                
-                message = f"🏒 *Уведомление о тренировке*\n\n"
-                message += f"📅 Дата: {training_date}\n"
-                message += f"🎯 Ваша майка: {jersey_emoji}\n"
-                
-                # Добавляем команду и амплуа для полевых игроков
-                if not registration.goalkeeper and registration.team_type:
-                    message += f"👥 Ваша пятерка: {team_emoji}\n"
-                    if registration.position_type:
-                        position_text = "Нап" if registration.position_type.value == 'forward' else "Зщ"
-                        message += f"🏒 Ваше амплуа: {position_text}\n"
-                
-                message += f"👥 Всего участников: {len(training.registrations)}/{training.max_participants}"
-                
-                try:
-                    # Создаем клавиатуру с кнопками
-                    keyboard = {
-                        'inline_keyboard': [
-                            [{'text': 'Показать расписание', 'callback_data': 'schedule'}],
-                            [{'text': 'Мои записи', 'callback_data': 'my_registrations'}]
-                        ]
-                    }
-                    
-                    # Отправляем сообщение через Telegram Bot API с кнопками
-                    telegram_response = requests.post(
-                        f'https://api.telegram.org/bot{Config.TELEGRAM_TOKEN}/sendMessage',
-                        json={
-                            'chat_id': registration.user_id,
-                            'text': message,
-                            'parse_mode': 'Markdown',
-                            'reply_markup': keyboard
-                        },
-                        timeout=10
-                    )
-                    
-                    if telegram_response.status_code == 200:
-                        success_count += 1
-                        logger.info(f"✅ Уведомление отправлено участнику {display_name} ({registration.jersey_type.value})")
-                        
-                        # Обновляем статус team_assigned после успешной отправки уведомления
-                        if not team_assigned:
-                            team_assignment.team_assigned = True
-                            team_assignment.assigned_at = datetime.now()
-                            logger.info(f"✅ Обновлен статус team_assigned=True для {display_name}")
-                        
-                        # Обновляем user_preferences с новыми параметрами
-                        if not user_prefs:
-                            user_prefs = UserPreferences(user_id=registration.user_id)
-                            db_session.add(user_prefs)
-                            logger.info(f"🆕 Создаем новые предпочтения для {display_name}")
-                        
-                        user_prefs.preferred_jersey_type = registration.jersey_type
-                        if not registration.goalkeeper:
-                            user_prefs.preferred_team_type = registration.team_type
-                            user_prefs.preferred_position_type = registration.position_type
-                        logger.info(f"💾 Обновлены предпочтения для {display_name}")
-                    else:
-                        # Проверяем, является ли ошибка "chat not found" (игрок без Telegram аккаунта)
-                        response_text = telegram_response.text
-                        if "chat not found" in response_text.lower():
-                            logger.info(f"ℹ️ Игрок {display_name} не имеет Telegram аккаунта, уведомление не отправлено")
-                            # Обновляем статус team_assigned для игроков без Telegram аккаунта
-                            if not team_assigned:
-                                team_assignment.team_assigned = True
-                                team_assignment.assigned_at = datetime.now()
-                                logger.info(f"✅ Обновлен статус team_assigned=True для игрока без Telegram аккаунта {display_name}")
-                            
-                            # Обновляем user_preferences даже для игроков без Telegram аккаунта
-                            if not user_prefs:
-                                user_prefs = UserPreferences(user_id=registration.user_id)
-                                db_session.add(user_prefs)
-                            
-                            user_prefs.preferred_jersey_type = registration.jersey_type
-                            if not registration.goalkeeper:
-                                user_prefs.preferred_team_type = registration.team_type
-                                user_prefs.preferred_position_type = registration.position_type
-                            logger.info(f"💾 Обновлены предпочтения для игрока без Telegram аккаунта {display_name}")
-                        else:
-                            failed_count += 1
-                            logger.error(f"❌ Ошибка отправки участнику {display_name}: {response_text}")
-                        
-                except Exception as e:
-                    # Проверяем, является ли ошибка связанной с отсутствием Telegram аккаунта
-                    error_str = str(e).lower()
-                    if "chat not found" in error_str or "user not found" in error_str:
-                        logger.info(f"ℹ️ Игрок {display_name} не имеет Telegram аккаунта, уведомление не отправлено")
-                        # Обновляем статус team_assigned для игроков без Telegram аккаунта
-                        if not team_assigned:
-                            team_assignment.team_assigned = True
-                            team_assignment.assigned_at = datetime.now()
-                            logger.info(f"✅ Обновлен статус team_assigned=True для игрока без Telegram аккаунта {display_name}")
-                        
-                        # Обновляем user_preferences даже для игроков без Telegram аккаунта
-                        if not user_prefs:
-                            user_prefs = UserPreferences(user_id=registration.user_id)
-                            db_session.add(user_prefs)
-                        
-                        user_prefs.preferred_jersey_type = registration.jersey_type
-                        if not registration.goalkeeper:
-                            user_prefs.preferred_team_type = registration.team_type
-                            user_prefs.preferred_position_type = registration.position_type
-                        logger.info(f"💾 Обновлены предпочтения для игрока без Telegram аккаунта {display_name}")
-                    else:
-                        failed_count += 1
-                        logger.error(f"❌ Ошибка отправки участнику {display_name}: {e}")
+        success_count = sum(1 for item in plan if item.result == notifications.SENT)
+        failed_count = sum(1 for item in plan if item.result == notifications.FAILED)
         
         # Логируем общий результат
         logger.info(f"📊 Итоги отправки уведомлений для тренировки {training_id}")
         logger.info(f"✅ Успешно отправлено: {success_count}")
         logger.info(f"❌ Ошибок отправки: {failed_count}")
         
-        # Сохраняем изменения в базе данных
-        db_session.commit()
-        
         if success_count > 0:
             return jsonify({
                 'success': True, 
@@ -445,10 +379,23 @@ def send_notifications(training_id):
         
     except Exception as e:
         logger.error(f"Error sending notifications: {e}")
+        db_session.rollback()
         return jsonify({'success': False, 'error': str(e)}), 500
 
+def player_stats_to_dict(stats):
+    """Статистика игрока в формате JSON для админки; для игрока без записей - нули"""
+    delay = stats.average_payment_delay if stats else None
+    return {
+        'registrations': stats.registrations_count if stats else 0,
+        'cancellations': stats.cancellations_count if stats else 0,
+        'no_shows': stats.no_shows_count if stats else 0,
+        'unpaid': stats.unpaid_count if stats else 0,
+        'average_payment_delay_hours': round(delay.total_seconds() / 3600, 1) if delay is not None else None
+    }
+
 @web.route('/training/<int:training_id>/quick-add-players')
 @login_required
+@read_only
 def get_quick_add_players(training_id):
     try:
         training = db_session.query(Training).get(training_id)
@@ -459,46 +406,43 @@ def get_quick_add_players(training_id):
         current_participant_ids = [reg.user_id for reg in training.registrations]
         logger.info(f"Current participants on training {training_id}: {current_participant_ids}")
         
-        # Получаем всех игроков из таблицы players
-        all_players = db_session.query(Player).all()
-        logger.info(f"Total players in database: {len(all_players)}")
+        # Игроки, которые не записаны на текущую тренировку, вместе со статистикой и предпочтениями - одним запросом.
+        # Сверху постоянные игроки (больше всего записей), при равенстве - недавно записывавшиеся
+        rows = db_session.query(Player, PlayerStats, UserPreferences)\
+            .outerjoin(PlayerStats, PlayerStats.user_id == Player.user_id)\
+            .outerjoin(UserPreferences, UserPreferences.user_id == Player.user_id)\
+            .filter(Player.user_id.notin_(current_participant_ids))\
+            .order_by(func.coalesce(PlayerStats.registrations_count, 0).desc(), Player.last_registration.desc())\
+            .all()
         
-        # Фильтруем игроков, которые не записаны на текущую тренировку
         available_players = []
-        for player in all_players:
-            if player.user_id not in current_participant_ids:
-                # Проверяем предпочтения пользователя
-                user_prefs = db_session.query(UserPreferences).filter_by(user_id=player.user_id).first()
-                
-                player_data = {
-                    'user_id': player.user_id,
-                    'username': player.username,
-                    'display_name': player.display_name,
-                    'goalkeeper': player.goalkeeper,
-                    'last_registration': player.last_registration.strftime('%d.%m.%Y %H:%M'),
-                    'total_registrations': player.total_registrations
-                }
-                
-                # Обновляем данные из предпочтений, если есть
-                if user_prefs:
-                    if user_prefs.display_name:
-                        player_data['display_name'] = user_prefs.display_name
-                    player_data['goalkeeper'] = user_prefs.goalkeeper
-                
-                available_players.append(player_data)
+        for player, stats, user_prefs in rows:
+            player_data = {
+                'user_id': player.user_id,
+                'username': player.username,
+                'display_name': player.display_name,
+                'goalkeeper': player.goalkeeper,
+                'last_registration': player.last_registration.strftime('%d.%m.%Y %H:%M'),
+                'total_registrations': stats.registrations_count if stats else 0,
+                'stats': player_stats_to_dict(stats)
+            }
+            
+            # Обновляем данные из предпочтений, если есть
+            if user_prefs:
+                if user_prefs.display_name:
+                    player_data['display_name'] = user_prefs.display_name
+                player_data['goalkeeper'] = user_prefs.goalkeeper
+            
+            available_players.append(player_data)
         
         logger.info(f"Available players for quick add: {len(available_players)}")
         
-        # Сортируем по последней дате регистрации (новые сверху)
-        available_players.sort(key=lambda x: datetime.strptime(x['last_registration'], '%d.%m.%Y %H:%M'), reverse=True)
-        
         return jsonify({
             'success': True,
             'players': available_players,
             'total': len(available_players),
             'debug': {
                 'current_participants': current_participant_ids,
-                'total_players': len(all_players),
                 'available_players': len(available_players)
             }
         })
@@ -541,7 +485,7 @@ def bulk_register_players(training_id):
             }), 400
         
         # Добавляем игроков
-        added_count = 0
+        added_registrations = []
         for player in players:
             # Проверяем, не записан ли уже этот игрок
             existing_reg = db_session.query(Registration)\
@@ -569,6 +513,7 @@ def bulk_register_players(training_id):
                     registration.position_type = user_prefs.preferred_position_type
                 
                 db_session.add(registration)
+                added_registrations.append(registration)
                 
                 # Обновляем или создаем запись в таблице players
                 existing_player = db_session.query(Player).filter_by(user_id=player['user_id']).first()
@@ -591,10 +536,11 @@ def bulk_register_players(training_id):
                         total_registrations=1
                     )
                     db_session.add(new_player)
-                
-                added_count += 1
         
+        player_stats.registrations_added(added_registrations, training.date_time)
         db_session.commit()
+        added_count = len(added_registrations)
+        roster_changed(training_id)
         
         return jsonify({
             'success': True,
@@ -741,18 +687,11 @@ def remove_participant(training_id, participant_id):
         
         participant_name = registration.display_name or registration.username or 'Без имени'
         
-        # Удаляем запись из team_assignments
-        team_assignment = db_session.query(TeamAssignment)\
-            .filter_by(training_id=training_id, user_id=registration.user_id)\
-            .first()
-        
-        if team_assignment:
-            db_session.delete(team_assignment)
-            logger.info(f"🗑️ Удалена запись TeamAssignment для участника {participant_name}")
-        
-        # Удаляем регистрацию
+        # Удаляем регистрацию; после начала тренировки это неявка, а не отмена
+        player_stats.registrations_removed([registration], training.date_time)
         db_session.delete(registration)
         db_session.commit()
+        roster_changed(training_id, roster.CANCELLED, registration_id=participant_id)
         
         return jsonify({
             'success': True,
@@ -795,9 +734,10 @@ def rename_participant(training_id, participant_id):
             if current_goalkeepers >= 2:
                 return jsonify({'success': False, 'error': 'Максимум 2 вратаря на тренировку'}), 400
         
-        # Обновляем отображаемое имя и статус вратаря в регистрации
+        # Обновляем отображаемое имя и статус вратаря в регистрации; вратари не платят, поэтому меняется и статистика долга
         registration.display_name = new_name
-        registration.goalkeeper = is_goalkeeper
+        if registration.goalkeeper != is_goalkeeper:
+            player_stats.registration_changed(registration, training.date_time, goalkeeper=is_goalkeeper)
         
         # Обновляем отображаемое имя и статус вратаря в предпочтениях пользователя для будущих записей
         user_prefs = db_session.query(UserPreferences).filter_by(user_id=registration.user_id).first()
@@ -808,6 +748,7 @@ def rename_participant(training_id, participant_id):
         user_prefs.goalkeeper = is_goalkeeper
         
         db_session.commit()
+        roster_changed(training_id)
         
         return jsonify({
             'success': True, 
@@ -836,9 +777,12 @@ def assign_team(training_id, participant_id):
             return jsonify({'success': False, 'error': 'Participant not found'}), 404
         
         # Устанавливаем флаг назначения команды
-        registration.team_assigned = True
+        if not registration.team_assigned:
+            registration.team_assigned = True
+            registration.team_assigned_at = datetime.now()
         
         db_session.commit()
+        roster_changed(training_id, update_post=False)
         
         participant_name = registration.display_name or registration.username or 'Без имени'
         
@@ -871,10 +815,14 @@ def mark_participant_paid(training_id, participant_id):
         if registration.goalkeeper:
             return jsonify({'success': False, 'error': 'Goalkeeper payment is not tracked'}), 400
         
-        # Устанавливаем флаг оплаты
-        registration.paid = True
+        # Устанавливаем флаг оплаты; повторная отметка ничего не меняет
+        if not registration.paid:
+            registration.paid = True
+            registration.paid_at = datetime.now()
+            player_stats.registration_paid(registration, training.date_time)
         
         db_session.commit()
+        roster_changed(training_id, roster.PAID, registration_id=participant_id, update_post=False)
         
         participant_name = registration.display_name or registration.username or 'Без имени'
         
@@ -890,60 +838,55 @@ def mark_participant_paid(training_id, participant_id):
 
 @web.route('/health')
 def health_check():
-    """Health check endpoint для Docker"""
-    try:
-        # Проверяем подключение к базе данных
-        from sqlalchemy import text
-        db_session.execute(text('SELECT 1'))
-        return jsonify({
-            'status': 'healthy',
-            'database': 'connected',
-            'timestamp': datetime.now().isoformat()
-        }), 200
-    except Exception as e:
-        return jsonify({
-            'status': 'unhealthy',
-            'database': 'disconnected',
-            'error': str(e),
-            'timestamp': datetime.now().isoformat()
-        }), 503
+    """
+    Health check endpoint для Docker.
+    Отдает снимок, который обновляют фоновые задачи, и не обращается к БД.
+    """
+    snapshot = runtime.get_health_snapshot()
+    loops = runtime.get_loops_state(Config.HEALTH_STALE_FACTOR)
+    stale_loops = [name for name, loop in loops.items() if loop['stale']]
+    database = snapshot.get('database', 'unknown')
+    # Без реплики (DATABASE_READ_URL не задан) поле отсутствует
+    database_replica = snapshot.get('database_replica')
+    
+    # Состояние бота не влияет на код ответа: пока бот переподключается, веб-админка работает
+    healthy = database != 'disconnected' and database_replica != 'disconnected' and not stale_loops
+    response = {
+        'status': 'healthy' if healthy else 'unhealthy',
+        'database': database,
+        'role': runtime.get_role(),
+        'bot': runtime.get_bot_state(),
+        'loops': loops,
+        'event_loop_lag': snapshot.get('event_loop_lag'),
+        'metrics': snapshot.get('metrics', {}),
+        'checked_at': snapshot.get('checked_at'),
+        'timestamp': datetime.now().isoformat()
+    }
+    if database_replica:
+        response['database_replica'] = database_replica
+    if snapshot.get('database_error'):
+        response['error'] = snapshot['database_error']
+    if snapshot.get('database_replica_error'):
+        response['replica_error'] = snapshot['database_replica_error']
+    if stale_loops:
+        response['stale_loops'] = stale_loops
+    return jsonify(response), 200 if healthy else 503
 
 @web.route('/send-weekly-post', methods=['POST'])
 @login_required
 def send_weekly_post():
     """Отправляет еженедельный пост о тренировке"""
     try:
-        # Получаем экземпляр бота из глобального контекста
-        # Это требует доступа к боту, который запущен в основном приложении
-        import asyncio
-        from ..bot.handlers import start_bot
-        
-        # Создаем временный бот для отправки поста
-        async def send_post():
-            try:
-                # Создаем приложение бота
-                from telegram.ext import Application
-                application = Application.builder().token(Config.TELEGRAM_TOKEN).build()
-                await application.initialize()
-                await application.start()
-                
-                # Отправляем пост
-                success = await send_weekly_training_post(application.bot)
-                
-                # Останавливаем приложение
-                await application.stop()
-                await application.shutdown()
-                
-                return success
-            except Exception as e:
-                logger.error(f"Ошибка при отправке поста: {e}")
-                return False
-        
-        # Запускаем асинхронную функцию
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        success = loop.run_until_complete(send_post())
-        loop.close()
+        # Если бот запущен в этом процессе, отправляем пост через него,
+        # иначе передаем команду процессу бота через очередь
+        success = send_weekly_training_post_threadsafe()
+        if success is None:
+            if not enqueue_command(SEND_WEEKLY_POST):
+                return jsonify({'success': False, 'error': 'Не удалось передать команду боту'}), 500
+            return jsonify({
+                'success': True,
+                'message': 'Бот запущен отдельно: пост поставлен в очередь на отправку'
+            })
         
         if success:
             return jsonify({
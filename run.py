@@ -1,20 +1,34 @@
+import argparse
 import asyncio
 import signal
-from app import create_app
-from app.bot.handlers import start_bot, check_payment_reminders
+import time
+from datetime import datetime, timedelta
+from app import create_app, init_db
+from app import runtime
+from app.web.asgi import ThreadPoolWSGIApp
+from app.bot.handlers import start_bot, start_sender_bot, check_payment_reminders, get_reminder_tick, next_reminder_tick
+from app.config import Config
+from app.database import engine, read_engine, db_session
 from app.bot.message_scheduler import start_message_scheduler
+from app.archive import run_archive
 from hypercorn.asyncio import serve
 from hypercorn.config import Config as HyperConfig
+from sqlalchemy import text
 
-async def shutdown(signal, loop, bot_app):
+# Роли процесса: веб-админка, бот (получение обновлений и очередь команд),
+# фоновые задачи (напоминания, запланированные сообщения) или все вместе
+ROLES = ('web', 'bot', 'scheduler', 'all')
+
+async def shutdown(signal, loop, bot_apps):
     """Корректное завершение приложения"""
     print(f"Received exit signal {signal.name}...")
     tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
     
-    # Останавливаем бота
-    if bot_app:
+    # Останавливаем ботов
+    for bot_app in bot_apps:
         await bot_app.stop()
         await bot_app.shutdown()
+    runtime.set_bot_state(runtime.BOT_STOPPED)
     
     # Отменяем все задачи
     [task.cancel() for task in tasks]
@@ -22,81 +36,193 @@ async def shutdown(signal, loop, bot_app):
     await asyncio.gather(*tasks, return_exceptions=True)
     loop.stop()
 
-async def main():
+async def supervise_bot(starter, name, on_started=None):
+    """
+    Запускает бота в фоне, не задерживая веб-сервер: при ошибке повторяет попытки
+    с растущей паузой (до BOT_START_MAX_RETRY_SECONDS), пока бот не запустится.
+    Состояние попыток видно в /health.
+    """
+    retry_delay = Config.BOT_START_RETRY_SECONDS
+    while True:
+        runtime.set_bot_state(runtime.BOT_STARTING)
+        try:
+            print(f"🔄 Попытка запуска {name} {runtime.get_bot_state()['attempts']}")
+            bot_app = await starter()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"❌ Ошибка при запуске {name}: {e}")
+            print(f"⏳ Повторная попытка через {retry_delay:.0f} секунд...")
+            runtime.set_bot_state(
+                runtime.BOT_RETRYING,
+                error=str(e),
+                next_attempt_at=datetime.now() + timedelta(seconds=retry_delay)
+            )
+            await asyncio.sleep(retry_delay)
+            retry_delay = min(retry_delay * 2, Config.BOT_START_MAX_RETRY_SECONDS)
+            continue
+        
+        runtime.set_bot_state(runtime.BOT_RUNNING)
+        if on_started:
+            await on_started(bot_app)
+        return bot_app
+
+async def payment_reminder_task(bot):
+    """
+    Фоновая задача для проверки напоминаний об оплате.
+    Окно проверки разбито на части по user_id: за каждый тик обрабатывается одна часть,
+    поэтому напоминания расходятся по всему окну равномерно, а не одной пачкой.
+    """
+    shard_count = max(1, Config.PAYMENT_REMINDER_SHARDS)
+    tick_seconds = Config.PAYMENT_REMINDER_INTERVAL_MINUTES * 60 / shard_count
+    tick = get_reminder_tick(tick_seconds)
+    while True:
+        try:
+            await check_payment_reminders(bot, shard=tick % shard_count, shard_count=shard_count)
+        except Exception as e:
+            print(f"❌ Ошибка в фоновой задаче напоминаний: {e}")
+            db_session.rollback()
+        finally:
+            # Иначе сессия задачи держит соединение открытой транзакцией до следующего тика
+            db_session.remove()
+        runtime.record_loop_tick('payment_reminders', tick_seconds)
+        
+        # Ждем начала следующей части окна по часам, а не фиксированную паузу после проверки:
+        # время проверки и неточность sleep иначе накапливаются и части сдвигаются
+        tick = next_reminder_tick(tick, get_reminder_tick(tick_seconds), shard_count)
+        await asyncio.sleep(max(0.0, tick * tick_seconds - time.time()))
+
+async def archive_task():
+    """Периодически переносит старые оплаченные тренировки в архив (см. app/archive.py)"""
+    interval = Config.ARCHIVE_INTERVAL_HOURS * 3600
+    while True:
+        try:
+            # Перенос выполняется синхронными запросами - в отдельном потоке, чтобы не блокировать бота
+            await asyncio.to_thread(run_archive)
+        except Exception as e:
+            print(f"❌ Ошибка в фоновой задаче архивации: {e}")
+        runtime.record_loop_tick('archive', interval)
+        await asyncio.sleep(interval)
+
+def check_database(engine=engine):
+    """Проверяет подключение к базе данных; возвращает текст ошибки или None"""
+    try:
+        with engine.connect() as connection:
+            connection.execute(text('SELECT 1'))
+        return None
+    except Exception as e:
+        return str(e)
+
+async def health_monitor_task():
+    """
+    Обновляет снимок для /health: подключение к БД, задержку event loop и метрики очередей.
+    Сам /health читает только этот снимок, поэтому частые проверки не нагружают БД.
+    """
+    loop = asyncio.get_running_loop()
+    interval = Config.HEALTH_CHECK_INTERVAL_SECONDS
+    while True:
+        database_error = await asyncio.to_thread(check_database)
+        if read_engine is not None:
+            replica_error = await asyncio.to_thread(check_database, read_engine)
+            runtime.update_health_snapshot(
+                database_replica='disconnected' if replica_error else 'connected',
+                database_replica_error=replica_error
+            )
+        runtime.update_health_snapshot(
+            database='disconnected' if database_error else 'connected',
+            database_error=database_error,
+            metrics=runtime.collect_metrics(),
+            checked_at=datetime.now().isoformat()
+        )
+        runtime.record_loop_tick('health_monitor', interval)
+        
+        # Насколько event loop опаздывает с пробуждением - признак того, что его что-то блокирует
+        started_at = loop.time()
+        await asyncio.sleep(interval)
+        runtime.update_health_snapshot(event_loop_lag=round(max(0.0, loop.time() - started_at - interval), 3))
+
+async def start_background_tasks(bot):
+    """Запускает напоминания об оплате, архивацию истории и планировщик запланированных сообщений"""
+    asyncio.create_task(payment_reminder_task(bot))
+    print("🔄 Запущена фоновая задача проверки напоминаний об оплате")
+    if Config.ARCHIVE_AFTER_MONTHS > 0:
+        asyncio.create_task(archive_task())
+        print(f"🗄️ Запущена фоновая задача архивации тренировок старше {Config.ARCHIVE_AFTER_MONTHS} мес.")
+    await start_message_scheduler(bot)
+
+async def main(role):
     # Получаем текущий event loop
     loop = asyncio.get_event_loop()
+    print(f"🚀 Роль процесса: {role}")
+    runtime.set_role(role)
     
-    # Создаем Flask приложение
-    app = create_app()
-    config = HyperConfig()
-    config.bind = ["0.0.0.0:5000"]
-    config.use_reloader = False
+    if role in ('web', 'all'):
+        # Создаем Flask приложение; запросы выполняются в собственном пуле потоков, а не в пуле event loop бота
+        app = ThreadPoolWSGIApp(create_app(), max_workers=Config.WEB_WORKER_THREADS)
+        config = HyperConfig()
+        config.bind = ["0.0.0.0:5000"]
+        config.use_reloader = False
+    else:
+        init_db()
     
-    bot_app = None
+    health_monitor = asyncio.create_task(health_monitor_task())
     
-    # Запускаем бота с повторными попытками
-    max_retries = 5
-    retry_delay = 10  # секунд
+    # Запущенные приложения бота; заполняются по мере запуска, чтобы их можно было остановить
+    bot_apps = []
     
-    for attempt in range(max_retries):
-        try:
-            print(f"🔄 Попытка запуска бота {attempt + 1}/{max_retries}")
-            bot_app = await start_bot()
-            break
-        except Exception as e:
-            print(f"❌ Ошибка при запуске бота (попытка {attempt + 1}): {e}")
-            if attempt < max_retries - 1:
-                print(f"⏳ Повторная попытка через {retry_delay} секунд...")
-                await asyncio.sleep(retry_delay)
-            else:
-                print("❌ Не удалось запустить бота после всех попыток")
-                # Продолжаем работу только с веб-сервером
-                bot_app = None
+    async def on_bot_started(bot_app):
+        bot_apps.append(bot_app)
+        # В общем процессе фоновые задачи отправляют через основного бота
+        if role == 'all':
+            await start_background_tasks(bot_app.bot)
     
-    # Запускаем фоновую задачу для проверки напоминаний об оплате
-    async def payment_reminder_task():
-        """Фоновая задача для проверки напоминаний об оплате"""
-        while True:
-            try:
-                if bot_app and bot_app.bot:
-                    await check_payment_reminders(bot_app.bot)
-                else:
-                    print("⚠️ Бот не запущен, пропускаем проверку напоминаний")
-            except Exception as e:
-                print(f"❌ Ошибка в фоновой задаче напоминаний: {e}")
-            
-            # Ждем 30 минут до следующей проверки
-            await asyncio.sleep(30 * 60)
+    async def on_sender_started(sender_app):
+        bot_apps.append(sender_app)
+        await start_background_tasks(sender_app.bot)
     
-    # Запускаем фоновую задачу
-    if bot_app:
-        asyncio.create_task(payment_reminder_task())
-        print("🔄 Запущена фоновая задача проверки напоминаний об оплате")
-        
-        # Планировщик сообщений уже запущен в start_bot через start_message_scheduler
+    # Бот запускается в фоне: веб-сервер и /health доступны сразу, даже если Telegram недоступен
+    if role in ('bot', 'all'):
+        bot_supervisor = asyncio.create_task(supervise_bot(start_bot, "бота", on_bot_started))
+    elif role == 'scheduler':
+        # Отдельный процесс фоновых задач отправляет через бота без получения обновлений
+        bot_supervisor = asyncio.create_task(
+            supervise_bot(start_sender_bot, "бота для фоновых задач", on_sender_started)
+        )
     
     # Добавляем обработчики сигналов для корректного завершения
     for sig in (signal.SIGTERM, signal.SIGINT):
         loop.add_signal_handler(
             sig,
-            lambda s=sig: asyncio.create_task(shutdown(s, loop, bot_app))
+            lambda s=sig: asyncio.create_task(shutdown(s, loop, bot_apps))
         )
     
+    if role not in ('web', 'all'):
+        # Веб-сервер в этой роли не нужен - работаем до сигнала завершения
+        await asyncio.Event().wait()
+        return
+    
     try:
         # Запускаем веб-сервер
         print("🌐 Запуск веб-сервера...")
         await serve(app, config)
     except Exception as e:
         print(f"❌ Ошибка веб-сервера: {e}")
-        if bot_app:
+        for bot_app in bot_apps:
             await bot_app.stop()
             await bot_app.shutdown()
         raise
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Hockey Training Bot")
+    parser.add_argument('--role', choices=ROLES, default=Config.APP_ROLE,
+                        help="что запускать в процессе (по умолчанию APP_ROLE или all)")
+    return parser.parse_args()
+
 if __name__ == "__main__":
+    args = parse_args()
     try:
-        asyncio.run(main())
+        asyncio.run(main(args.role))
     except KeyboardInterrupt:
         print("\nShutting down...")
     except Exception as e:
-        print(f"\nError occurred: {e}") 
\ No newline at end of file
+        print(f"\nError occurred: {e}")
@@ -0,0 +1,124 @@
+"""
+Микробенчмарк частых запросов бота.
+
+Сравнивает время одного вызова запроса в старом виде (Query собирается заново при каждом вызове)
+и через заранее построенные выражения из app/queries.py.
+БД - SQLite в памяти с небольшим набором данных, поэтому время самого запроса мало
+и разница показывает накладные расходы Python на построение и компиляцию выражения.
+
+Запуск:
+    python scripts/bench_queries.py [--calls 2000] [--trainings 30] [--users 40]
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+os.environ.setdefault('TELEGRAM_TOKEN', '0:bench')
+os.environ['DATABASE_URL'] = 'sqlite://'
+
+from app import queries
+from app.database import engine, db_session
+from app.models import Base, Training, Registration, UserPreferences
+
+USER_ID = 1
+
+def populate(trainings, users):
+    """Тренировки в прошлом и будущем, на каждую записаны все пользователи"""
+    Base.metadata.create_all(engine)
+    now = datetime.now()
+    for i in range(trainings):
+        training = Training(date_time=now + timedelta(days=i - trainings // 2), max_participants=users)
+        db_session.add(training)
+        db_session.flush()
+        for user_id in range(1, users + 1):
+            db_session.add(Registration(
+                training_id=training.id,
+                user_id=user_id,
+                username=f'user{user_id}',
+                paid=user_id % 3 == 0
+            ))
+    db_session.add(UserPreferences(user_id=USER_ID))
+    db_session.commit()
+
+# Запросы в том виде, в каком они были в обработчиках: (название, старый вариант, новый вариант)
+CASES = [
+    (
+        'ближайшие тренировки',
+        lambda: db_session.query(Training)
+            .filter(Training.date_time > datetime.now())
+            .order_by(Training.date_time)
+            .all(),
+        queries.upcoming_trainings,
+    ),
+    (
+        'ближайшая тренировка',
+        lambda: db_session.query(Training)
+            .filter(Training.date_time > datetime.now())
+            .order_by(Training.date_time)
+            .first(),
+        queries.next_training,
+    ),
+    (
+        'записи пользователя',
+        lambda: db_session.query(Registration)
+            .join(Training)
+            .filter(Registration.user_id == USER_ID)
+            .filter(Training.date_time > datetime.now())
+            .order_by(Training.date_time)
+            .all(),
+        lambda: queries.user_upcoming_registrations(USER_ID),
+    ),
+    (
+        'неоплаченные записи',
+        lambda: db_session.query(Registration)
+            .join(Training)
+            .filter(Registration.user_id == USER_ID)
+            .filter(Registration.paid == False)
+            .filter(Registration.goalkeeper == False)
+            .order_by(Training.date_time)
+            .all(),
+        lambda: queries.user_unpaid_registrations(USER_ID),
+    ),
+    (
+        'предпочтения',
+        lambda: db_session.query(UserPreferences).filter_by(user_id=USER_ID).first(),
+        lambda: queries.user_preferences(USER_ID),
+    ),
+    (
+        'уже записан?',
+        lambda: db_session.query(Registration).filter_by(training_id=1, user_id=USER_ID).first(),
+        lambda: queries.user_registration(1, USER_ID),
+    ),
+]
+
+def measure(func, calls):
+    """Среднее время одного вызова, мкс"""
+    for _ in range(min(calls, 200)):
+        func()
+    started = time.perf_counter()
+    for _ in range(calls):
+        func()
+    return (time.perf_counter() - started) / calls * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--calls', type=int, default=2000, help='вызовов каждого запроса')
+    parser.add_argument('--trainings', type=int, default=30, help='тренировок в БД')
+    parser.add_argument('--users', type=int, default=40, help='пользователей на тренировку')
+    args = parser.parse_args()
+
+    populate(args.trainings, args.users)
+
+    print(f"{'запрос':<24}{'Query, мкс':>12}{'кэш, мкс':>12}{'экономия':>12}")
+    for name, legacy, cached in CASES:
+        assert legacy() == cached(), f"результаты не совпадают: {name}"
+        legacy_time = measure(legacy, args.calls)
+        cached_time = measure(cached, args.calls)
+        saved = legacy_time - cached_time
+        print(f"{name:<24}{legacy_time:>12.1f}{cached_time:>12.1f}{saved:>9.1f} ({saved / legacy_time:.0%})")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""
+Нагрузочный тест обработки обновлений ботом.
+
+Прогоняет пачку обновлений от нескольких пользователей через настоящий Application
+с разным значением concurrent_updates и показывает, как растет пропускная способность.
+Заодно проверяет, что обновления одного пользователя обрабатываются строго по порядку.
+Сеть не используется: обработчик имитирует ожидание ответа БД и Telegram через asyncio.sleep.
+
+Запуск:
+    python scripts/load_test_updates.py [--updates 400] [--users 40] [--latency 0.05] [--workers 1,2,4,8,16,32]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+os.environ.setdefault('TELEGRAM_TOKEN', '0:load-test')
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+
+from telegram import Update, User
+from telegram.ext import Application, ExtBot, TypeHandler
+from app.bot.concurrency import serialize_per_user
+
+class OfflineBot(ExtBot):
+    """Бот без обращения к Telegram при инициализации"""
+
+    async def get_me(self, *args, **kwargs):
+        self._bot_user = User(id=0, first_name='load-test', is_bot=True, username='load_test_bot')
+        return self._bot_user
+
+def make_updates(count, users):
+    """Создает обновления, равномерно распределенные по пользователям"""
+    updates = []
+    for update_id in range(count):
+        user = User(id=update_id % users + 1, first_name='user', is_bot=False)
+        updates.append(Update.de_json({
+            'update_id': update_id,
+            'callback_query': {
+                'id': str(update_id),
+                'from': user.to_dict(),
+                'chat_instance': '1',
+                'data': 'schedule',
+            },
+        }, None))
+    return updates
+
+async def run(workers, updates, latency):
+    """Обрабатывает обновления с заданным числом обработчиков; возвращает (время, нарушения порядка)"""
+    application = Application.builder()\
+        .bot(OfflineBot('0:load-test'))\
+        .updater(None)\
+        .concurrent_updates(workers)\
+        .build()
+
+    processed = {}
+    done = asyncio.Event()
+
+    async def handler(update, context):
+        await asyncio.sleep(latency)
+        processed.setdefault(update.effective_user.id, []).append(update.update_id)
+        if sum(len(ids) for ids in processed.values()) == len(updates):
+            done.set()
+
+    application.add_handler(TypeHandler(Update, serialize_per_user(handler)))
+
+    await application.initialize()
+    await application.start()
+    started_at = time.perf_counter()
+    for update in updates:
+        await application.update_queue.put(update)
+    await done.wait()
+    elapsed = time.perf_counter() - started_at
+    await application.stop()
+    await application.shutdown()
+
+    order_violations = sum(1 for ids in processed.values() if ids != sorted(ids))
+    return elapsed, order_violations
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--updates', type=int, default=400, help='количество обновлений')
+    parser.add_argument('--users', type=int, default=40, help='количество пользователей')
+    parser.add_argument('--latency', type=float, default=0.05, help='время обработки одного обновления, с')
+    parser.add_argument('--workers', default='1,2,4,8,16,32', help='значения concurrent_updates через запятую')
+    args = parser.parse_args()
+
+    updates = make_updates(args.updates, args.users)
+    print(f"Обновлений: {args.updates}, пользователей: {args.users}, обработка одного: {args.latency * 1000:.0f} мс\n")
+    print(f"{'workers':>8} {'время, с':>10} {'обн./с':>10} {'ускорение':>10} {'нарушений порядка':>18}")
+
+    baseline = None
+    for workers in (int(w) for w in args.workers.split(',')):
+        elapsed, violations = asyncio.run(run(workers, updates, args.latency))
+        throughput = args.updates / elapsed
+        baseline = baseline or throughput
+        print(f"{workers:>8} {elapsed:>10.2f} {throughput:>10.1f} {throughput / baseline:>9.1f}x {violations:>18}")
+
+if __name__ == '__main__':
+    main()
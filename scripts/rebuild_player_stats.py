@@ -0,0 +1,25 @@
+"""
+Пересчет статистики игроков (таблица player_stats) по текущим и архивным записям.
+
+Обычно статистика обновляется вместе с записями и пересчет не нужен; он заполняет таблицу
+при первом запуске (это делает и init_db) и исправляет счетчики, если записи меняли в БД вручную.
+Отмены и неявки восстановить по записям нельзя - они сохраняются как есть.
+
+Запуск:
+    python scripts/rebuild_player_stats.py
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from app.database import engine
+from app.player_stats import rebuild_player_stats
+
+def main():
+    with engine.begin() as connection:
+        players_count = rebuild_player_stats(connection)
+    print(f"📊 Статистика пересчитана для {players_count} игроков")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+import pytest
+
+# Настройки читаются при импорте app, поэтому окружение задается до него: тестовая БД SQLite во временном каталоге
+_DATA_DIR = tempfile.mkdtemp(prefix='hockey-tests-')
+os.environ['TELEGRAM_TOKEN'] = '0:test'
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(_DATA_DIR, 'test.db')}"
+os.environ.pop('DATABASE_READ_URL', None)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from app import player_stats
+from app.database import engine, db_session
+from app.models import Base, Training, Registration, PlayerStats
+
+@pytest.fixture
+def db():
+    """Сессия с пустой схемой; после теста таблицы удаляются"""
+    Base.metadata.create_all(engine)
+    yield db_session
+    db_session.remove()
+    Base.metadata.drop_all(engine)
+
+def add_training(db, days, now=None):
+    """Тренировка через days дней от now (по умолчанию от текущего момента); отрицательные - в прошлом"""
+    training = Training(date_time=(now or datetime.now()) + timedelta(days=days), max_participants=20)
+    db.add(training)
+    db.flush()
+    return training
+
+def register(db, training, user_id, goalkeeper=False, paid_at=None):
+    """Запись на тренировку с учетом в player_stats, как при записи через бота; с paid_at - уже оплаченная"""
+    registration = Registration(
+        training_id=training.id, user_id=user_id, username=f'u{user_id}',
+        goalkeeper=goalkeeper, paid=paid_at is not None, paid_at=paid_at
+    )
+    db.add(registration)
+    player_stats.registrations_added([registration], training.date_time)
+    db.flush()
+    return registration
+
+def stats_rows(db):
+    """Фиксирует изменения и возвращает счетчики player_stats: {user_id: {счетчик: значение}}"""
+    db.commit()
+    db.expire_all()
+    return {row.user_id: {name: getattr(row, name) for name in player_stats.COUNTERS} for row in db.query(PlayerStats)}
+
+def rebuilt_stats_rows(db):
+    """Счетчики после полного пересчета player_stats"""
+    db.commit()
+    with engine.begin() as connection:
+        player_stats.rebuild_player_stats(connection)
+    return stats_rows(db)
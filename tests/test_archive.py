@@ -0,0 +1,60 @@
+from datetime import datetime
+
+from app.archive import archive_old_trainings
+from app.config import Config
+from app.models import Training, TrainingPost, ArchivedTraining, ArchivedRegistration, ArchivedPlayerStats
+
+from conftest import add_training, register, stats_rows, rebuilt_stats_rows
+
+NOW = datetime(2026, 10, 1, 12, 0)
+
+def add_past_training(db, days_ago, players, paid=True):
+    """Прошедшая тренировка; players - [(user_id, вратарь)], полевые оплачены, если paid (вратари не платят)"""
+    training = add_training(db, -days_ago, now=NOW)
+    for user_id, goalkeeper in players:
+        register(db, training, user_id, goalkeeper, paid_at=training.date_time if paid and not goalkeeper else None)
+    return training
+
+def test_archive_moves_only_old_fully_paid_trainings(db, monkeypatch):
+    # По одной тренировке в транзакции - итоги игроков копятся между пачками
+    monkeypatch.setattr(Config, 'ARCHIVE_BATCH_SIZE', 1)
+    oldest = add_past_training(db, 300, [(1, False), (2, True)])
+    old = add_past_training(db, 250, [(1, False), (2, False)])
+    with_debt = add_past_training(db, 280, [(1, False)], paid=False)
+    recent = add_past_training(db, 10, [(1, False)])
+    db.add(TrainingPost(training_id=oldest.id, chat_id='-100', message_id=5))
+    db.commit()
+    oldest_id, old_id, with_debt_id, recent_id = oldest.id, old.id, with_debt.id, recent.id
+    oldest_at, old_at = oldest.date_time, old.date_time
+
+    assert archive_old_trainings(now=NOW) == 2
+
+    db.expire_all()
+    assert {training.id for training in db.query(Training)} == {with_debt_id, recent_id}
+    archived = {training.id: training for training in db.query(ArchivedTraining)}
+    assert set(archived) == {oldest_id, old_id}
+    assert archived[oldest_id].registrations_count == 2
+    assert db.query(ArchivedRegistration).count() == 4
+    assert db.query(TrainingPost).count() == 0
+
+    first = db.get(ArchivedPlayerStats, 1)
+    assert (first.trainings_count, first.goalkeeper_count) == (2, 0)
+    assert (first.first_training_at, first.last_training_at) == (oldest_at, old_at)
+    second = db.get(ArchivedPlayerStats, 2)
+    assert (second.trainings_count, second.goalkeeper_count) == (2, 1)
+
+    # Повторный запуск ничего не переносит, пока долг не оплачен
+    assert archive_old_trainings(now=NOW) == 0
+
+def test_rebuild_after_archive_matches_incremental_stats(db):
+    add_past_training(db, 300, [(1, False), (2, True)])
+    add_past_training(db, 280, [(1, False)], paid=False)
+    add_past_training(db, 3, [(2, False)], paid=False)
+    db.commit()
+    before = stats_rows(db)
+
+    assert archive_old_trainings(now=NOW) == 1
+    # Архивные записи учитываются при пересчете наравне с текущими
+    assert rebuilt_stats_rows(db) == before
+    assert before[1]['registrations_count'] == 2
+    assert before[1]['unpaid_count'] == 1
@@ -0,0 +1,55 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from app.bot import commands
+from app.config import Config
+from app.models import BotCommand, CommandStatus
+
+def test_stale_processing_command_is_reclaimed_and_executed(db, monkeypatch):
+    handled = []
+
+    async def handler(bot, **payload):
+        handled.append(payload)
+
+    monkeypatch.setitem(commands._command_handlers, 'test_command', handler)
+    now = datetime.now()
+    timeout = timedelta(minutes=Config.BOT_COMMAND_PROCESSING_TIMEOUT_MINUTES)
+    # Команду взял процесс бота, который упал, не отметив результат
+    stale = BotCommand(command='test_command', payload='{"n": 1}', status=CommandStatus.PROCESSING, claimed_at=now - timeout * 2)
+    # Эту команду еще выполняет живой процесс - ее трогать нельзя
+    running = BotCommand(command='test_command', payload='{"n": 2}', status=CommandStatus.PROCESSING, claimed_at=now)
+    db.add_all([stale, running])
+    db.commit()
+    stale_id, running_id = stale.id, running.id
+
+    assert asyncio.run(commands.process_pending_commands(bot=None)) == 1
+    assert handled == [{'n': 1}]
+
+    db.expire_all()
+    assert db.get(BotCommand, stale_id).status == CommandStatus.DONE
+    assert db.get(BotCommand, running_id).status == CommandStatus.PROCESSING
+
+def test_claim_records_claimed_at(db):
+    command = BotCommand(command='test_command', status=CommandStatus.PENDING)
+    db.add(command)
+    db.commit()
+
+    assert commands._claim_command(command.id)
+    assert not commands._claim_command(command.id)
+    db.expire_all()
+    assert db.get(BotCommand, command.id).claimed_at is not None
+
+def test_purge_removes_only_old_done_commands(db):
+    now = datetime.now()
+    retention = timedelta(days=Config.BOT_COMMAND_RETENTION_DAYS)
+    old_done = BotCommand(command='test_command', status=CommandStatus.DONE, processed_at=now - retention * 2)
+    recent_done = BotCommand(command='test_command', status=CommandStatus.DONE, processed_at=now)
+    old_failed = BotCommand(command='test_command', status=CommandStatus.FAILED, processed_at=now - retention * 2)
+    pending = BotCommand(command='test_command', status=CommandStatus.PENDING)
+    db.add_all([old_done, recent_done, old_failed, pending])
+    db.commit()
+    kept_ids = {recent_done.id, old_failed.id, pending.id}
+
+    assert commands.purge_done_commands(now) == 1
+    db.expire_all()
+    assert {command.id for command in db.query(BotCommand)} == kept_ids
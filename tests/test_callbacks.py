@@ -0,0 +1,30 @@
+import re
+
+import pytest
+
+from app.bot import callbacks
+from app.bot.callbacks import encode_callback, decode_callback, decode_int_arg, callback_pattern
+
+def test_encode_decode_round_trip():
+    data = encode_callback(callbacks.SCHEDULE_PAGE, 3)
+    assert data == '1:sch:3'
+    assert decode_callback(data) == (callbacks.SCHEDULE_PAGE, ['3'])
+    assert decode_int_arg(encode_callback(callbacks.PAY, 17, 5), index=1) == 5
+
+def test_decode_legacy_format():
+    # Кнопки в сообщениях, отправленных до версионированного формата
+    assert decode_callback('register_42') == ('register', ['42'])
+    assert decode_int_arg('pay_7') == 7
+    assert decode_callback('schedule') == ('schedule', [])
+
+def test_encode_rejects_data_over_telegram_limit():
+    with pytest.raises(ValueError):
+        encode_callback(callbacks.REGISTER, 'x' * callbacks.MAX_CALLBACK_DATA_BYTES)
+
+def test_callback_pattern_matches_only_own_action_and_arity():
+    pattern = re.compile(callback_pattern(callbacks.CANCEL))
+    assert pattern.match(encode_callback(callbacks.CANCEL, 12))
+    assert not pattern.match(encode_callback(callbacks.PAY, 12))
+    assert not pattern.match(encode_callback(callbacks.CANCEL, 12, 1))
+    assert not pattern.match('cancel_12')
+    assert re.match(callback_pattern(callbacks.PAY, args_count=2), encode_callback(callbacks.PAY, 12, 1))
@@ -0,0 +1,63 @@
+import asyncio
+import threading
+
+import pytest
+
+from app.bot import notifications, weekly_posts
+from app.config import Config
+from app.models import Registration, JerseyType, TeamType, PositionType
+
+from conftest import add_training
+
+SLOW_CHAT_ID = 2
+
+class SlowChatBot:
+    """Бот, который отвечает сразу всем, кроме SLOW_CHAT_ID; отправка туда зависает"""
+
+    def __init__(self):
+        self.sent = []
+        self.cancelled = []
+
+    async def send_message(self, chat_id, **kwargs):
+        if chat_id == SLOW_CHAT_ID:
+            try:
+                await asyncio.sleep(30)
+            except asyncio.CancelledError:
+                self.cancelled.append(chat_id)
+                raise
+        self.sent.append(chat_id)
+
+@pytest.fixture
+def bot_loop(monkeypatch):
+    """Event loop бота в отдельном потоке, как в процессе с ролью all"""
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    bot = SlowChatBot()
+    monkeypatch.setattr(weekly_posts, '_roster_post_loop', loop)
+    monkeypatch.setattr(weekly_posts, '_roster_post_bot', bot)
+    yield bot
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+    loop.close()
+
+def test_batch_timeout_records_sent_notifications(db, bot_loop, monkeypatch):
+    monkeypatch.setattr(Config, 'NOTIFICATION_BATCH_TIMEOUT_SECONDS', 0.2)
+    training = add_training(db, 1)
+    for user_id in (1, SLOW_CHAT_ID):
+        db.add(Registration(
+            training_id=training.id, user_id=user_id, username=f'u{user_id}',
+            jersey_type=JerseyType.LIGHT, team_type=TeamType.FIRST, position_type=PositionType.FORWARD
+        ))
+    db.commit()
+
+    plan = notifications.build_notification_plan(training)
+    notifications.execute_notification_plan(plan)
+    notifications.apply_notification_results(plan)
+
+    assert {item.chat_id: item.result for item in plan} == {1: notifications.SENT, SLOW_CHAT_ID: notifications.FAILED}
+    # Зависшая отправка отменена, а не продолжает работать в боте
+    assert bot_loop.cancelled == [SLOW_CHAT_ID]
+    # Повторная рассылка не отправит уведомление тому, кто его уже получил
+    db.expire_all()
+    assert [item.chat_id for item in notifications.build_notification_plan(training)] == [SLOW_CHAT_ID]
@@ -0,0 +1,125 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import create_app, player_stats
+from app.models import PlayerStats
+
+from conftest import add_training, register, stats_rows, rebuilt_stats_rows
+
+def pay(registration, training, paid_at):
+    registration.paid = True
+    registration.paid_at = paid_at
+    player_stats.registration_paid(registration, training.date_time)
+
+def test_counters_follow_registration_lifecycle(db):
+    past, upcoming = add_training(db, -2), add_training(db, 3)
+    paid_late = register(db, past, 1)
+    pay(paid_late, past, past.date_time + timedelta(hours=5))
+    register(db, upcoming, 1)
+    register(db, past, 2, goalkeeper=True)
+    db.commit()
+
+    assert stats_rows(db)[1] == dict(
+        registrations_count=2, cancellations_count=0, no_shows_count=0,
+        paid_count=1, payment_delay_count=1, payment_delay_seconds=5 * 3600, unpaid_count=1
+    )
+    # Вратари не платят - долга нет
+    assert stats_rows(db)[2]['unpaid_count'] == 0
+    assert db.get(PlayerStats, 1).average_payment_delay == timedelta(hours=5)
+
+def test_cancellation_before_start_and_no_show_after(db):
+    past, upcoming = add_training(db, -1), add_training(db, 1)
+    for training in (past, upcoming):
+        registration = register(db, training, 1)
+        player_stats.registrations_removed([registration], training.date_time)
+        db.delete(registration)
+    db.commit()
+
+    assert stats_rows(db)[1] == dict(
+        registrations_count=0, cancellations_count=1, no_shows_count=1,
+        paid_count=0, payment_delay_count=0, payment_delay_seconds=0, unpaid_count=0
+    )
+
+def test_goalkeeper_toggle_keeps_debt_consistent(db):
+    training = add_training(db, -1)
+    registration = register(db, training, 1)
+    player_stats.registration_changed(registration, training.date_time, goalkeeper=True)
+    assert registration.goalkeeper is True
+    assert stats_rows(db)[1]['unpaid_count'] == 0
+    player_stats.registration_changed(registration, training.date_time, goalkeeper=False)
+    assert stats_rows(db)[1]['unpaid_count'] == 1
+    pay(registration, training, datetime.now())
+    assert stats_rows(db) == rebuilt_stats_rows(db)
+    assert stats_rows(db)[1]['unpaid_count'] == 0
+
+def test_rename_route_updates_debt_when_goalkeeper_changes(db):
+    training = add_training(db, 2)
+    registration = register(db, training, 1)
+    db.commit()
+    # Запрос к админке выполняется в том же потоке и по завершении закрывает общую сессию
+    url = f'/training/{training.id}/participant/{registration.id}/rename'
+    client = create_app().test_client()
+    with client.session_transaction() as session:
+        session['logged_in'] = True
+
+    assert client.post(url, json={'name': 'Вратарь', 'goalkeeper': True}).json['success']
+    db.remove()
+    assert stats_rows(db)[1]['unpaid_count'] == 0
+    assert client.post(url, json={'name': 'Полевой', 'goalkeeper': False}).json['success']
+    db.remove()
+    assert stats_rows(db)[1]['unpaid_count'] == 1
+
+def test_upsert_creates_and_increments_in_one_statement(db):
+    training = add_training(db, 1)
+    # Несколько изменений нового игрока в одной транзакции: строки еще нет, затем она уже есть
+    register(db, training, 1)
+    register(db, add_training(db, 2), 1)
+    db.commit()
+    assert stats_rows(db)[1]['registrations_count'] == 2
+
+def test_merge_moves_temporary_player_stats(db):
+    training = add_training(db, -1)
+    temporary = register(db, training, -5)
+    register(db, add_training(db, -2), 7)
+    temporary.user_id = 7
+    player_stats.merge_players(-5, 7)
+    db.commit()
+
+    assert -5 not in stats_rows(db)
+    assert stats_rows(db)[7]['registrations_count'] == 2
+    assert stats_rows(db) == rebuilt_stats_rows(db)
+
+def test_training_deletion_is_not_a_cancellation(db):
+    training = add_training(db, 1)
+    register(db, training, 1)
+    register(db, training, 2)
+    db.flush()
+    player_stats.registrations_removed(training.registrations, training.date_time, cancelled=False)
+    db.delete(training)
+    db.commit()
+
+    assert stats_rows(db)[1]['registrations_count'] == 0
+    assert stats_rows(db)[1]['cancellations_count'] == 0
+
+def test_rebuild_keeps_cancellations_and_matches_stats_rows(db):
+    past, upcoming = add_training(db, -3), add_training(db, 3)
+    first = register(db, past, 1)
+    pay(first, past, past.date_time - timedelta(hours=1))
+    register(db, upcoming, 1)
+    cancelled = register(db, upcoming, 2)
+    player_stats.registrations_removed([cancelled], upcoming.date_time)
+    db.delete(cancelled)
+    register(db, past, 3, goalkeeper=True)
+
+    before = stats_rows(db)
+    after = rebuilt_stats_rows(db)
+    assert after == before
+    assert after[2]['cancellations_count'] == 1
+    # Оплата заранее - задержка 0
+    assert after[1]['payment_delay_seconds'] == 0
+
+@pytest.mark.parametrize('paid_at_offset, expected', [(timedelta(hours=-2), 0), (timedelta(minutes=90), 5400)])
+def test_payment_delay_seconds(paid_at_offset, expected):
+    start = datetime(2026, 1, 1, 20, 0)
+    assert player_stats.payment_delay_seconds(start, start + paid_at_offset) == expected
@@ -0,0 +1,95 @@
+import asyncio
+import time
+
+import pytest
+from telegram.error import RetryAfter
+
+from app.bot.rate_limit import TokenBucket, PriorityRateLimiter, BULK_LANE, bulk_lane_kwargs
+
+def test_token_bucket_spends_burst_then_limits_rate():
+    async def scenario():
+        bucket = TokenBucket(rate=50, capacity=2)
+        started = time.monotonic()
+        for _ in range(2):
+            await bucket.acquire()
+        burst = time.monotonic() - started
+        for _ in range(5):
+            await bucket.acquire()
+        return burst, time.monotonic() - started
+
+    burst, total = asyncio.run(scenario())
+    assert burst < 0.02
+    # 5 токенов сверх запаса при 50 в секунду - около 0.1 с
+    assert 0.08 <= total < 0.5
+
+def test_try_acquire_does_not_wait():
+    bucket = TokenBucket(rate=1, capacity=1)
+    assert bucket.try_acquire()
+    assert not bucket.try_acquire()
+
+class SpyBucket(TokenBucket):
+    def __init__(self, rate):
+        super().__init__(rate)
+        self.taken = 0
+
+    async def acquire(self, tokens=1):
+        await super().acquire(tokens)
+        self.taken += tokens
+
+    def try_acquire(self, tokens=1):
+        taken = super().try_acquire(tokens)
+        self.taken += tokens if taken else 0
+        return taken
+
+def test_preempted_bulk_request_spends_one_token():
+    async def scenario():
+        limiter = PriorityRateLimiter(interactive_rate=1000, bulk_rate=20)
+        bucket = limiter._buckets[BULK_LANE] = SpyBucket(20)
+        # Пустая полоса: следующий токен через 50 мс
+        bucket._tokens = 0
+        interactive_started, release = asyncio.Event(), asyncio.Event()
+
+        async def interactive_call():
+            interactive_started.set()
+            await release.wait()
+            return 'interactive'
+
+        async def bulk_call():
+            return 'bulk'
+
+        bulk = asyncio.create_task(limiter.process_request(bulk_call, (), {}, 'sendMessage', {}, BULK_LANE))
+        await asyncio.sleep(0.01)
+        interactive = asyncio.create_task(limiter.process_request(interactive_call, (), {}, 'answerCallbackQuery', {}, None))
+        await interactive_started.wait()
+        # Токен массовой полосы появляется, пока интерактивный запрос еще обрабатывается
+        await asyncio.sleep(0.1)
+        assert not bulk.done()
+        release.set()
+        return await interactive, await bulk, bucket.taken, limiter.get_metrics()
+
+    interactive, bulk, taken, metrics = asyncio.run(scenario())
+    assert (interactive, bulk) == ('interactive', 'bulk')
+    assert taken == 1
+    assert metrics[BULK_LANE]['sent'] == 1 and metrics[BULK_LANE]['queued'] == 0
+
+def test_retry_after_is_retried_once_by_default():
+    calls = []
+
+    async def flooded():
+        calls.append(1)
+        raise RetryAfter(0)
+
+    limiter = PriorityRateLimiter(interactive_rate=1000, bulk_rate=1000)
+    with pytest.raises(RetryAfter):
+        asyncio.run(limiter.process_request(flooded, (), {}, 'sendMessage', {}, None))
+    assert len(calls) == 2
+
+def test_bulk_lane_kwargs_only_for_bots_with_limiter():
+    class PlainBot:
+        rate_limiter = None
+
+    class LimitedBot:
+        rate_limiter = object()
+
+    assert bulk_lane_kwargs(PlainBot()) == {}
+    assert bulk_lane_kwargs(LimitedBot()) == {'rate_limit_args': BULK_LANE}
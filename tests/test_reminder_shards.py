@@ -0,0 +1,46 @@
+import random
+
+from app.bot.handlers import get_reminder_tick, next_reminder_tick
+
+TICK_SECONDS = 60
+SHARD_COUNT = 30
+
+def simulate(durations, start=1_000_000.5):
+    """Цикл payment_reminder_task на модельных часах: [(время, часть), ...] по порядку проверок"""
+    now = start
+    tick = get_reminder_tick(TICK_SECONDS, now)
+    visits = []
+    for work, wake_error in durations:
+        visits.append((now, tick % SHARD_COUNT))
+        now += work
+        tick = next_reminder_tick(tick, get_reminder_tick(TICK_SECONDS, now), SHARD_COUNT)
+        now = max(now, tick * TICK_SECONDS + wake_error)
+    return visits
+
+def assert_each_shard_once_per_window(visits):
+    shards = [shard for _, shard in visits]
+    for start in range(0, len(shards) - SHARD_COUNT + 1):
+        assert sorted(shards[start:start + SHARD_COUNT]) == list(range(SHARD_COUNT))
+
+def test_jittery_work_and_sleep_never_repeat_or_skip_a_shard():
+    rng = random.Random(7)
+    # Проверка занимает до половины тика, sleep просыпается чуть раньше или позже границы
+    durations = [(rng.uniform(0, TICK_SECONDS / 2), rng.uniform(-0.05, 0.5)) for _ in range(SHARD_COUNT * 20)]
+    visits = simulate(durations)
+    assert_each_shard_once_per_window(visits)
+    # Сдвиг не накапливается: через 20 окон проверки идут по той же сетке
+    last_time, last_shard = visits[-1]
+    assert last_shard == get_reminder_tick(TICK_SECONDS, last_time) % SHARD_COUNT
+
+def test_slow_checks_catch_up_without_skipping():
+    durations = [(TICK_SECONDS * 2.5, 0)] * 5 + [(1, 0)] * (SHARD_COUNT * 3)
+    assert_each_shard_once_per_window(simulate(durations))
+
+def test_stall_longer_than_window_resumes_one_window_back():
+    assert next_reminder_tick(10, 11, SHARD_COUNT) == 11
+    assert next_reminder_tick(10, 100, SHARD_COUNT) == 100 - SHARD_COUNT + 1
+
+def test_shard_depends_only_on_time():
+    assert get_reminder_tick(TICK_SECONDS, 125.0) == 2
+    assert get_reminder_tick(TICK_SECONDS, 179.9) == 2
+    assert get_reminder_tick(TICK_SECONDS, 180.0) == 3
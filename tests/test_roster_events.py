@@ -0,0 +1,60 @@
+import asyncio
+
+import pytest
+
+from app import create_app
+from app.config import Config
+from app.web import routes
+from app.web.asgi import ThreadPoolWSGIApp
+
+@pytest.fixture
+def asgi_app(db, monkeypatch):
+    monkeypatch.setattr(Config, 'ROSTER_EVENTS_KEEPALIVE_SECONDS', 0.05)
+    flask_app = create_app()
+    client = flask_app.test_client()
+    with client.session_transaction() as session:
+        session['logged_in'] = True
+    app = ThreadPoolWSGIApp(flask_app, max_workers=Config.ROSTER_EVENTS_MAX_STREAMS + 1)
+    yield app, client.get_cookie('session').value
+    app.executor.shutdown(wait=True)
+
+def free_stream_slots():
+    slots = 0
+    while routes._roster_event_streams.acquire(blocking=False):
+        slots += 1
+    for _ in range(slots):
+        routes._roster_event_streams.release()
+    return slots
+
+async def open_stream(app, cookie):
+    """Открывает поток событий; возвращает (задачу запроса, функцию отключения клиента)"""
+    incoming = asyncio.Queue()
+    await incoming.put({'type': 'http.request', 'body': b'', 'more_body': False})
+    started = asyncio.Event()
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+        'scheme': 'http', 'path': '/roster/events', 'raw_path': b'/roster/events', 'query_string': b'',
+        'root_path': '', 'headers': [(b'host', b'test'), (b'cookie', f'session={cookie}'.encode())],
+        'client': ('127.0.0.1', 1), 'server': ('test', 80),
+    }
+
+    async def send(message):
+        if message['type'] == 'http.response.body' and b'retry' in message.get('body', b''):
+            started.set()
+
+    task = asyncio.create_task(app(scope, incoming.get, send))
+    await asyncio.wait_for(started.wait(), 5)
+    return task, lambda: incoming.put_nowait({'type': 'http.disconnect'})
+
+def test_disconnected_streams_release_their_slots(asgi_app):
+    app, cookie = asgi_app
+
+    async def scenario():
+        streams = [await open_stream(app, cookie) for _ in range(Config.ROSTER_EVENTS_MAX_STREAMS)]
+        assert free_stream_slots() == 0
+        for _, disconnect in streams:
+            disconnect()
+        await asyncio.wait_for(asyncio.gather(*(task for task, _ in streams)), 5)
+
+    asyncio.run(scenario())
+    assert free_stream_slots() == Config.ROSTER_EVENTS_MAX_STREAMS